@@ -1,5 +1,13 @@
 import os
-from flask import Flask, render_template
+import time
+
+# Before anything else: profile imports if asked, and keep the OCI SDK out of startup
+from app import startup
+if startup.STARTUP_PROFILE:
+    startup.start_profiling()
+startup.defer_import('oci')
+
+from flask import Flask, render_template, request, g
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -14,21 +22,46 @@ def create_app():
 
     
     # Enable CORS for cross-origin requests (Frontend Bucket <-> Backend VM)
-    CORS(app, supports_credentials=True)
+    CORS(app, supports_credentials=True, expose_headers=['Retry-After', 'ETag'])
 
     # [cite_start]Limit max upload size (50MB) to prevent large ZIP attacks [cite: 102, 104]
+    # (larger archives go through the chunked upload API, one chunk per request)
     app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024 
 
     # --- Register Blueprints ---
     from app.routes.auth_route import auth_bp
     from app.routes.deploy_route import deploy_bp
     from app.routes.health_route import health_bp
+    from app.routes.upload_route import upload_bp
+    from app.routes.metrics_route import metrics_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(deploy_bp, url_prefix='/api/deploy')
+    app.register_blueprint(upload_bp, url_prefix='/api/uploads')
     app.register_blueprint(health_bp)
+    app.register_blueprint(metrics_bp)
+
+    # --- Request Timing ---
+    from app.metrics import http_request_duration
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.monotonic()
+
+    @app.after_request
+    def record_timing(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            # Label by the route pattern, not the raw path, so bucket names don't explode the series
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            http_request_duration.observe(time.monotonic() - started, method=request.method,
+                                          route=route, status=str(response.status_code))
+        return response
+
     @app.route('/')
     def index():
         """Serves the main frontend HTML page."""
         return render_template('index.html')
+
+    startup.print_startup_report("create_app() done")
     return app
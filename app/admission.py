@@ -0,0 +1,308 @@
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from urllib.parse import quote
+from app.metadata_writer import MetadataWriter, MutationRejected
+
+# --- Configuration ---
+# The global limits below are for the whole server. Each worker process
+# enforces its share (the limit divided by WEB_WORKERS, at least 1), since
+# queues and in-flight counts are kept per process. The per-user limit is
+# enforced across processes through leases in the metadata bucket.
+WEB_WORKERS = max(1, int(os.getenv('WEB_WORKERS', '1')))
+
+
+def _per_process(total):
+    return max(1, total // WEB_WORKERS)
+
+
+MAX_CONCURRENT_DEPLOYS = _per_process(int(os.getenv('DEPLOY_MAX_CONCURRENT', '4')))
+# Uncompressed bytes of all admitted deploys together; one larger deploy is still admitted alone
+MAX_INFLIGHT_DEPLOY_BYTES = _per_process(int(os.getenv('DEPLOY_MAX_INFLIGHT_DEPLOY_BYTES',
+                                                       str(300 * 1024 * 1024))))  # 300MB
+MAX_DEPLOYS_PER_USER = int(os.getenv('DEPLOY_MAX_PER_USER', '1'))
+# Requests wait this long for capacity before getting a 429...
+ADMISSION_TIMEOUT = float(os.getenv('DEPLOY_ADMISSION_TIMEOUT', '10'))  # seconds
+# ...and only this many may wait at once, so queueing delay stays bounded
+MAX_ADMISSION_QUEUE = _per_process(int(os.getenv('DEPLOY_ADMISSION_QUEUE', '16')))
+# Per-user leases shared by all processes; off leaves the per-user cap per process
+SHARED_USER_LEASES = os.getenv('DEPLOY_SHARED_USER_LIMIT', 'true').lower() in ('1', 'true', 'yes')
+# Running deploys renew their lease every third of this; one left behind by a
+# process that died frees itself after this long
+USER_LEASE_TTL = float(os.getenv('DEPLOY_USER_LEASE_TTL', '90'))  # seconds
+METADATA_BUCKET = os.getenv('METADATA_BUCKET_NAME', 'host-service-metadata')
+
+LEASE_PREFIX = 'admission/users/'  # admission/users/<owner_id>.json -> {"leases": [...]}
+
+
+class AdmissionRejected(Exception):
+    """The deploy cannot be admitted now; the client should retry after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeployTicket:
+    """Capacity held by one admitted deploy. release() is safe to call more than once."""
+
+    def __init__(self, controller, owner_id, size):
+        self.controller = controller
+        self.owner_id = owner_id
+        self.size = size
+        self.admitted_at = time.monotonic()
+        self.lease_id = None  # shared per-user lease, if one was taken
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self)
+
+
+class UserDeployLeases:
+    """
+    The per-user deploy cap, shared by every worker process: a user's running
+    deploys are leases in one small object per user, taken and dropped
+    through a MetadataWriter, so two processes can never both take the last
+    slot. Holders renew their leases while the deploy runs; expired ones (a
+    process died mid-deploy) are dropped on the way.
+    """
+
+    def __init__(self, max_per_user, ttl=None, bucket_name=METADATA_BUCKET):
+        self.max_per_user = max_per_user
+        self.ttl = USER_LEASE_TTL if ttl is None else ttl
+        self.bucket_name = bucket_name
+
+    def _writer(self, owner_id):
+        return MetadataWriter(self.bucket_name, f"{LEASE_PREFIX}{quote(owner_id, safe='')}.json",
+                              lambda: {"leases": []}, window=0)
+
+    def take(self, owner_id):
+        """Returns a lease ID, or raises MutationRejected when the user is at the cap."""
+        lease = {"id": uuid.uuid4().hex, "owner": f"{socket.gethostname()}:{os.getpid()}"}
+
+        def add(document):
+            now = time.time()
+            live = [l for l in document["leases"] if l["expires_at"] > now]
+            if len(live) >= self.max_per_user:
+                raise MutationRejected("A deployment for this account is already in progress")
+            document["leases"] = live + [dict(lease, expires_at=now + self.ttl)]
+        self._writer(owner_id).submit(add)
+        return lease["id"]
+
+    @property
+    def renew_interval(self):
+        return max(0.01, self.ttl / 3)
+
+    def renew(self, owner_id, lease_id):
+        """Pushes a held lease's expiry out by the TTL. Returns False if it has been lost."""
+        def extend(document):
+            for lease in document["leases"]:
+                if lease["id"] == lease_id:
+                    lease["expires_at"] = time.time() + self.ttl
+                    return True
+            raise MutationRejected("Lease expired and was dropped")
+        try:
+            return self._writer(owner_id).submit(extend)
+        except MutationRejected:
+            return False
+
+    def drop(self, owner_id, lease_id):
+        def remove(document):
+            document["leases"] = [l for l in document["leases"] if l["id"] != lease_id]
+        self._writer(owner_id).submit(remove)
+
+
+class AdmissionController:
+    """
+    Admits deploys against a global cap on concurrent deploys and in-flight
+    bytes, plus a per-user cap. Waiters are served strictly in arrival order
+    so a burst cannot starve earlier requests, and a user over their own cap
+    is turned away at once rather than occupying the queue. The global caps
+    are this process's share; the per-user cap also holds across processes
+    when `shared_user_leases` is on.
+    """
+
+    def __init__(self, max_concurrent=None, max_bytes=None, max_per_user=None,
+                 timeout=None, max_queue=None, shared_user_leases=None):
+        self.max_concurrent = max_concurrent or MAX_CONCURRENT_DEPLOYS
+        self.max_bytes = max_bytes or MAX_INFLIGHT_DEPLOY_BYTES
+        self.max_per_user = max_per_user or MAX_DEPLOYS_PER_USER
+        self.timeout = ADMISSION_TIMEOUT if timeout is None else timeout
+        self.max_queue = MAX_ADMISSION_QUEUE if max_queue is None else max_queue
+        shared = SHARED_USER_LEASES if shared_user_leases is None else shared_user_leases
+        self.leases = UserDeployLeases(self.max_per_user) if shared else None
+        self.in_flight = 0
+        self.in_flight_bytes = 0
+        self._per_user = {}  # owner_id -> admitted + waiting deploys
+        self._leased = set()  # admitted tickets whose shared lease is renewed until release
+        self._renewer = None
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._avg_duration = 10.0  # seconds, smoothed; used for Retry-After
+        self.stats = {"admitted": 0, "queued_total": 0, "rejected_user": 0,
+                      "rejected_queue_full": 0, "rejected_timeout": 0, "lease_errors": 0,
+                      "leases_lost": 0}
+
+    def _retry_after(self):
+        return max(1, math.ceil(self._avg_duration))
+
+    def _fits(self, size):
+        if self.in_flight >= self.max_concurrent:
+            return False
+        return self.in_flight == 0 or self.in_flight_bytes + size <= self.max_bytes
+
+    def acquire(self, owner_id, size):
+        """Waits (FIFO) for capacity and returns a DeployTicket, or raises AdmissionRejected."""
+        with self._cond:
+            self._check_user(owner_id)
+        # Outside the lock: taking the shared lease is a metadata round trip
+        lease_id = self._take_lease(owner_id)
+        try:
+            ticket = self._acquire_local(owner_id, size)
+        except Exception:
+            self._drop_lease(owner_id, lease_id)
+            raise
+        ticket.lease_id = lease_id
+        if lease_id is not None:
+            self._keep_renewed(ticket)
+        return ticket
+
+    def _check_user(self, owner_id):
+        if self._per_user.get(owner_id, 0) >= self.max_per_user:
+            self.stats["rejected_user"] += 1
+            raise AdmissionRejected("A deployment for this account is already in progress",
+                                    self._retry_after())
+
+    def _take_lease(self, owner_id):
+        if self.leases is None:
+            return None
+        try:
+            return self.leases.take(owner_id)
+        except MutationRejected as e:
+            with self._cond:
+                self.stats["rejected_user"] += 1
+                raise AdmissionRejected(str(e), self._retry_after())
+        except Exception as e:
+            # The deploy needs the metadata bucket anyway; don't fail it over the lease alone
+            with self._cond:
+                self.stats["lease_errors"] += 1
+            print(f"Warning: Could not take deploy lease for {owner_id}, using the local limit only: {e}")
+            return None
+
+    def _drop_lease(self, owner_id, lease_id):
+        if lease_id is None:
+            return
+        try:
+            self.leases.drop(owner_id, lease_id)
+        except Exception as e:
+            with self._cond:
+                self.stats["lease_errors"] += 1
+            print(f"Warning: Could not drop deploy lease for {owner_id} (expires on its own): {e}")
+
+    def _keep_renewed(self, ticket):
+        with self._cond:
+            self._leased.add(ticket)
+            if self._renewer is None:
+                self._renewer = threading.Thread(target=self._renew_leases, name='deploy-lease-renewer',
+                                                 daemon=True)
+                self._renewer.start()
+
+    def _renew_leases(self):
+        """Renews the leases of running deploys; exits once none are left."""
+        while True:
+            time.sleep(self.leases.renew_interval)
+            with self._cond:
+                tickets = list(self._leased)
+                if not tickets:
+                    self._renewer = None
+                    return
+            for ticket in tickets:
+                try:
+                    renewed = self.leases.renew(ticket.owner_id, ticket.lease_id)
+                except Exception as e:
+                    with self._cond:
+                        self.stats["lease_errors"] += 1
+                    print(f"Warning: Could not renew deploy lease for {ticket.owner_id}: {e}")
+                    continue
+                if not renewed and not ticket._released:
+                    with self._cond:
+                        self._leased.discard(ticket)
+                        self.stats["leases_lost"] += 1
+                    print(f"Warning: Deploy lease for {ticket.owner_id} expired before it could be renewed")
+
+    def _acquire_local(self, owner_id, size):
+        with self._cond:
+            # Re-checked: another thread may have been admitted while the lease was taken
+            self._check_user(owner_id)
+
+            if not self._queue and self._fits(size):
+                return self._admit(owner_id, size)
+
+            if len(self._queue) >= self.max_queue:
+                self.stats["rejected_queue_full"] += 1
+                raise AdmissionRejected("Server is busy, please retry shortly", self._retry_after())
+
+            waiter = object()
+            self._queue.append(waiter)
+            self._per_user[owner_id] = self._per_user.get(owner_id, 0) + 1
+            self.stats["queued_total"] += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while not (self._queue[0] is waiter and self._fits(size)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["rejected_timeout"] += 1
+                        raise AdmissionRejected("Server is busy, please retry shortly", self._retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self._queue.remove(waiter)
+                self._per_user[owner_id] -= 1
+                if not self._per_user[owner_id]:
+                    del self._per_user[owner_id]
+                # The next waiter may now be at the head of the queue
+                self._cond.notify_all()
+            return self._admit(owner_id, size)
+
+    def _admit(self, owner_id, size):
+        self.in_flight += 1
+        self.in_flight_bytes += size
+        self._per_user[owner_id] = self._per_user.get(owner_id, 0) + 1
+        self.stats["admitted"] += 1
+        return DeployTicket(self, owner_id, size)
+
+    def _release(self, ticket):
+        with self._cond:
+            self.in_flight -= 1
+            self.in_flight_bytes -= ticket.size
+            self._per_user[ticket.owner_id] -= 1
+            if not self._per_user[ticket.owner_id]:
+                del self._per_user[ticket.owner_id]
+            duration = time.monotonic() - ticket.admitted_at
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._leased.discard(ticket)
+            self._cond.notify_all()
+        self._drop_lease(ticket.owner_id, ticket.lease_id)
+
+    def to_dict(self):
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "in_flight_bytes": self.in_flight_bytes,
+                "queued": len(self._queue),
+                "max_concurrent": self.max_concurrent,
+                "max_bytes": self.max_bytes,
+                "max_queue": self.max_queue,
+                "processes": WEB_WORKERS,
+                "shared_user_leases": self.leases is not None,
+                **self.stats,
+            }
+
+
+# Shared by every deploy entry point in the process
+deploy_admission = AdmissionController()
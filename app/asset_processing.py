@@ -0,0 +1,78 @@
+import gzip
+import os
+import re
+import shutil
+import tempfile
+
+# --- Configuration ---
+ASSET_GZIP = os.getenv('ASSET_GZIP', 'true').lower() in ('1', 'true', 'yes')
+GZIP_LEVEL = int(os.getenv('ASSET_GZIP_LEVEL', '6'))
+# Smaller files gain nothing worth the Content-Encoding round trip
+GZIP_MIN_SIZE = int(os.getenv('ASSET_GZIP_MIN_SIZE', '1024'))
+# Keep the compressed copy only if it is at most this fraction of the original
+GZIP_MAX_RATIO = float(os.getenv('ASSET_GZIP_MAX_RATIO', '0.9'))
+# Compressed output of streamed members spills to disk above this size
+GZIP_SPOOL_SIZE = 1024 * 1024
+
+# Cache-Control policies (an empty value leaves the header unset)
+CACHE_CONTROL_HTML = os.getenv('CACHE_CONTROL_HTML', 'public, max-age=60, must-revalidate')
+CACHE_CONTROL_FINGERPRINTED = os.getenv('CACHE_CONTROL_FINGERPRINTED', 'public, max-age=31536000, immutable')
+CACHE_CONTROL_DEFAULT = os.getenv('CACHE_CONTROL_DEFAULT', 'public, max-age=3600')
+
+COMPRESSIBLE_TYPES = {
+    'application/javascript', 'application/json', 'application/manifest+json',
+    'application/xml', 'application/xhtml+xml', 'application/rss+xml',
+    'application/wasm', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon',
+    'font/ttf', 'font/otf', 'application/x-font-ttf', 'application/vnd.ms-fontobject',
+}
+
+# Build-tool content hashes: app.3f9a2b1c.js, chunk-5d41402abc4b.css, main.a1b2c3d4e5.min.js
+FINGERPRINT_PATTERN = re.compile(r'[.\-_][0-9a-f]{8,}[.\-_]', re.IGNORECASE)
+
+
+def is_compressible(content_type, size):
+    if not ASSET_GZIP or size < GZIP_MIN_SIZE:
+        return False
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE_TYPES
+
+
+def cache_control_for(filename, content_type):
+    """Cache-Control policy for one site file, or None to leave it unset."""
+    basename = filename.rsplit('/', 1)[-1]
+    if content_type == 'text/html':
+        policy = CACHE_CONTROL_HTML
+    elif FINGERPRINT_PATTERN.search(basename):
+        policy = CACHE_CONTROL_FINGERPRINTED
+    else:
+        policy = CACHE_CONTROL_DEFAULT
+    return policy or None
+
+
+def gzip_bytes(data):
+    """Gzips an in-memory file; returns the compressed bytes, or None if it does not pay off."""
+    # mtime=0 keeps the output identical for identical input
+    compressed = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) > len(data) * GZIP_MAX_RATIO:
+        return None
+    return compressed
+
+
+def gzip_stream(source, size):
+    """
+    Gzips a file-like object chunk by chunk into a spooled temporary file.
+    Returns (file rewound to the start, compressed length), or None if
+    compression does not pay off. `source` is always read to the end.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=GZIP_SPOOL_SIZE)
+    try:
+        with gzip.GzipFile(fileobj=spool, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) as gz:
+            shutil.copyfileobj(source, gz, 1024 * 1024)
+        length = spool.tell()
+        if length > size * GZIP_MAX_RATIO:
+            spool.close()
+            return None
+        spool.seek(0)
+        return spool, length
+    except Exception:
+        spool.close()
+        raise
@@ -0,0 +1,237 @@
+"""
+End-to-end benchmark of the API against the in-process OCI fake.
+
+Usage:
+    python -m app.benchmark [--users 8] [--deploys 2] [--files 200] [--file-size 20000]
+                            [--large-files 0] [--large-size 25000000]
+                            [--latency 0.02] [--throttle-rate 0] [--failure-rate 0]
+                            [--async] [--json results.json]
+
+Every simulated user registers, logs in, deploys, lists and deletes their
+sites, all users running concurrently. Phases run one after another, so
+the report attributes OCI calls to each endpoint: latency p50/p99/max,
+throughput, errors, OCI call counts and the peak RSS reached by the end
+of each phase.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import threading
+import time
+import zipfile
+from collections import Counter
+from dotenv import load_dotenv
+
+
+def build_zip(files, file_size, large_files=0, large_size=0, seed=0):
+    """A synthetic site: index.html plus a mix of text (compressible) and binary assets."""
+    rnd = random.Random(seed)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('index.html', '<html><body>benchmark</body></html>' * 20)
+        for i in range(files):
+            kind = i % 3
+            if kind == 0:
+                zf.writestr(f'css/style-{i}.css', (f'.c{i}{{color:#{i:06x}}}' * file_size)[:file_size])
+            elif kind == 1:
+                zf.writestr(f'js/app.{i:08x}.js', (f'var v{i}={i};' * file_size)[:file_size])
+            else:
+                zf.writestr(f'img/pic-{i}.png', rnd.randbytes(file_size))
+        for i in range(large_files):
+            zf.writestr(f'media/video-{i}.mp4', rnd.randbytes(large_size))
+    return buf.getvalue()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PhaseResult:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.statuses = Counter()
+        self.elapsed = 0.0
+        self.oci_calls = {}
+        self.peak_rss_mb = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, status):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.statuses[status] += 1
+
+    def to_dict(self):
+        requests = len(self.latencies)
+        errors = sum(count for status, count in self.statuses.items() if status >= 400)
+        return {
+            "endpoint": self.name,
+            "requests": requests,
+            "errors": errors,
+            "statuses": dict(self.statuses),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 1),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 1),
+            "max_ms": round(max(self.latencies, default=0) * 1000, 1),
+            "throughput_rps": round(requests / self.elapsed, 2) if self.elapsed else 0.0,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "oci_calls": self.oci_calls,
+            "oci_calls_total": sum(self.oci_calls.values()),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+        }
+
+
+def run_phase(name, users, action, fake):
+    """Runs action(user) for every user concurrently and measures it as one endpoint."""
+    result = PhaseResult(name)
+    fake.reset_call_counts()
+    barrier = threading.Barrier(len(users))
+
+    def worker(user):
+        barrier.wait()
+        for seconds, status in action(user):
+            result.record(seconds, status)
+
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.monotonic() - started
+    result.oci_calls = fake.get_call_counts()
+    result.peak_rss_mb = peak_rss_mb()
+    return result
+
+
+def timed(fn):
+    started = time.monotonic()
+    response = fn()
+    return time.monotonic() - started, response
+
+
+def wait_for_job(client, status_url, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(status_url).get_json()
+        if job.get('phase') in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    return {"phase": "failed", "error": "timed out"}
+
+
+def run_benchmark(args):
+    from app import create_app
+    from app.fake_oci import get_fake_client
+
+    fake = get_fake_client()
+    fake.latency = args.latency
+    fake.throttle_rate = args.throttle_rate
+    fake.failure_rate = args.failure_rate
+
+    app = create_app()
+    archive = build_zip(args.files, args.file_size, args.large_files, args.large_size)
+    print(f"Archive: {len(archive)} bytes, {args.files + args.large_files + 1} files; "
+          f"{args.users} users x {args.deploys} deploys; OCI latency {args.latency * 1000:.0f}ms")
+
+    users = [{"name": f"bench-{os.getpid()}-{i}", "client": app.test_client(), "sites": []}
+             for i in range(args.users)]
+
+    def register(user):
+        seconds, r = timed(lambda: user["client"].post(
+            '/api/auth/register', json={"username": user["name"], "password": "benchmark-pw"}))
+        yield seconds, r.status_code
+
+    def login(user):
+        seconds, r = timed(lambda: user["client"].post(
+            '/api/auth/login', json={"username": user["name"], "password": "benchmark-pw"}))
+        yield seconds, r.status_code
+
+    def deploy(user):
+        for _ in range(args.deploys):
+            def send():
+                r = user["client"].post(
+                    '/api/deploy?async=1' if args.use_async else '/api/deploy',
+                    data={"file": (io.BytesIO(archive), 'site.zip')},
+                    content_type='multipart/form-data')
+                if r.status_code == 202:
+                    # Measure until the background job finishes, not just until it is queued
+                    job = wait_for_job(user["client"], r.get_json()['status_url'])
+                    return job.get('bucket_name'), 201 if job['phase'] == 'done' else 500
+                return (r.get_json() or {}).get('bucket_name'), r.status_code
+            seconds, (bucket_name, status) = timed(send)
+            if bucket_name and status < 400:
+                user["sites"].append(bucket_name)
+            yield seconds, status
+
+    def list_sites(user):
+        for _ in range(args.lists):
+            seconds, r = timed(lambda: user["client"].get('/api/deploy'))
+            yield seconds, r.status_code
+
+    def delete(user):
+        for bucket_name in user["sites"]:
+            seconds, r = timed(lambda: user["client"].delete(f'/api/deploy/{bucket_name}'))
+            yield seconds, r.status_code
+
+    results = []
+    for name, action in (("register", register), ("login", login), ("deploy", deploy),
+                         ("list", list_sites), ("delete", delete)):
+        result = run_phase(name, users, action, fake)
+        results.append(result.to_dict())
+        print_row(results[-1])
+    return results
+
+
+def print_row(row):
+    calls = ", ".join(f"{op}={count}" for op, count in sorted(row["oci_calls"].items()))
+    print(f"{row['endpoint']:<9} n={row['requests']:<5} err={row['errors']:<4} "
+          f"p50={row['p50_ms']:>8.1f}ms p99={row['p99_ms']:>8.1f}ms "
+          f"{row['throughput_rps']:>8.2f} req/s  rss={row['peak_rss_mb']:.0f}MB  oci[{calls}]")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark the API against the in-process OCI fake.")
+    parser.add_argument('--users', type=int, default=8, help="Concurrent simulated users")
+    parser.add_argument('--deploys', type=int, default=2, help="Deploys per user")
+    parser.add_argument('--lists', type=int, default=5, help="Site listings per user")
+    parser.add_argument('--files', type=int, default=200, help="Small files per archive")
+    parser.add_argument('--file-size', type=int, default=20000, help="Bytes per small file")
+    parser.add_argument('--large-files', type=int, default=0, help="Large (binary) files per archive")
+    parser.add_argument('--large-size', type=int, default=25 * 1024 * 1024, help="Bytes per large file")
+    parser.add_argument('--latency', type=float, default=0.02, help="Fake OCI latency per call (seconds)")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Probability of an injected 429")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Probability of an injected 503")
+    parser.add_argument('--async', dest='use_async', action='store_true', help="Deploy through background jobs")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    # Everything runs offline against the fake; quotas and admission must not skew the numbers
+    os.environ['OCI_AUTH_METHOD'] = 'fake'
+    os.environ.setdefault('OCI_COMPARTMENT_ID', 'ocid1.compartment.oc1..benchmark')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('MAX_SITES_PER_USER', str(args.deploys + 1))
+    os.environ.setdefault('DEPLOY_ADMISSION_TIMEOUT', '600')
+    os.environ.setdefault('DEPLOY_ADMISSION_QUEUE', str(args.users + 1))
+
+    results = run_benchmark(args)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({"args": vars(args), "results": results}, fh, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
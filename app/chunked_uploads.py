@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import shutil
+import string
+import tempfile
+import threading
+import time
+import uuid
+
+# --- Configuration ---
+# Must be on one filesystem: completed archives are renamed, not copied, out of their session
+CHUNKED_UPLOAD_DIR = os.getenv('CHUNKED_UPLOAD_DIR') or os.path.join(tempfile.gettempdir(), 'chunked-uploads')
+CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(5 * 1024 * 1024)))  # 5MB
+MAX_CHUNKED_UPLOAD_SIZE = int(os.getenv('MAX_CHUNKED_UPLOAD_SIZE', str(200 * 1024 * 1024)))  # 200MB
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', '86400'))  # abandoned sessions are removed after this
+# ...or after this, if not a single chunk has arrived
+IDLE_UPLOAD_SESSION_TTL = int(os.getenv('IDLE_UPLOAD_SESSION_TTL', '900'))
+# Each session preallocates its declared size on disk, so a user's open sessions are capped
+MAX_OPEN_UPLOADS_PER_USER = int(os.getenv('MAX_OPEN_UPLOADS_PER_USER', '3'))
+MAX_OPEN_UPLOAD_BYTES_PER_USER = int(os.getenv('MAX_OPEN_UPLOAD_BYTES_PER_USER',
+                                               str(400 * 1024 * 1024)))  # 400MB
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_create_lock = threading.Lock()
+
+
+class UploadLimitExceeded(Exception):
+    """The user already has too many (429) or too large (413) uploads open."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadSession:
+    """
+    A resumable upload assembled on local disk. The archive file is
+    preallocated and every chunk is written straight to its offset, so
+    chunks may arrive in any order and in parallel, and no assembly copy is
+    needed. A chunk counts as received only once a marker file is written
+    after it, so an interrupted chunk is simply sent again.
+    """
+
+    def __init__(self, upload_id, owner_id, filename, size, chunk_size, created_at):
+        self.upload_id = upload_id
+        self.owner_id = owner_id
+        self.filename = filename
+        self.size = size
+        self.chunk_size = chunk_size
+        self.created_at = created_at
+
+    @property
+    def directory(self):
+        return os.path.join(CHUNKED_UPLOAD_DIR, self.upload_id)
+
+    @property
+    def data_path(self):
+        return os.path.join(self.directory, 'archive.zip')
+
+    @property
+    def chunks_dir(self):
+        return os.path.join(self.directory, 'chunks')
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    @classmethod
+    def create(cls, owner_id, filename, size):
+        if size <= 0:
+            raise ValueError("Upload size must be positive")
+        if size > MAX_CHUNKED_UPLOAD_SIZE:
+            raise ValueError(f"ZIP file too large (max {MAX_CHUNKED_UPLOAD_SIZE // (1024*1024)}MB)")
+
+        prune_expired_sessions()
+        # Serialises this process's checks; other workers can still overshoot by a session each
+        with _create_lock:
+            open_sessions = [s for s in list_sessions() if s.owner_id == owner_id]
+            if len(open_sessions) >= MAX_OPEN_UPLOADS_PER_USER:
+                raise UploadLimitExceeded(
+                    f"Too many uploads in progress (max {MAX_OPEN_UPLOADS_PER_USER}); "
+                    "complete or abort one first", 429)
+            if sum(s.size for s in open_sessions) + size > MAX_OPEN_UPLOAD_BYTES_PER_USER:
+                raise UploadLimitExceeded(
+                    f"Uploads in progress would exceed {MAX_OPEN_UPLOAD_BYTES_PER_USER // (1024*1024)}MB; "
+                    "complete or abort one first", 413)
+
+            upload = cls(uuid.uuid4().hex, owner_id, filename, size, CHUNK_SIZE, time.time())
+            os.makedirs(upload.chunks_dir)
+            with open(upload.data_path, 'wb') as fh:
+                fh.truncate(size)
+            with open(os.path.join(upload.directory, 'session.json'), 'w') as fh:
+                json.dump(upload.to_dict(include_chunks=False), fh)
+        return upload
+
+    @classmethod
+    def load(cls, upload_id):
+        """Returns the session, or None if the ID is unknown, expired or already completed."""
+        if not upload_id or not all(c in string.hexdigits for c in upload_id):
+            return None
+        try:
+            with open(os.path.join(CHUNKED_UPLOAD_DIR, upload_id, 'session.json')) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        return cls(upload_id, data['owner_id'], data['filename'], data['size'],
+                   data['chunk_size'], data['created_at'])
+
+    def chunk_length(self, index):
+        if not 0 <= index < self.total_chunks:
+            raise ValueError(f"Chunk index out of range (0-{self.total_chunks - 1})")
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def write_chunk(self, index, stream, sha256=None):
+        """
+        Writes chunk `index` from a file-like object. The body must be exactly
+        the chunk's length and, if `sha256` (hex) is given, match it.
+        """
+        expected = self.chunk_length(index)
+        digest = hashlib.sha256()
+        written = 0
+        fd = os.open(self.data_path, os.O_WRONLY)
+        try:
+            offset = index * self.chunk_size
+            while True:
+                block = stream.read(COPY_BUFFER_SIZE)
+                if not block:
+                    break
+                if written + len(block) > expected:
+                    raise ValueError(f"Chunk {index} is larger than {expected} bytes")
+                os.pwrite(fd, block, offset + written)
+                digest.update(block)
+                written += len(block)
+        finally:
+            os.close(fd)
+
+        if written != expected:
+            raise ValueError(f"Chunk {index} is {written} bytes, expected {expected}")
+        if sha256 and digest.hexdigest() != sha256.lower():
+            raise ValueError(f"Chunk {index} failed its checksum")
+
+        open(os.path.join(self.chunks_dir, str(index)), 'w').close()
+
+    def received_chunks(self):
+        try:
+            return sorted(int(name) for name in os.listdir(self.chunks_dir))
+        except FileNotFoundError:
+            return []
+
+    def missing_chunks(self):
+        received = set(self.received_chunks())
+        return [i for i in range(self.total_chunks) if i not in received]
+
+    def detach(self):
+        """
+        Takes the assembled archive out of the session and removes the session.
+        Returns the archive's path (now owned by the caller), or None if another
+        request already completed this upload.
+        """
+        archive_path = os.path.join(CHUNKED_UPLOAD_DIR, f"deploy-{self.upload_id}.zip")
+        try:
+            # Atomic, so a duplicate "complete" cannot deploy the same archive twice
+            os.replace(self.data_path, archive_path)
+        except FileNotFoundError:
+            return None
+        self.discard()
+        return archive_path
+
+    def restore(self, archive_path):
+        """
+        Puts a detached archive back and recreates the session around it, e.g.
+        when its deploy was turned away with a 429, so the client can simply
+        complete the same upload again.
+        """
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.replace(archive_path, self.data_path)
+        for index in range(self.total_chunks):
+            open(os.path.join(self.chunks_dir, str(index)), 'w').close()
+        # Written last: until it exists, load() does not see a half-restored session
+        with open(os.path.join(self.directory, 'session.json'), 'w') as fh:
+            json.dump(self.to_dict(include_chunks=False), fh)
+
+    def discard(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def to_dict(self, include_chunks=True):
+        data = {
+            "upload_id": self.upload_id,
+            "owner_id": self.owner_id,
+            "filename": self.filename,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": self.total_chunks,
+            "created_at": self.created_at,
+        }
+        if include_chunks:
+            data["received_chunks"] = self.received_chunks()
+        return data
+
+
+def list_sessions():
+    """Every open upload session on this host."""
+    try:
+        entries = os.listdir(CHUNKED_UPLOAD_DIR)
+    except FileNotFoundError:
+        return []
+    sessions = (UploadSession.load(name) for name in entries)
+    return [upload for upload in sessions if upload]
+
+
+def prune_expired_sessions():
+    """
+    Removes sessions (and orphaned archives) older than UPLOAD_SESSION_TTL,
+    and sessions that received no chunk within IDLE_UPLOAD_SESSION_TTL.
+    """
+    now = time.time()
+    cutoff = now - UPLOAD_SESSION_TTL
+    idle_cutoff = now - IDLE_UPLOAD_SESSION_TTL
+    try:
+        entries = os.listdir(CHUNKED_UPLOAD_DIR)
+    except FileNotFoundError:
+        return
+    for name in entries:
+        path = os.path.join(CHUNKED_UPLOAD_DIR, name)
+        try:
+            if os.path.getmtime(path) >= cutoff and not _is_idle(path, idle_cutoff):
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _is_idle(path, idle_cutoff):
+    """A session directory created before `idle_cutoff` that has not received a chunk since."""
+    chunks_dir = os.path.join(path, 'chunks')
+    try:
+        return os.path.getmtime(path) < idle_cutoff and not os.listdir(chunks_dir)
+    except (NotADirectoryError, FileNotFoundError):
+        return False
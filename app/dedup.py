@@ -0,0 +1,263 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import oci
+from app.metadata_cache import metadata_cache
+from app.metadata_writer import MetadataWriter
+from app.routes.utils_route import get_oci_client, get_namespace, get_region
+
+# --- Configuration ---
+# Content-addressed deploys: files already stored anywhere on the platform are
+# server-side copied from there instead of being uploaded again.
+DEDUP_ENABLED = os.getenv('DEPLOY_DEDUP', 'false').lower() in ('1', 'true', 'yes')
+# Below this size an upload is cheaper than an index lookup plus a copy
+DEDUP_MIN_SIZE = int(os.getenv('DEPLOY_DEDUP_MIN_SIZE', str(256 * 1024)))  # 256KB
+# Copies are asynchronous work requests; cancel and upload after this long
+DEDUP_COPY_TIMEOUT = float(os.getenv('DEPLOY_DEDUP_COPY_TIMEOUT', '30'))  # seconds
+# How long a canceled copy gets to confirm it stopped before the deploy is failed
+DEDUP_CANCEL_TIMEOUT = float(os.getenv('DEPLOY_DEDUP_CANCEL_TIMEOUT', '10'))  # seconds
+METADATA_BUCKET = os.getenv('METADATA_BUCKET_NAME', 'host-service-metadata')
+
+INDEX_PREFIX = 'dedup/objects/'  # dedup/objects/<sha256>.json -> where that content is stored
+SOURCES_PREFIX = 'dedup/sources/'  # dedup/sources/<bucket>.json -> {"sha256": [entries pointing there]}
+STATS_OBJECT = 'dedup/stats.json'  # platform-wide totals, for dedup ratios
+COPY_POLL_INTERVAL = 0.2
+MAX_SOURCE_WRITERS = 64
+WORK_REQUEST_DONE = ('COMPLETED', 'FAILED', 'CANCELED')
+
+
+class CopyUnresolved(Exception):
+    """A timed-out copy could not be confirmed canceled; it may still land in the destination."""
+
+
+def content_sha256(zip_file, zinfo, content=None):
+    """
+    SHA-256 of a member's content. Copies are made on the strength of this
+    hash alone, so it must be collision resistant (MD5 is not).
+    """
+    if content is not None:
+        return hashlib.sha256(content).hexdigest()
+    digest = hashlib.sha256()
+    with zip_file.open(zinfo) as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _add_totals(totals, files, deduplicated_files, total_bytes, deduplicated_bytes):
+    """Mutation for the stats writer."""
+    for key, value in (("files", files), ("deduplicated_files", deduplicated_files),
+                       ("bytes", total_bytes), ("deduplicated_bytes", deduplicated_bytes)):
+        totals[key] = totals.get(key, 0) + value
+
+
+class DedupIndex:
+    """
+    Platform-wide content index: one small object per SHA-256 in the metadata
+    bucket, naming the bucket/object that first stored that content, its
+    ETag and how it was stored (content type, encoding, Cache-Control).
+    A lookup hit becomes a copy_object guarded by the recorded ETag, so a
+    source that was since overwritten or deleted is never copied; the
+    caller then falls back to a normal upload and re-points the entry.
+    Each source bucket also lists the entries pointing at it, so deleting
+    the bucket drops them (forget_bucket).
+    """
+
+    def __init__(self, bucket_name=METADATA_BUCKET):
+        self.bucket_name = bucket_name
+        self.stats_writer = MetadataWriter(bucket_name, STATS_OBJECT, dict)
+        self._lock = threading.Lock()
+        self._source_writers = OrderedDict()  # bucket -> MetadataWriter, least recently used first
+        self.stats = {"lookups": 0, "hits": 0, "copies": 0, "copy_failures": 0,
+                      "registered": 0, "forgotten": 0, "deduplicated_bytes": 0, "candidate_bytes": 0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _key(self, sha256):
+        return f"{INDEX_PREFIX}{sha256}.json"
+
+    def _sources_writer(self, bucket_name):
+        """Shared per bucket, so the registrations of one deploy are group committed."""
+        with self._lock:
+            writer = self._source_writers.get(bucket_name)
+            if writer is None:
+                writer = MetadataWriter(self.bucket_name, f"{SOURCES_PREFIX}{bucket_name}.json",
+                                        lambda: {"sha256": []})
+                self._source_writers[bucket_name] = writer
+                while len(self._source_writers) > MAX_SOURCE_WRITERS:
+                    self._source_writers.popitem(last=False)
+            else:
+                self._source_writers.move_to_end(bucket_name)
+            return writer
+
+    def lookup(self, sha256):
+        """Returns (entry, etag) for stored content, or (None, None)."""
+        self._count("lookups")
+        try:
+            entry, etag = metadata_cache.get(get_oci_client('object_storage'), get_namespace(),
+                                             self.bucket_name, self._key(sha256))
+        except oci.exceptions.ServiceError as e:
+            if e.status == 404:
+                return None, None
+            raise
+        self._count("hits")
+        return entry, etag
+
+    def register(self, sha256, entry, replace_etag=None):
+        """
+        Records where some content is stored. The first deploy to store it
+        wins; `replace_etag` re-points an entry whose source proved stale.
+        """
+        preconditions = {"if_match": replace_etag} if replace_etag else {"if_none_match": '*'}
+        try:
+            def list_source(sources):
+                if sha256 not in sources["sha256"]:
+                    sources["sha256"].append(sha256)
+            # Listed under the bucket first, so an entry is never left behind when it is deleted
+            self._sources_writer(entry["bucket"]).submit(list_source)
+            metadata_cache.put(get_oci_client('object_storage'), get_namespace(),
+                               self.bucket_name, self._key(sha256), entry, **preconditions)
+            self._count("registered")
+        except oci.exceptions.ServiceError as e:
+            # 412: another deploy registered (or re-pointed) it first, which is just as good
+            if e.status != 412:
+                print(f"Warning: Could not register dedup entry {sha256[:12]}: {e.message}")
+        except Exception as e:
+            print(f"Warning: Could not register dedup entry {sha256[:12]}: {e}")
+
+    def forget_bucket(self, bucket_name):
+        """
+        Drops the index entries that point at a deleted bucket. Entries
+        re-pointed elsewhere since are kept (the delete is ETag-guarded).
+        Returns how many were dropped.
+        """
+        client, namespace = get_oci_client('object_storage'), get_namespace()
+        sources_object = f"{SOURCES_PREFIX}{bucket_name}.json"
+        try:
+            sources, _ = metadata_cache.get(client, namespace, self.bucket_name, sources_object)
+        except oci.exceptions.ServiceError as e:
+            if e.status == 404:
+                return 0
+            raise
+        dropped = 0
+        for sha256 in sources["sha256"]:
+            key = self._key(sha256)
+            try:
+                entry, etag = metadata_cache.get(client, namespace, self.bucket_name, key)
+                if entry.get("bucket") != bucket_name:
+                    continue
+                client.delete_object(namespace, self.bucket_name, key, if_match=etag)
+                dropped += 1
+            except oci.exceptions.ServiceError as e:
+                # 404: already gone; 412: re-pointed since it was read
+                if e.status not in (404, 412):
+                    raise
+            finally:
+                metadata_cache.invalidate(self.bucket_name, key)
+        try:
+            client.delete_object(namespace, self.bucket_name, sources_object)
+        except oci.exceptions.ServiceError as e:
+            if e.status != 404:
+                raise
+        metadata_cache.invalidate(self.bucket_name, sources_object)
+        self._count("forgotten", dropped)
+        return dropped
+
+    def copy(self, client, namespace, entry, bucket_name, object_name):
+        """
+        Server-side copies an indexed object into `bucket_name` and waits for
+        the work request. Returns True once the copy has landed; False means
+        the caller should upload the content itself. A copy that times out
+        is canceled first, so it cannot land over that upload later; if the
+        cancel can't be confirmed, CopyUnresolved fails the deploy instead.
+        """
+        details = oci.object_storage.models.CopyObjectDetails(
+            source_object_name=entry["object"],
+            source_object_if_match_e_tag=entry["etag"],
+            destination_region=get_region(),
+            destination_namespace=namespace,
+            destination_bucket=bucket_name,
+            destination_object_name=object_name,
+        )
+        work_request_id = None
+        try:
+            response = client.copy_object(namespace, entry["bucket"], details)
+            work_request_id = response.headers.get('opc-work-request-id')
+            status = self._wait(client, work_request_id, DEDUP_COPY_TIMEOUT) if work_request_id else 'COMPLETED'
+            if status is None:
+                status = self._cancel(client, work_request_id)
+            if status != 'COMPLETED':
+                raise RuntimeError(f"copy work request {work_request_id} {status.lower()}")
+        except CopyUnresolved:
+            raise
+        except Exception as e:
+            # Source gone (404), changed (412), or the copy failed: upload instead
+            self._count("copy_failures")
+            print(f"[DEBUG] Dedup copy of {object_name} from {entry['bucket']} failed, uploading: "
+                  f"{getattr(e, 'message', None) or e}")
+            return False
+        self._count("copies")
+        return True
+
+    def _wait(self, client, work_request_id, timeout):
+        """Polls a work request until it ends; returns its final status, or None on timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            status = client.get_work_request(work_request_id).data.status
+            if status in WORK_REQUEST_DONE:
+                return status
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(COPY_POLL_INTERVAL)
+
+    def _cancel(self, client, work_request_id):
+        """Cancels a copy and returns how it ended (it may have completed first)."""
+        try:
+            client.cancel_work_request(work_request_id)
+        except oci.exceptions.ServiceError as e:
+            # 409: it already ended; the status below says how
+            if e.status != 409:
+                raise CopyUnresolved(f"Could not cancel copy work request {work_request_id}: {e.message}")
+        try:
+            status = self._wait(client, work_request_id, DEDUP_CANCEL_TIMEOUT)
+        except Exception as e:
+            raise CopyUnresolved(f"Could not confirm copy work request {work_request_id} stopped: {e}")
+        if status is None:
+            raise CopyUnresolved(f"Copy work request {work_request_id} did not stop after being canceled")
+        return status
+
+    def record_deploy(self, files, deduplicated_files, total_bytes, deduplicated_bytes):
+        """Adds one deploy's candidate/deduplicated totals to the platform-wide stats."""
+        self._count("candidate_bytes", total_bytes)
+        self._count("deduplicated_bytes", deduplicated_bytes)
+        try:
+            self.stats_writer.submit(lambda totals: _add_totals(
+                totals, files, deduplicated_files, total_bytes, deduplicated_bytes))
+        except Exception as e:
+            print(f"Warning: Could not update dedup totals: {e}")
+
+    def report(self):
+        """Platform-wide and in-process dedup ratios."""
+        try:
+            totals, _ = metadata_cache.get(get_oci_client('object_storage'), get_namespace(),
+                                           self.bucket_name, STATS_OBJECT)
+        except Exception:
+            totals = {}
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            "enabled": DEDUP_ENABLED,
+            "min_size": DEDUP_MIN_SIZE,
+            "platform": dict(totals, byte_ratio=round(totals.get("deduplicated_bytes", 0) / totals["bytes"], 4)
+                             if totals.get("bytes") else 0.0),
+            "process": dict(stats, byte_ratio=round(stats["deduplicated_bytes"] / stats["candidate_bytes"], 4)
+                            if stats["candidate_bytes"] else 0.0),
+        }
+
+
+# Shared by every deploy in the process
+dedup_index = DedupIndex()
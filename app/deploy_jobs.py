@@ -0,0 +1,250 @@
+import datetime
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import oci
+from app.routes.utils_route import get_oci_client, get_namespace
+
+# --- Configuration ---
+DEPLOY_JOB_WORKERS = int(os.getenv('DEPLOY_JOB_WORKERS', '4'))
+# Finished jobs (in memory and their snapshots in the metadata bucket) are kept this long after finishing
+JOB_RETENTION_SECONDS = int(os.getenv('DEPLOY_JOB_RETENTION', '3600'))
+# Progress snapshots are persisted at most this often (phase changes always are)
+JOB_PERSIST_INTERVAL = 2.0
+# How often expired jobs and snapshots are cleaned up
+JOB_SWEEP_INTERVAL = 600
+METADATA_BUCKET = os.getenv('METADATA_BUCKET_NAME', 'host-service-metadata')
+JOB_PREFIX = 'jobs/'
+LIST_PAGE_SIZE = 1000
+
+_jobs = {}  # job_id -> DeployJob
+_jobs_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=DEPLOY_JOB_WORKERS, thread_name_prefix='deploy-job')
+_janitor = None
+
+
+class DeployJob:
+    """
+    Progress of one background deployment. Snapshots are also written to the
+    metadata bucket so any worker process can answer a status poll: phase
+    changes right away, upload progress by the janitor thread (never by the
+    uploader threads reporting it).
+    """
+
+    def __init__(self, owner_id, files_total=0, bytes_total=0):
+        self.job_id = uuid.uuid4().hex
+        self.owner_id = owner_id
+        self.phase = 'queued'
+        self.files_total = files_total
+        self.files_uploaded = 0
+        self.bytes_total = bytes_total
+        self.bytes_uploaded = 0
+        self.bucket_name = None
+        self.site_url = None
+        self.error = None
+        self.created_at = datetime.datetime.utcnow().isoformat()
+        self.finished_at = None
+        self.finished_time = None  # time.time() when done or failed; retention counts from here
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._dirty = False  # progress not persisted yet
+
+    @property
+    def finished(self):
+        return self.phase in ('done', 'failed')
+
+    def set_phase(self, phase, **changes):
+        with self._lock:
+            self.phase = phase
+            for key, value in changes.items():
+                setattr(self, key, value)
+            if self.finished:
+                self.finished_at = datetime.datetime.utcnow().isoformat()
+                self.finished_time = time.time()
+        self.persist()
+
+    def file_uploaded(self, name, size):
+        """Progress callback for the upload engine; the janitor persists it."""
+        with self._lock:
+            self.files_uploaded += 1
+            self.bytes_uploaded += size
+            self._dirty = True
+
+    @property
+    def dirty(self):
+        with self._lock:
+            return self._dirty
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "owner_id": self.owner_id,
+                "phase": self.phase,
+                "files_total": self.files_total,
+                "files_uploaded": self.files_uploaded,
+                "bytes_total": self.bytes_total,
+                "bytes_uploaded": self.bytes_uploaded,
+                "bucket_name": self.bucket_name,
+                "site_url": self.site_url,
+                "error": self.error,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+
+    def persist(self):
+        """
+        Writes the current snapshot. Writes of one job are serialized and
+        each takes its snapshot inside that lock, so an older snapshot never
+        lands after a newer one.
+        """
+        with self._persist_lock:
+            with self._lock:
+                self._dirty = False
+            snapshot = self.to_dict()
+            try:
+                client = get_oci_client('object_storage')
+                client.put_object(
+                    get_namespace(), METADATA_BUCKET, _snapshot_key(self.job_id),
+                    json.dumps(snapshot).encode('utf-8'),
+                    content_type='application/json'
+                )
+            except Exception as e:
+                # Status is still served from memory by this process; the janitor retries
+                with self._lock:
+                    self._dirty = True
+                print(f"Warning: could not persist job {self.job_id}: {e}")
+
+
+def _snapshot_key(job_id):
+    return f"{JOB_PREFIX}{job_id}.json"
+
+
+def _delete_snapshot(client, namespace, object_name):
+    try:
+        client.delete_object(namespace, METADATA_BUCKET, object_name)
+    except oci.exceptions.ServiceError as e:
+        if e.status != 404:
+            raise
+
+
+def _prune_finished_jobs():
+    """Drops jobs that finished over JOB_RETENTION_SECONDS ago from memory, along with their snapshots."""
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items()
+                   if job.finished_time is not None and job.finished_time < cutoff]
+        for job_id in expired:
+            del _jobs[job_id]
+    if expired:
+        client = get_oci_client('object_storage')
+        namespace = get_namespace()
+        for job_id in expired:
+            _delete_snapshot(client, namespace, _snapshot_key(job_id))
+
+
+def expire_job_snapshots():
+    """
+    Deletes snapshots not written for JOB_RETENTION_SECONDS, including those
+    of jobs whose process exited before it could prune them. Returns how many.
+    """
+    client = get_oci_client('object_storage')
+    namespace = get_namespace()
+    deleted = 0
+    start = None
+    while True:
+        kwargs = {"prefix": JOB_PREFIX, "fields": 'name,timeCreated', "limit": LIST_PAGE_SIZE}
+        if start:
+            kwargs["start"] = start
+        response = client.list_objects(namespace, METADATA_BUCKET, **kwargs)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for obj in response.data.objects:
+            # Every persist rewrites the object, so time_created is its last update
+            if obj.time_created and (now - obj.time_created).total_seconds() > JOB_RETENTION_SECONDS:
+                _delete_snapshot(client, namespace, obj.name)
+                deleted += 1
+        start = response.data.next_start_with
+        if not start:
+            return deleted
+
+
+def _janitor_loop():
+    last_sweep = time.monotonic()
+    while True:
+        time.sleep(JOB_PERSIST_INTERVAL)
+        with _jobs_lock:
+            jobs = list(_jobs.values())
+        for job in jobs:
+            if job.dirty:
+                job.persist()
+        if time.monotonic() - last_sweep >= JOB_SWEEP_INTERVAL:
+            last_sweep = time.monotonic()
+            try:
+                _prune_finished_jobs()
+                expired = expire_job_snapshots()
+                if expired:
+                    print(f"[DEBUG] Deleted {expired} expired deploy job snapshots")
+            except Exception as e:
+                print(f"Warning: could not clean up deploy jobs: {e}")
+
+
+def start_janitor():
+    """Starts the thread persisting job progress and expiring old jobs (once per process)."""
+    global _janitor
+    with _jobs_lock:
+        if _janitor is not None and _janitor.is_alive():
+            return
+        _janitor = threading.Thread(target=_janitor_loop, name='deploy-job-janitor', daemon=True)
+        _janitor.start()
+
+
+def submit_job(job, work):
+    """
+    Runs work(job) on the deploy worker pool. `work` returns a dict of final
+    job fields (bucket_name, site_url); any exception marks the job failed.
+    `work` is responsible for its own rollback.
+    """
+    start_janitor()
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+    job.persist()
+
+    def run():
+        try:
+            result = work(job) or {}
+            job.set_phase('done', **result)
+        except Exception as e:
+            traceback.print_exc()
+            job.set_phase('failed', error=str(e) or e.__class__.__name__)
+
+    try:
+        _executor.submit(run)
+    except Exception:
+        # Never queued (e.g. the pool is shutting down): nothing will finish it
+        with _jobs_lock:
+            _jobs.pop(job.job_id, None)
+        raise
+    return job
+
+
+def get_job(job_id):
+    """Returns the job's status dict, from memory or from its persisted snapshot."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job:
+        return job.to_dict()
+    try:
+        client = get_oci_client('object_storage')
+        response = client.get_object(get_namespace(), METADATA_BUCKET, _snapshot_key(job_id))
+        return json.loads(response.data.content.decode('utf-8'))
+    except Exception:
+        return None
+
+
+def shutdown_jobs(wait=True):
+    """Stops accepting jobs and (optionally) waits for running ones to finish."""
+    _executor.shutdown(wait=wait)
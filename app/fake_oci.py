@@ -0,0 +1,351 @@
+import base64
+import datetime
+import hashlib
+import io
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from types import SimpleNamespace
+
+import oci
+from oci.object_storage import models
+from oci.response import Response
+
+# --- Fault Injection Defaults (overridable per instance) ---
+FAKE_OCI_LATENCY = float(os.getenv('FAKE_OCI_LATENCY', '0'))  # seconds per call
+FAKE_OCI_THROTTLE_RATE = float(os.getenv('FAKE_OCI_THROTTLE_RATE', '0'))  # probability of 429
+FAKE_OCI_FAILURE_RATE = float(os.getenv('FAKE_OCI_FAILURE_RATE', '0'))  # probability of 500
+FAKE_OCI_NAMESPACE = os.getenv('FAKE_OCI_NAMESPACE', 'fakenamespace')
+FAKE_OCI_REGION = os.getenv('OCI_REGION') or 'il-jerusalem-1'
+METADATA_BUCKET = os.getenv('METADATA_BUCKET_NAME', 'host-service-metadata')
+
+_fake_client = None
+_fake_client_lock = threading.Lock()
+
+
+class _FakeBody:
+    """Mimics the streamed body returned by get_object (``response.data``)."""
+
+    def __init__(self, content):
+        self.content = content
+        self.raw = io.BytesIO(content)
+
+    def iter_content(self, chunk_size=1024 * 1024):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _read_body(body):
+    if body is None:
+        return b''
+    if isinstance(body, str):
+        return body.encode('utf-8')
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return bytes(body)
+    return body.read()
+
+
+class FakeObjectStorageClient:
+    """
+    In-process stand-in for oci.object_storage.ObjectStorageClient.
+    Implements the subset of operations this app uses, with configurable
+    per-call latency, throttling (429) and failure (500) injection.
+    """
+
+    def __init__(self, latency=None, throttle_rate=None, failure_rate=None, fail_ops=None, seed=None):
+        self.latency = FAKE_OCI_LATENCY if latency is None else latency
+        self.throttle_rate = FAKE_OCI_THROTTLE_RATE if throttle_rate is None else throttle_rate
+        self.failure_rate = FAKE_OCI_FAILURE_RATE if failure_rate is None else failure_rate
+        # Operations that always fail with 500 (e.g. {'put_object'}).
+        self.fail_ops = set(fail_ops or ())
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._buckets = {}
+        self._uploads = {}
+        self.base_client = SimpleNamespace(
+            endpoint=f"https://objectstorage.{FAKE_OCI_REGION}.oraclecloud.com",
+            session=SimpleNamespace(adapters={}),
+        )
+
+    # --- Plumbing ---
+
+    def _call(self, op):
+        with self._lock:
+            self.calls[op] += 1
+            roll = self._random.random()
+        if self.latency:
+            time.sleep(self.latency)
+        if op in self.fail_ops:
+            self._error(500, 'InternalServerError', f"Injected failure for {op}")
+        if roll < self.throttle_rate:
+            self._error(429, 'TooManyRequests', 'Injected throttle')
+        if roll < self.throttle_rate + self.failure_rate:
+            self._error(503, 'ServiceUnavailable', 'Injected transient failure')
+
+    @staticmethod
+    def _error(status, code, message):
+        raise oci.exceptions.ServiceError(status, code, {}, message)
+
+    @staticmethod
+    def _response(data=None, headers=None, status=200):
+        return Response(status, headers or {}, data, None)
+
+    def _bucket(self, bucket_name):
+        bucket = self._buckets.get(bucket_name)
+        if bucket is None:
+            self._error(404, 'BucketNotFound', f"Bucket {bucket_name} not found")
+        return bucket
+
+    def _store(self, bucket_name, object_name, content, **attrs):
+        bucket = self._bucket(bucket_name)
+        record = {
+            "content": content,
+            "etag": uuid.uuid4().hex,
+            "md5": base64.b64encode(hashlib.md5(content).digest()).decode('ascii'),
+            "time_created": _now(),
+        }
+        record.update(attrs)
+        bucket["objects"][object_name] = record
+        return record
+
+    @staticmethod
+    def _check_preconditions(existing, if_match=None, if_none_match=None):
+        if if_match and (existing is None or existing["etag"] != if_match):
+            FakeObjectStorageClient._error(412, 'IfMatchFailed', 'ETag does not match')
+        if if_none_match == '*' and existing is not None:
+            FakeObjectStorageClient._error(412, 'IfNoneMatchFailed', 'Object already exists')
+
+    # --- Namespace & Buckets ---
+
+    def get_namespace(self, **kwargs):
+        self._call('get_namespace')
+        return self._response(FAKE_OCI_NAMESPACE)
+
+    def create_bucket(self, namespace_name, create_bucket_details, **kwargs):
+        self._call('create_bucket')
+        with self._lock:
+            name = create_bucket_details.name
+            if name in self._buckets:
+                self._error(409, 'BucketAlreadyExists', f"Bucket {name} already exists")
+            self._buckets[name] = {
+                "compartment_id": create_bucket_details.compartment_id,
+                "time_created": _now(),
+                "etag": uuid.uuid4().hex,
+                "objects": {},
+            }
+        return self._response(models.Bucket(name=name, namespace=namespace_name))
+
+    def head_bucket(self, namespace_name, bucket_name, **kwargs):
+        self._call('head_bucket')
+        with self._lock:
+            bucket = self._bucket(bucket_name)
+            return self._response(headers={"etag": bucket["etag"]})
+
+    def delete_bucket(self, namespace_name, bucket_name, **kwargs):
+        self._call('delete_bucket')
+        with self._lock:
+            bucket = self._bucket(bucket_name)
+            if bucket["objects"]:
+                self._error(409, 'BucketNotEmpty', f"Bucket {bucket_name} is not empty")
+            del self._buckets[bucket_name]
+        return self._response(status=204)
+
+    def list_buckets(self, namespace_name, compartment_id, limit=1000, page=None, **kwargs):
+        self._call('list_buckets')
+        with self._lock:
+            names = sorted(n for n, b in self._buckets.items() if b["compartment_id"] == compartment_id)
+            if page:
+                names = [n for n in names if n >= page]
+            next_page = names[limit] if len(names) > limit else None
+            summaries = [
+                models.BucketSummary(
+                    namespace=namespace_name, name=n, compartment_id=compartment_id,
+                    time_created=self._buckets[n]["time_created"], etag=self._buckets[n]["etag"])
+                for n in names[:limit]
+            ]
+        headers = {"opc-next-page": next_page} if next_page else {}
+        return self._response(summaries, headers)
+
+    # --- Objects ---
+
+    def put_object(self, namespace_name, bucket_name, object_name, put_object_body,
+                   if_match=None, if_none_match=None, content_type=None,
+                   content_encoding=None, cache_control=None, opc_meta=None, **kwargs):
+        self._call('put_object')
+        content = _read_body(put_object_body)
+        with self._lock:
+            existing = self._bucket(bucket_name)["objects"].get(object_name)
+            self._check_preconditions(existing, if_match, if_none_match)
+            record = self._store(
+                bucket_name, object_name, content,
+                content_type=content_type or 'application/octet-stream',
+                content_encoding=content_encoding, cache_control=cache_control,
+                opc_meta=dict(opc_meta or {}),
+            )
+        return self._response(headers={"etag": record["etag"], "opc-content-md5": record["md5"]})
+
+    def get_object(self, namespace_name, bucket_name, object_name, if_match=None, if_none_match=None, **kwargs):
+        self._call('get_object')
+        with self._lock:
+            obj = self._bucket(bucket_name)["objects"].get(object_name)
+            if obj is None:
+                self._error(404, 'ObjectNotFound', f"Object {object_name} not found")
+            if if_none_match and if_none_match == obj["etag"]:
+                self._error(304, 'NotModified', 'Not modified')
+            self._check_preconditions(obj, if_match)
+            headers = {"etag": obj["etag"], "content-type": obj["content_type"],
+                       "content-length": str(len(obj["content"]))}
+            return self._response(_FakeBody(obj["content"]), headers)
+
+    def head_object(self, namespace_name, bucket_name, object_name, **kwargs):
+        self._call('head_object')
+        with self._lock:
+            obj = self._bucket(bucket_name)["objects"].get(object_name)
+            if obj is None:
+                self._error(404, 'ObjectNotFound', f"Object {object_name} not found")
+            headers = {"etag": obj["etag"], "content-md5": obj["md5"],
+                       "content-length": str(len(obj["content"]))}
+            headers.update({f"opc-meta-{k}": v for k, v in obj["opc_meta"].items()})
+            return self._response(headers=headers)
+
+    def delete_object(self, namespace_name, bucket_name, object_name, if_match=None, **kwargs):
+        self._call('delete_object')
+        with self._lock:
+            objects = self._bucket(bucket_name)["objects"]
+            if object_name not in objects:
+                self._error(404, 'ObjectNotFound', f"Object {object_name} not found")
+            self._check_preconditions(objects[object_name], if_match)
+            del objects[object_name]
+        return self._response(status=204)
+
+    def list_objects(self, namespace_name, bucket_name, prefix=None, start=None, limit=1000, fields=None, **kwargs):
+        self._call('list_objects')
+        with self._lock:
+            objects = self._bucket(bucket_name)["objects"]
+            names = sorted(n for n in objects if (not prefix or n.startswith(prefix)) and (not start or n >= start))
+            summaries = [
+                models.ObjectSummary(name=n, size=len(objects[n]["content"]), md5=objects[n]["md5"],
+                                     etag=objects[n]["etag"], time_created=objects[n]["time_created"])
+                for n in names[:limit]
+            ]
+            next_start = names[limit] if len(names) > limit else None
+        return self._response(models.ListObjects(objects=summaries, prefixes=[], next_start_with=next_start))
+
+    def copy_object(self, namespace_name, bucket_name, copy_object_details, **kwargs):
+        self._call('copy_object')
+        with self._lock:
+            src = self._bucket(bucket_name)["objects"].get(copy_object_details.source_object_name)
+            if src is None:
+                self._error(404, 'ObjectNotFound', 'Source object not found')
+            if copy_object_details.source_object_if_match_e_tag not in (None, src["etag"]):
+                self._error(412, 'IfMatchFailed', 'Source ETag does not match')
+            self._store(
+                copy_object_details.destination_bucket, copy_object_details.destination_object_name,
+                src["content"], content_type=src["content_type"], content_encoding=src["content_encoding"],
+                cache_control=src["cache_control"],
+                opc_meta=dict(copy_object_details.destination_object_metadata or src["opc_meta"]),
+            )
+        return self._response(headers={"opc-work-request-id": f"fake-wr-{uuid.uuid4().hex}"}, status=202)
+
+    def get_work_request(self, work_request_id, **kwargs):
+        self._call('get_work_request')
+        return self._response(models.WorkRequest(id=work_request_id, status='COMPLETED', percent_complete=100.0))
+
+    def cancel_work_request(self, work_request_id, **kwargs):
+        self._call('cancel_work_request')
+        # Copies complete at once here, so there is never anything left to cancel
+        self._error(409, 'Conflict', 'Work request already completed')
+
+    # --- Multipart ---
+
+    def create_multipart_upload(self, namespace_name, bucket_name, create_multipart_upload_details, **kwargs):
+        self._call('create_multipart_upload')
+        with self._lock:
+            self._bucket(bucket_name)
+            upload_id = uuid.uuid4().hex
+            self._uploads[upload_id] = {"bucket": bucket_name, "details": create_multipart_upload_details, "parts": {}}
+        return self._response(models.MultipartUpload(
+            namespace=namespace_name, bucket=bucket_name,
+            object=create_multipart_upload_details.object, upload_id=upload_id))
+
+    def upload_part(self, namespace_name, bucket_name, object_name, upload_id, upload_part_num, upload_part_body, **kwargs):
+        self._call('upload_part')
+        content = _read_body(upload_part_body)
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None:
+                self._error(404, 'NoSuchUpload', 'Upload not found')
+            etag = uuid.uuid4().hex
+            upload["parts"][upload_part_num] = (etag, content)
+        return self._response(headers={"etag": etag})
+
+    def commit_multipart_upload(self, namespace_name, bucket_name, object_name, upload_id, commit_multipart_upload_details, **kwargs):
+        self._call('commit_multipart_upload')
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+            if upload is None:
+                self._error(404, 'NoSuchUpload', 'Upload not found')
+            parts = sorted(commit_multipart_upload_details.parts_to_commit, key=lambda p: p.part_num)
+            content = b''.join(upload["parts"][p.part_num][1] for p in parts)
+            details = upload["details"]
+            record = self._store(
+                bucket_name, object_name, content,
+                content_type=details.content_type or 'application/octet-stream',
+                content_encoding=details.content_encoding, cache_control=details.cache_control,
+                opc_meta=dict(details.metadata or {}),
+            )
+            record["md5"] = f"{record['md5']}-{len(parts)}"
+        return self._response(headers={"etag": record["etag"]})
+
+    def abort_multipart_upload(self, namespace_name, bucket_name, object_name, upload_id, **kwargs):
+        self._call('abort_multipart_upload')
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+        return self._response(status=204)
+
+    def list_multipart_uploads(self, namespace_name, bucket_name, **kwargs):
+        self._call('list_multipart_uploads')
+        with self._lock:
+            uploads = [
+                models.MultipartUpload(namespace=namespace_name, bucket=u["bucket"],
+                                       object=u["details"].object, upload_id=uid)
+                for uid, u in self._uploads.items() if u["bucket"] == bucket_name
+            ]
+        return self._response(uploads)
+
+    # --- Introspection ---
+
+    def get_call_counts(self):
+        with self._lock:
+            return dict(self.calls)
+
+    def reset_call_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+
+def get_fake_client():
+    """
+    The process-wide fake used when OCI_AUTH_METHOD=fake, with the metadata
+    bucket already created so the app works against it out of the box.
+    """
+    global _fake_client
+    with _fake_client_lock:
+        if _fake_client is None:
+            client = FakeObjectStorageClient()
+            client._buckets[METADATA_BUCKET] = {
+                "compartment_id": None,
+                "time_created": _now(),
+                "etag": uuid.uuid4().hex,
+                "objects": {},
+            }
+            _fake_client = client
+        return _fake_client
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+import datetime
+from app.routes.utils_route import get_oci_client
+
+# --- Configuration ---
+HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '15'))  # seconds between probes
+# A result older than this means the prober itself is stuck; report unhealthy
+HEALTH_STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', str(HEALTH_PROBE_INTERVAL * 4)))
+# How long the very first /health/oci request waits for the first probe
+HEALTH_FIRST_PROBE_WAIT = float(os.getenv('HEALTH_FIRST_PROBE_WAIT', '5'))
+METADATA_BUCKET = os.getenv('METADATA_BUCKET_NAME', 'host-service-metadata')
+
+
+class HealthProber:
+    """
+    Checks OCI connectivity (namespace lookup) and metadata bucket
+    reachability (head_bucket) on a background thread, keeping only the
+    latest result. Health endpoints read it from memory instead of calling OCI.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or HEALTH_PROBE_INTERVAL
+        self._result = None
+        self._checked_at = None  # monotonic
+        self._first_result = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {"probes": 0, "failures": 0}
+
+    def start(self):
+        """Starts the probe thread once per process (safe to call on every request)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name='health-prober', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            self.probe()
+            time.sleep(self.interval)
+
+    def probe(self):
+        """Runs one check and stores its result."""
+        started = time.monotonic()
+        result = {"status": "connected", "namespace": None, "metadata_bucket": METADATA_BUCKET,
+                  "metadata_bucket_reachable": False, "error": None}
+        try:
+            client = get_oci_client('object_storage')
+            if not client:
+                raise ValueError("Failed to initialize OCI Object Storage Client")
+            # Live call on purpose: the cached tenancy lookup would not notice an outage
+            result["namespace"] = client.get_namespace().data
+            client.head_bucket(result["namespace"], METADATA_BUCKET)
+            result["metadata_bucket_reachable"] = True
+        except Exception as e:
+            result["status"] = "failed"
+            # ServiceError's str() is a dump of every field; its message is enough here
+            result["error"] = getattr(e, 'message', None) or str(e) or e.__class__.__name__
+        result["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+        result["checked_at"] = datetime.datetime.utcnow().isoformat()
+
+        with self._lock:
+            previous = self._result["status"] if self._result else None
+            self._result = result
+            self._checked_at = time.monotonic()
+            self.stats["probes"] += 1
+            if result["status"] != "connected":
+                self.stats["failures"] += 1
+        self._first_result.set()
+        # Log transitions only, not every failed probe
+        if result["status"] != previous:
+            if result["status"] == "connected":
+                print(f"[DEBUG] OCI health probe connected ({result['latency_ms']}ms)")
+            else:
+                print(f"Warning: OCI health probe failed: {result['error']}")
+        return result
+
+    def latest(self, wait=HEALTH_FIRST_PROBE_WAIT):
+        """
+        Returns a copy of the latest result with its age, marking it stale when
+        the prober has fallen behind. Starts the prober on first use and waits
+        up to `wait` seconds for its first result.
+        """
+        self.start()
+        self._first_result.wait(wait)
+        with self._lock:
+            if self._result is None:
+                return {"status": "pending", "error": "No health probe has completed yet"}
+            result = dict(self._result)
+            age = time.monotonic() - self._checked_at
+        result["age_seconds"] = round(age, 1)
+        if age > HEALTH_STALE_AFTER and result["status"] == "connected":
+            result["status"] = "stale"
+        return result
+
+
+# One prober per process
+health_prober = HealthProber()
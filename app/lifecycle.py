@@ -0,0 +1,57 @@
+import threading
+import time
+from app import startup
+from app.routes.utils_route import get_oci_client, get_namespace, get_region, get_compartment_id
+from app.deploy_jobs import shutdown_jobs, start_janitor
+from app.password_hashing import shutdown_hashing, warm_hashing
+from app.health_probe import health_prober
+from app.reconciler import reconciler
+from app.metrics import REGISTRY
+
+
+def warm_up():
+    """
+    Imports the OCI SDK, builds the pooled client, resolves the tenancy
+    lookups and starts the health prober, reconciler, job janitor, metrics
+    flusher and hashing pool, so the first requests a worker serves don't
+    pay for them.
+    Failures are logged and left for the request path to retry.
+    """
+    started = time.monotonic()
+    try:
+        if get_oci_client('object_storage'):
+            print(f"[DEBUG] Warmed OCI client: namespace={get_namespace()} region={get_region()} "
+                  f"compartment={'set' if get_compartment_id() else 'missing'}")
+    except Exception as e:
+        print(f"Warning: OCI warm-up failed: {e}")
+    # Probe from boot so the first load balancer check already has a result
+    health_prober.start()
+    reconciler.start()
+    # Every worker sweeps expired job snapshots, including those of workers that exited
+    start_janitor()
+    REGISTRY.start_flusher()
+    try:
+        warm_hashing()
+    except Exception as e:
+        print(f"Warning: password hashing warm-up failed: {e}")
+    print(f"[DEBUG] Warm-up done in {time.monotonic() - started:.2f}s")
+    startup.print_startup_report("Warm-up done")
+
+
+def start_warm_up():
+    """
+    Runs warm_up() on a background thread so the process can serve right
+    away: /health answers at once, and a request that needs OCI before the
+    warm-up finishes simply waits for the shared import/client lock.
+    """
+    thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def drain():
+    """Waits for background deploy jobs to finish, then stops the hashing pool."""
+    print("[DEBUG] Draining background deploy jobs...")
+    shutdown_jobs(wait=True)
+    shutdown_hashing()
+    print("[DEBUG] Drained.")
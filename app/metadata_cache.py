@@ -0,0 +1,94 @@
+import copy
+import json
+import threading
+import time
+import oci
+from app.metrics import metadata_duration
+
+
+class MetadataCache:
+    """
+    In-process read-through cache of parsed JSON metadata documents
+    (users.json, buckets.json). Every read is revalidated with a conditional
+    GET (`if-none-match` on the cached ETag), so unchanged documents cost a
+    304 instead of a full download and parse. Writes update the cache directly.
+    """
+
+    def __init__(self):
+        self._docs = {}  # (bucket, object_name) -> (etag, parsed document)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    def get(self, client, namespace, bucket_name, object_name):
+        """
+        Returns (document, etag) for an object. The document is a private
+        copy the caller may mutate. Raises oci.exceptions.ServiceError
+        (e.g. 404) exactly like get_object would.
+        """
+        key = (bucket_name, object_name)
+        with self._lock:
+            cached = self._docs.get(key)
+
+        kwargs = {"if_none_match": cached[0]} if cached else {}
+        started = time.monotonic()
+        try:
+            response = client.get_object(namespace, bucket_name, object_name, **kwargs)
+        except oci.exceptions.ServiceError as e:
+            if e.status == 304 and cached:
+                with self._lock:
+                    self.stats["hits"] += 1
+                document = copy.deepcopy(cached[1])
+                metadata_duration.observe(time.monotonic() - started, operation='load', result='not_modified')
+                return document, cached[0]
+            if e.status == 404:
+                self.invalidate(bucket_name, object_name)
+            metadata_duration.observe(time.monotonic() - started, operation='load', result=str(e.status))
+            raise
+
+        document = json.loads(response.data.content.decode('utf-8'))
+        etag = response.headers.get('etag')
+        with self._lock:
+            self.stats["misses"] += 1
+            if etag:
+                self._docs[key] = (etag, document)
+        document = copy.deepcopy(document)
+        metadata_duration.observe(time.monotonic() - started, operation='load', result='fetched')
+        return document, etag
+
+    def put(self, client, namespace, bucket_name, object_name, document, **kwargs):
+        """
+        Serializes and uploads a document, then caches it under the new ETag.
+        Extra kwargs (e.g. if_match) are passed through to put_object.
+        """
+        started = time.monotonic()
+        json_bytes = json.dumps(document, indent=2).encode('utf-8')
+        try:
+            response = client.put_object(
+                namespace, bucket_name, object_name, json_bytes,
+                content_type='application/json',
+                **kwargs
+            )
+        except oci.exceptions.ServiceError as e:
+            metadata_duration.observe(time.monotonic() - started, operation='save', result=str(e.status))
+            raise
+        metadata_duration.observe(time.monotonic() - started, operation='save', result='ok')
+        etag = response.headers.get('etag')
+        with self._lock:
+            self.stats["writes"] += 1
+            if etag:
+                self._docs[(bucket_name, object_name)] = (etag, copy.deepcopy(document))
+            else:
+                self._docs.pop((bucket_name, object_name), None)
+        return etag
+
+    def invalidate(self, bucket_name=None, object_name=None):
+        """Drops one cached document, or all of them when called without arguments."""
+        with self._lock:
+            if bucket_name is None:
+                self._docs.clear()
+            else:
+                self._docs.pop((bucket_name, object_name), None)
+
+
+# Shared by every route in the process
+metadata_cache = MetadataCache()
@@ -0,0 +1,325 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+import oci
+from app.metadata_cache import metadata_cache
+from app.metadata_writer import MetadataWriter, MutationRejected
+from app.routes.utils_route import get_oci_client, get_namespace
+
+# --- Configuration ---
+METADATA_BUCKET = os.getenv('METADATA_BUCKET_NAME', 'host-service-metadata')
+# 'monolithic' keeps users.json / buckets.json; 'sharded' keeps one object per record.
+METADATA_STORE = os.getenv('METADATA_STORE', 'monolithic')
+# Owner index writers kept for group commit; the least recently used are dropped beyond this
+MAX_OWNER_WRITERS = int(os.getenv('METADATA_MAX_OWNER_WRITERS', '1024'))
+
+USERS_FILE = 'users.json'
+DEPLOYMENTS_FILE = 'buckets.json'
+
+# Sharded layout inside the metadata bucket
+USER_PREFIX = 'users/'    # users/<username>.json      -> user record
+SITE_PREFIX = 'sites/'    # sites/<bucket_key>.json    -> site record (bucket_key index)
+OWNER_PREFIX = 'owners/'  # owners/<owner_id>.json     -> {"sites": [bucket_key, ...]}
+# Per-site content hashes, used by incremental redeploys (both layouts)
+MANIFEST_PREFIX = 'manifests/'  # manifests/<bucket_key>.json -> {object name: content md5}
+
+
+class QuotaExceeded(MutationRejected):
+    """add_site refused because the owner already has the maximum number of sites."""
+
+
+def _key(prefix, name):
+    # Usernames are free-form, so escape anything that is not safe in an object name
+    return f"{prefix}{quote(name, safe='')}.json"
+
+
+def remove_deployment(deployments, bucket_name):
+    """Mutation for the buckets.json writer: drops a site record in place."""
+    deployments[:] = [d for d in deployments if d['bucket_key'] != bucket_name]
+
+
+class MonolithicStore:
+    """All users in users.json, all sites in buckets.json (the original layout)."""
+
+    name = 'monolithic'
+
+    def __init__(self, bucket_name=METADATA_BUCKET):
+        self.bucket_name = bucket_name
+        self.users_writer = MetadataWriter(bucket_name, USERS_FILE, dict)
+        self.deployments_writer = MetadataWriter(bucket_name, DEPLOYMENTS_FILE, list)
+
+    def _read(self, object_name, default_factory):
+        client = get_oci_client('object_storage')
+        try:
+            document, _ = metadata_cache.get(client, get_namespace(), self.bucket_name, object_name)
+            return document
+        except oci.exceptions.ServiceError as e:
+            if e.status == 404:
+                return default_factory()
+            raise
+
+    # --- Users ---
+
+    def load_users(self):
+        return self._read(USERS_FILE, dict)
+
+    def all_usernames(self):
+        return list(self.load_users())
+
+    def get_user(self, username):
+        return self.load_users().get(username)
+
+    def create_user(self, username, record):
+        def add_user(users):
+            if username in users:
+                raise MutationRejected("User already exists")
+            users[username] = record
+        self.users_writer.submit(add_user)
+
+    def update_user(self, username, changes):
+        def apply(users):
+            if username not in users:
+                raise MutationRejected("User not found")
+            users[username].update(changes)
+        self.users_writer.submit(apply)
+
+    # --- Sites ---
+
+    def load_sites(self):
+        return self._read(DEPLOYMENTS_FILE, list)
+
+    def list_sites(self, owner_id):
+        return [d for d in self.load_sites() if d.get('owner_id') == owner_id]
+
+    def count_sites(self, owner_id):
+        return len(self.list_sites(owner_id))
+
+    def all_site_keys(self):
+        return [d['bucket_key'] for d in self.load_sites()]
+
+    def get_site(self, bucket_key):
+        return next((d for d in self.load_sites() if d['bucket_key'] == bucket_key), None)
+
+    def add_site(self, record, max_sites=None):
+        """Appends a site record; with `max_sites`, the owner's quota is checked in the same commit."""
+        def add(deployments):
+            if max_sites is not None:
+                owned = sum(1 for d in deployments if d.get('owner_id') == record['owner_id'])
+                if owned >= max_sites:
+                    raise QuotaExceeded(f"Maximum of {max_sites} sites allowed per user")
+            deployments.append(record)
+        self.deployments_writer.submit(add)
+
+    def update_site(self, bucket_key, changes):
+        def apply(deployments):
+            site = next((d for d in deployments if d['bucket_key'] == bucket_key), None)
+            if site is None:
+                raise MutationRejected("Site not found")
+            site.update(changes)
+        self.deployments_writer.submit(apply)
+
+    def remove_site(self, bucket_key):
+        self.deployments_writer.submit(lambda deployments: remove_deployment(deployments, bucket_key))
+
+
+class ShardedStore:
+    """
+    One object per user and per site, plus an owner -> sites index, so a
+    request only touches the records of the user it serves.
+    """
+
+    name = 'sharded'
+
+    def __init__(self, bucket_name=METADATA_BUCKET):
+        self.bucket_name = bucket_name
+        self._owner_writers = OrderedDict()  # owner_id -> MetadataWriter, least recently used first
+        self._lock = threading.Lock()
+
+    def _client(self):
+        return get_oci_client('object_storage'), get_namespace()
+
+    def _read(self, object_name):
+        client, namespace = self._client()
+        try:
+            document, _ = metadata_cache.get(client, namespace, self.bucket_name, object_name)
+            return document
+        except oci.exceptions.ServiceError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def _write(self, object_name, document, **preconditions):
+        client, namespace = self._client()
+        return metadata_cache.put(client, namespace, self.bucket_name, object_name, document, **preconditions)
+
+    def _delete(self, object_name):
+        client, namespace = self._client()
+        try:
+            client.delete_object(namespace, self.bucket_name, object_name)
+        except oci.exceptions.ServiceError as e:
+            if e.status != 404:
+                raise
+        metadata_cache.invalidate(self.bucket_name, object_name)
+
+    def _list_names(self, prefix):
+        """Record names under `prefix`, following the next_start_with cursor."""
+        client, namespace = self._client()
+        names = []
+        start = None
+        while True:
+            kwargs = {"prefix": prefix, "limit": 1000}
+            if start:
+                kwargs["start"] = start
+            response = client.list_objects(namespace, self.bucket_name, **kwargs)
+            names.extend(unquote(obj.name[len(prefix):-len('.json')]) for obj in response.data.objects)
+            start = response.data.next_start_with
+            if not start:
+                return names
+
+    def _owner_writer(self, owner_id):
+        """
+        The shared writer of an owner's index. Only recently used ones are
+        kept: a dropped writer that is still committing finishes on its own,
+        and the ETag check keeps it consistent with its replacement.
+        """
+        with self._lock:
+            writer = self._owner_writers.get(owner_id)
+            if writer is None:
+                writer = MetadataWriter(self.bucket_name, _key(OWNER_PREFIX, owner_id), lambda: {"sites": []})
+                self._owner_writers[owner_id] = writer
+                while len(self._owner_writers) > MAX_OWNER_WRITERS:
+                    self._owner_writers.popitem(last=False)
+            else:
+                self._owner_writers.move_to_end(owner_id)
+            return writer
+
+    # --- Users ---
+
+    def get_user(self, username):
+        return self._read(_key(USER_PREFIX, username))
+
+    def all_usernames(self):
+        return self._list_names(USER_PREFIX)
+
+    def create_user(self, username, record):
+        try:
+            # if-none-match makes the existence check and the write atomic
+            self._write(_key(USER_PREFIX, username), record, if_none_match='*')
+        except oci.exceptions.ServiceError as e:
+            if e.status == 412:
+                raise MutationRejected("User already exists")
+            raise
+
+    def update_user(self, username, changes):
+        writer = MetadataWriter(self.bucket_name, _key(USER_PREFIX, username), dict, window=0)
+
+        def apply(user):
+            if not user:
+                raise MutationRejected("User not found")
+            user.update(changes)
+        writer.submit(apply)
+
+    # --- Sites ---
+
+    def site_keys(self, owner_id):
+        index = self._read(_key(OWNER_PREFIX, owner_id))
+        return index["sites"] if index else []
+
+    def list_sites(self, owner_id):
+        sites = []
+        for bucket_key in self.site_keys(owner_id):
+            record = self.get_site(bucket_key)
+            if record is not None:
+                sites.append(record)
+        return sites
+
+    def count_sites(self, owner_id):
+        return len(self.site_keys(owner_id))
+
+    def all_site_keys(self):
+        """Every site in the store, from a paged listing of the site records (for the reconciler)."""
+        return self._list_names(SITE_PREFIX)
+
+    def get_site(self, bucket_key):
+        return self._read(_key(SITE_PREFIX, bucket_key))
+
+    def add_site(self, record, max_sites=None):
+        """
+        Indexes the site under its owner (checking `max_sites` in that same
+        commit) and then writes its record.
+        """
+        bucket_key = record['bucket_key']
+        owner_writer = self._owner_writer(record['owner_id'])
+
+        def index_site(index):
+            if bucket_key in index["sites"]:
+                return
+            if max_sites is not None and len(index["sites"]) >= max_sites:
+                raise QuotaExceeded(f"Maximum of {max_sites} sites allowed per user")
+            index["sites"].append(bucket_key)
+        owner_writer.submit(index_site)
+
+        try:
+            self._write(_key(SITE_PREFIX, bucket_key), record)
+        except Exception:
+            owner_writer.submit(lambda index: index.update(sites=[k for k in index["sites"] if k != bucket_key]))
+            raise
+
+    def update_site(self, bucket_key, changes):
+        writer = MetadataWriter(self.bucket_name, _key(SITE_PREFIX, bucket_key), dict, window=0)
+
+        def apply(site):
+            if not site:
+                raise MutationRejected("Site not found")
+            site.update(changes)
+        writer.submit(apply)
+
+    def remove_site(self, bucket_key):
+        record = self.get_site(bucket_key)
+        if record is not None:
+            def unindex_site(index):
+                index["sites"] = [k for k in index["sites"] if k != bucket_key]
+            self._owner_writer(record['owner_id']).submit(unindex_site)
+        self._delete(_key(SITE_PREFIX, bucket_key))
+
+
+def load_site_manifest(bucket_key):
+    """Returns {object name: content md5} recorded for a site, or None if there is none."""
+    client = get_oci_client('object_storage')
+    try:
+        response = client.get_object(get_namespace(), METADATA_BUCKET, _key(MANIFEST_PREFIX, bucket_key))
+        return json.loads(response.data.content.decode('utf-8'))
+    except oci.exceptions.ServiceError as e:
+        if e.status == 404:
+            return None
+        raise
+
+
+def save_site_manifest(bucket_key, hashes):
+    client = get_oci_client('object_storage')
+    client.put_object(
+        get_namespace(), METADATA_BUCKET, _key(MANIFEST_PREFIX, bucket_key),
+        json.dumps(hashes).encode('utf-8'),
+        content_type='application/json'
+    )
+
+
+def delete_site_manifest(bucket_key):
+    client = get_oci_client('object_storage')
+    try:
+        client.delete_object(get_namespace(), METADATA_BUCKET, _key(MANIFEST_PREFIX, bucket_key))
+    except oci.exceptions.ServiceError as e:
+        if e.status != 404:
+            raise
+
+
+def _build_store():
+    if METADATA_STORE == 'sharded':
+        return ShardedStore()
+    return MonolithicStore()
+
+
+# Shared by every route in the process
+metadata_store = _build_store()
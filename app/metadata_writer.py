@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+import oci
+from app.metadata_cache import metadata_cache
+from app.metrics import metadata_conflicts
+from app.routes.utils_route import get_oci_client, get_namespace
+
+# --- Configuration ---
+# Mutations arriving within this window are committed together in one PUT.
+GROUP_COMMIT_WINDOW = float(os.getenv('METADATA_GROUP_COMMIT_WINDOW', '0.05'))  # seconds
+MAX_COMMIT_ATTEMPTS = int(os.getenv('METADATA_COMMIT_ATTEMPTS', '5'))
+
+
+class MutationRejected(Exception):
+    """Raised by a mutation to refuse its change (e.g. "user already exists")."""
+
+
+class MetadataConflictError(Exception):
+    """Raised when a commit keeps losing the ETag race after every retry."""
+
+
+class _PendingMutation:
+    def __init__(self, mutation):
+        self.mutation = mutation
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MetadataWriter:
+    """
+    Applies mutations to one JSON metadata document with optimistic concurrency.
+
+    Each commit reads the document with its ETag, applies the pending
+    mutations and writes it back with an `if-match` precondition (or
+    `if-none-match: *` when it does not exist yet). A 412 means another
+    writer got there first: the document is re-read and the mutations are
+    re-applied. Mutations that arrive within GROUP_COMMIT_WINDOW of each
+    other share a single PUT (group commit).
+
+    A mutation is a function that changes the document in place and may
+    return a value for its caller. It can be applied more than once, so it
+    must only depend on the document it is given, and must raise
+    MutationRejected *before* changing anything to refuse its change.
+    """
+
+    def __init__(self, bucket_name, object_name, default_factory, window=None):
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.default_factory = default_factory
+        self.window = GROUP_COMMIT_WINDOW if window is None else window
+        self._pending = []
+        self._committing = False
+        self._lock = threading.Lock()
+        self.stats = {"commits": 0, "mutations": 0, "conflicts": 0}
+
+    def submit(self, mutation):
+        """Queues a mutation, waits until it is committed and returns its result."""
+        op = _PendingMutation(mutation)
+        with self._lock:
+            self._pending.append(op)
+            leader = not self._committing
+            if leader:
+                self._committing = True
+
+        if leader:
+            # The first writer in a window commits for everyone queued behind it
+            if self.window:
+                time.sleep(self.window)
+            while True:
+                with self._lock:
+                    batch, self._pending = self._pending, []
+                    if not batch:
+                        self._committing = False
+                        break
+                self._commit(batch)
+
+        op.done.wait()
+        if op.error is not None:
+            raise op.error
+        return op.result
+
+    def _load(self, client, namespace):
+        try:
+            return metadata_cache.get(client, namespace, self.bucket_name, self.object_name)
+        except oci.exceptions.ServiceError as e:
+            if e.status == 404:
+                return self.default_factory(), None
+            raise
+
+    def _commit(self, batch):
+        try:
+            client = get_oci_client('object_storage')
+            namespace = get_namespace()
+            for _ in range(MAX_COMMIT_ATTEMPTS):
+                document, etag = self._load(client, namespace)
+                applied = 0
+                for op in batch:
+                    op.result, op.error = None, None
+                    try:
+                        op.result = op.mutation(document)
+                        applied += 1
+                    except Exception as e:
+                        op.error = e
+
+                if not applied:
+                    return
+
+                precondition = {"if_match": etag} if etag else {"if_none_match": '*'}
+                try:
+                    metadata_cache.put(client, namespace, self.bucket_name, self.object_name,
+                                       document, **precondition)
+                except oci.exceptions.ServiceError as e:
+                    if e.status == 412:
+                        with self._lock:
+                            self.stats["conflicts"] += 1
+                        metadata_conflicts.inc(object=self.object_name.split('/', 1)[0])
+                        continue
+                    raise
+
+                with self._lock:
+                    self.stats["commits"] += 1
+                    self.stats["mutations"] += applied
+                return
+
+            raise MetadataConflictError(
+                f"Could not commit {self.object_name} after {MAX_COMMIT_ATTEMPTS} attempts")
+        except Exception as e:
+            for op in batch:
+                if op.error is None:
+                    op.error = e
+        finally:
+            for op in batch:
+                op.done.set()
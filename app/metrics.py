@@ -0,0 +1,291 @@
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Configuration ---
+# Metrics live in each worker process. With several workers (gunicorn sets
+# this), each one also writes its series to this directory and a scrape of
+# any worker renders all of them, labelled worker="<pid>"; sum them away in
+# queries. Unset, /metrics shows the serving process only.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))  # seconds
+
+# Seconds; covers fast metadata reads up to multi-minute deploys
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _add_label(labels, pair):
+    """Adds one `name="value"` pair to an already formatted label set."""
+    return f"{labels[:-1]},{pair}}}" if labels else f"{{{pair}}}"
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {_format_labels(self.labelnames, key): value for key, value in sorted(self._values.items())}
+
+    def samples(self):
+        """(sample name, formatted labels, value) per series."""
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in Prometheus text format."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count], sum
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def snapshot(self):
+        """{labels: {"count", "avg_seconds"}} per series, for JSON status pages."""
+        with self._lock:
+            items = sorted((key, sum(series[0]), series[1]) for key, series in self._series.items())
+        return {_format_labels(self.labelnames, key): {"count": count, "avg_seconds": round(total / count, 4)}
+                for key, count, total in items if count}
+
+    def samples(self):
+        """(sample name, formatted labels, value) per bucket, sum and count of every series."""
+        with self._lock:
+            items = sorted((key, (list(series[0]), series[1])) for key, series in self._series.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, key, 'le="%s"' % le), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), cumulative
+
+
+class Registry:
+    """Holds metrics plus collectors that report existing stats dicts at scrape time."""
+
+    def __init__(self, metrics_dir=None):
+        self.metrics_dir = METRICS_DIR if metrics_dir is None else metrics_dir
+        self._metrics = []
+        self._collectors = []
+        self._flusher = None
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector, kind='gauge'):
+        """
+        `collector()` returns {metric name: value} or {metric name: (help, value)};
+        `kind` is 'counter' for running totals, 'gauge' for current levels.
+        """
+        self._collectors.append((collector, kind))
+
+    def snapshot(self):
+        """Every registered metric's series as plain JSON-friendly dicts."""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def collect(self):
+        """This process's metric families: [name, help, kind, [[sample name, labels, value], ...]]."""
+        families = [[metric.name, metric.documentation, metric.kind, [list(s) for s in metric.samples()]]
+                    for metric in self._metrics]
+        for collector, kind in self._collectors:
+            try:
+                values = collector()
+            except Exception as e:
+                print(f"Warning: metrics collector failed: {e}")
+                continue
+            for name, value in sorted(values.items()):
+                documentation, value = value if isinstance(value, tuple) else (name, value)
+                families.append([name, documentation, kind, [[name, '', value]]])
+        return families
+
+    # --- Sharing between worker processes ---
+
+    def _path(self, pid):
+        return os.path.join(self.metrics_dir, f"{pid}.json")
+
+    def flush(self, families=None):
+        """Writes this process's families for the other workers' scrapes (atomically)."""
+        families = self.collect() if families is None else families
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = self._path(os.getpid())
+        # Scrapes and the flusher thread may write at once
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as fh:
+            json.dump(families, fh)
+        os.replace(temp_path, path)
+
+    def _other_workers(self):
+        """{pid: families} written by the other live workers; files of exited ones are removed."""
+        workers = {}
+        for path in glob.glob(os.path.join(self.metrics_dir, '*.json')):
+            try:
+                pid = int(os.path.basename(path)[:-len('.json')])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            if not _process_alive(pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as fh:
+                    workers[pid] = json.load(fh)
+            except (OSError, ValueError):
+                continue
+        return workers
+
+    def forget_worker(self, pid):
+        """Removes an exited worker's file, and any temp file it left mid-write."""
+        if not self.metrics_dir:
+            return
+        for path in glob.glob(os.path.join(self.metrics_dir, f"{pid}.json*")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Warning: Could not write metrics to {self.metrics_dir}: {e}")
+
+    def start_flusher(self):
+        """Keeps this worker's file current between scrapes (once per process; no-op without METRICS_DIR)."""
+        if not self.metrics_dir or (self._flusher is not None and self._flusher.is_alive()):
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+        self._flusher.start()
+
+    def render(self):
+        families = self.collect()
+        workers = {}
+        if self.metrics_dir:
+            try:
+                self.flush(families)
+                workers = self._other_workers()
+            except Exception as e:
+                print(f"Warning: Could not share metrics through {self.metrics_dir}: {e}")
+            workers[os.getpid()] = families
+
+        merged = {}  # name -> [help, kind, samples], first seen order
+        for pid, worker_families in (sorted(workers.items()) if workers else [(None, families)]):
+            for name, documentation, kind, samples in worker_families:
+                family = merged.setdefault(name, [documentation, kind, []])
+                for sample_name, labels, value in samples:
+                    if pid is not None:
+                        labels = _add_label(labels, f'worker="{pid}"')
+                    family[2].append((sample_name, labels, value))
+
+        lines = []
+        for name, (documentation, kind, samples) in merged.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{sample_name}{labels} {value}" for sample_name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', "Request latency by route", ('method', 'route', 'status')))
+deploy_phase_duration = REGISTRY.register(Histogram(
+    'deploy_phase_duration_seconds', "Time spent in each deploy phase", ('phase',)))
+deploy_phase_errors = REGISTRY.register(Counter(
+    'deploy_phase_errors_total', "Deploy phases that raised", ('phase',)))
+oci_request_duration = REGISTRY.register(Histogram(
+    'oci_request_duration_seconds', "Latency of single OCI calls (each retry attempt counts)", ('operation',)))
+oci_requests = REGISTRY.register(Counter(
+    'oci_requests_total', "OCI calls by operation and outcome", ('operation', 'outcome')))
+metadata_duration = REGISTRY.register(Histogram(
+    'metadata_operation_duration_seconds', "Metadata document loads and saves", ('operation', 'result')))
+metadata_conflicts = REGISTRY.register(Counter(
+    'metadata_commit_conflicts_total', "Metadata commits that lost the ETag race and were retried", ('object',)))
+
+
+@contextmanager
+def time_phase(phase):
+    """Times one deploy phase (zip_validation, create_bucket, upload, metadata_save, ...)."""
+    started = time.monotonic()
+    try:
+        yield
+    except Exception:
+        deploy_phase_errors.inc(phase=phase)
+        raise
+    finally:
+        deploy_phase_duration.observe(time.monotonic() - started, phase=phase)
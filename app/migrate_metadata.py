@@ -0,0 +1,74 @@
+"""
+Converts the monolithic users.json / buckets.json metadata into the sharded
+layout (one object per user and per site, plus owner -> sites indexes).
+
+Usage:
+    python -m app.migrate_metadata [--dry-run]
+
+The migration only creates objects that don't exist yet (if-none-match), so
+it is safe to re-run and never overwrites records the sharded store has
+changed since; the original files are left in place. Switch the service
+over with METADATA_STORE=sharded once it has completed.
+"""
+import argparse
+from collections import defaultdict
+from dotenv import load_dotenv
+
+
+def _create(target, object_name, document):
+    """Writes `object_name` unless it exists. Returns False if it was already there."""
+    import oci
+    try:
+        target._write(object_name, document, if_none_match='*')
+        return True
+    except oci.exceptions.ServiceError as e:
+        if e.status == 412:
+            return False
+        raise
+
+
+def migrate(dry_run=False):
+    from app.metadata_store import (
+        MonolithicStore, ShardedStore, USER_PREFIX, SITE_PREFIX, OWNER_PREFIX, _key
+    )
+
+    source = MonolithicStore()
+    target = ShardedStore()
+
+    users = source.load_users()
+    sites = source.load_sites()
+    print(f"Found {len(users)} users and {len(sites)} sites")
+
+    owners = defaultdict(list)
+    for site in sites:
+        owners[site['owner_id']].append(site['bucket_key'])
+
+    if dry_run:
+        print(f"Dry run: would write {len(users)} user, {len(sites)} site and {len(owners)} owner objects")
+        return
+
+    written = already = 0
+    objects = [(_key(USER_PREFIX, username), record) for username, record in users.items()]
+    objects += [(_key(SITE_PREFIX, site['bucket_key']), site) for site in sites]
+    objects += [(_key(OWNER_PREFIX, owner_id), {"sites": bucket_keys}) for owner_id, bucket_keys in owners.items()]
+    for object_name, document in objects:
+        if _create(target, object_name, document):
+            written += 1
+        else:
+            already += 1
+
+    print(f"Migrated {len(users)} users, {len(sites)} sites, {len(owners)} owner indexes: "
+          f"{written} objects written, {already} already migrated")
+    return written, already
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Migrate metadata to the sharded layout.")
+    parser.add_argument('--dry-run', action='store_true', help="Only report what would be written")
+    args = parser.parse_args()
+    migrate(dry_run=args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
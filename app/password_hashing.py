@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# --- Configuration ---
+# Any werkzeug method string; the work factor goes in it, e.g. "scrypt:65536:8:1" or "pbkdf2:sha256:600000".
+# Hashes made with other parameters are upgraded the next time their user logs in.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+# Worker processes; 0 hashes on the calling thread (still bounded by the queue below)
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+# Hashes queued or running at once; beyond this, callers are turned away instead of piling up
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', '32'))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))  # seconds
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full (e.g. a login storm); the caller should answer 503."""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE)
+_dummy_hash = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # forkserver children start from a clean process that only imports this
+                # module, not the threaded web worker (and its OCI clients)
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+                _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=context)
+    return _pool
+
+
+def _run(fn, *args):
+    """
+    Runs fn in the pool, holding a queue slot until the hash itself ends: a
+    caller that stops waiting after PASSWORD_HASH_TIMEOUT leaves its slot
+    taken, so the queue bound holds.
+    """
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy("Too many authentication requests, please retry shortly")
+
+    def release(_future=None):
+        _slots.release()
+
+    if PASSWORD_HASH_WORKERS <= 0:
+        try:
+            return fn(*args)
+        finally:
+            release()
+    try:
+        future = _get_pool().submit(fn, *args)
+    except Exception:
+        release()
+        raise
+    future.add_done_callback(release)
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeout:
+        # Frees the slots at once if it never started; otherwise they free when it ends
+        future.cancel()
+        raise HashingBusy("Authentication is taking too long, please retry shortly")
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(stored_hash, password):
+    return check_password_hash(stored_hash, password)
+
+
+def hash_password(password):
+    """Hashes a password with PASSWORD_HASH_METHOD off the request thread."""
+    return _run(_hash, password, PASSWORD_HASH_METHOD)
+
+
+def _get_dummy_hash():
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(os.urandom(16).hex())
+    return _dummy_hash
+
+
+def verify_password(stored_hash, password):
+    """
+    Checks a password off the request thread. With no stored hash (unknown
+    user) a dummy hash of the same method is checked instead, so the
+    response takes as long as for a real user and does not reveal
+    which usernames exist. Both take the same queue slots, so a full queue
+    turns them away alike.
+    """
+    if not stored_hash:
+        _run(_verify, _get_dummy_hash(), password or '')
+        return False
+    return _run(_verify, stored_hash, password or '')
+
+
+def needs_rehash(stored_hash):
+    """True if a hash was made with a different method or work factor than PASSWORD_HASH_METHOD."""
+    return stored_hash.split('$', 1)[0] != _get_dummy_hash().split('$', 1)[0]
+
+
+def warm_hashing():
+    """Starts the worker pool and computes the dummy hash ahead of the first login."""
+    _get_dummy_hash()
+
+
+def shutdown_hashing():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
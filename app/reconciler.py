@@ -0,0 +1,468 @@
+"""
+Background reconciliation of site buckets against the metadata store.
+
+Usage (one run, e.g. from cron or by hand):
+    python -m app.reconciler [--dry-run | --apply] [--force]
+
+Pages through the compartment's `site-*` buckets and diffs them against the
+metadata store:
+  - orphaned buckets (no site record) are torn down in parallel;
+  - stale records (bucket gone) are removed along with their manifests.
+Anything younger than RECONCILE_GRACE_PERIOD is left alone so in-flight
+deploys and deletes are never touched. Runs that change anything are
+claimed through a status object in the metadata bucket, so across every
+worker process at most one is active and they start at most every
+RECONCILE_MIN_INTERVAL seconds. Dry runs only read that object.
+
+Teardown is destructive, so it is off unless RECONCILE_DRY_RUN=false (or
+--apply), only touches buckets named after a known user, and the whole run
+is refused when the record set looks wrong: empty, much smaller than at the
+last run, or leaving a large share of the buckets orphaned. A missing
+buckets.json or a wrong METADATA_STORE / METADATA_BUCKET_NAME looks exactly
+like that.
+"""
+import argparse
+import datetime
+import os
+import random
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import oci
+from dotenv import load_dotenv
+
+# The store, cache and OCI helpers read their settings at import, so they are
+# imported where used: `python -m app.reconciler` must load .env first.
+
+# --- Configuration ---
+RECONCILE_INTERVAL = float(os.getenv('RECONCILE_INTERVAL', '3600'))  # seconds; 0 disables background runs
+RECONCILE_MIN_INTERVAL = float(os.getenv('RECONCILE_MIN_INTERVAL', '600'))  # between run starts, all processes
+RECONCILE_GRACE_PERIOD = float(os.getenv('RECONCILE_GRACE_PERIOD', '3600'))  # seconds
+RECONCILE_WORKERS = int(os.getenv('RECONCILE_WORKERS', '4'))  # buckets torn down at once
+RECONCILE_MAX_TEARDOWNS = int(os.getenv('RECONCILE_MAX_TEARDOWNS', '50'))  # per run
+# Report only until explicitly switched off
+RECONCILE_DRY_RUN = os.getenv('RECONCILE_DRY_RUN', 'true').lower() in ('1', 'true', 'yes')
+# Refuse to run when more than this share of the site buckets would be torn down...
+RECONCILE_MAX_ORPHAN_RATIO = float(os.getenv('RECONCILE_MAX_ORPHAN_RATIO', '0.5'))
+# ...or when the site records shrank by more than this share since the last completed run
+RECONCILE_MAX_RECORD_DROP = float(os.getenv('RECONCILE_MAX_RECORD_DROP', '0.5'))
+# A "running" claim older than this belongs to a process that died mid-run
+RECONCILE_LEASE_SECONDS = float(os.getenv('RECONCILE_LEASE_SECONDS', '1800'))
+
+SITE_BUCKET_PREFIX = 'site-'
+# site-<sanitized owner>-<first 8 hex digits of a uuid4>, as made by run_deployment
+SITE_BUCKET_PATTERN = re.compile(r'^site-(?P<owner>.+)-[0-9a-f]{8}$')
+STATUS_OBJECT = 'reconciler/status.json'
+LIST_PAGE_SIZE = 1000
+# Report fields naming buckets (and so users); /health/reconciler shows only their counts
+NAME_LIST_FIELDS = ('orphans_deleted', 'orphans_failed', 'records_repaired')
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _age_seconds(value):
+    """Age of an OCI datetime or one of our naive-UTC ISO strings; None if unknown."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return (_utcnow() - value).total_seconds()
+
+
+def bucket_owner_part(username):
+    """The owner part of a site bucket name for `username` (same rule as sanitize_bucket_name)."""
+    return ''.join(c if c.isalnum() or c == '-' else '-' for c in username.lower())
+
+
+def _completed_site_records(status):
+    """Site record count at the last completed run, carried from status to status."""
+    if not status:
+        return None
+    if status.get('phase') == 'done':
+        return status.get('site_records')
+    return status.get('previous_site_records')
+
+
+def public_status(status):
+    """A status or report dict fit for an unauthenticated endpoint: counts instead of names."""
+    if not status:
+        return None
+    public = {key: value for key, value in status.items() if key != 'owner'}
+    for field in NAME_LIST_FIELDS:
+        if field in public:
+            public[field] = len(public[field] or [])
+    return public
+
+
+def list_site_buckets(client, namespace, compartment_id):
+    """Returns {bucket name: time_created} for every site bucket, following opc-next-page."""
+    buckets = {}
+    page = None
+    while True:
+        kwargs = {"limit": LIST_PAGE_SIZE}
+        if page:
+            kwargs["page"] = page
+        response = client.list_buckets(namespace, compartment_id, **kwargs)
+        for summary in response.data:
+            if summary.name.startswith(SITE_BUCKET_PREFIX):
+                buckets[summary.name] = summary.time_created
+        page = response.next_page
+        if not page:
+            return buckets
+
+
+class ReconcileReport:
+    """Progress and outcome of one reconciliation run."""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.phase = 'starting'
+        self.started_at = _utcnow().isoformat()
+        self.finished_at = None
+        self.site_buckets = 0
+        self.site_records = 0
+        self.previous_site_records = None  # at the last completed run, for the shrink guard
+        self.orphans_found = 0
+        self.orphans_in_grace = 0
+        self.orphans_unrecognized = 0  # not named after a known user; never torn down
+        self.orphans_deleted = []
+        self.orphans_failed = []
+        self.orphans_deferred = 0  # over RECONCILE_MAX_TEARDOWNS; picked up next run
+        self.stale_records = 0
+        self.records_repaired = []
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add(self, field, value):
+        with self._lock:
+            getattr(self, field).append(value)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "phase": self.phase,
+                "dry_run": self.dry_run,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "site_buckets": self.site_buckets,
+                "site_records": self.site_records,
+                "previous_site_records": self.previous_site_records,
+                "orphans_found": self.orphans_found,
+                "orphans_in_grace": self.orphans_in_grace,
+                "orphans_unrecognized": self.orphans_unrecognized,
+                "orphans_deleted": list(self.orphans_deleted),
+                "orphans_failed": list(self.orphans_failed),
+                "orphans_deferred": self.orphans_deferred,
+                "stale_records": self.stale_records,
+                "records_repaired": list(self.records_repaired),
+                "error": self.error,
+            }
+
+
+class Reconciler:
+    """Runs reconciliation passes; one instance per process, coordinated through STATUS_OBJECT."""
+
+    def __init__(self):
+        self.last_report = None
+        self.shared_status = None  # latest status object this process read or wrote
+        self._thread = None
+        self._run_lock = threading.Lock()
+        self.stats = {"runs": 0, "runs_skipped": 0, "runs_failed": 0, "runs_refused": 0,
+                      "orphans_deleted": 0, "records_repaired": 0}
+
+    # --- Coordination ---
+
+    def _read_status(self, client, namespace, bucket_name):
+        """The shared status object and its ETag, or (None, None) before the first run."""
+        from app.metadata_cache import metadata_cache
+        try:
+            status, etag = metadata_cache.get(client, namespace, bucket_name, STATUS_OBJECT)
+        except oci.exceptions.ServiceError as e:
+            if e.status != 404:
+                raise
+            return None, None
+        self.shared_status = status
+        return status, etag
+
+    def _claim(self, client, namespace, bucket_name, force):
+        """
+        Marks a run as started in the shared status object. Returns the
+        previous status (or {}), or None if another run has it or ran recently.
+        """
+        from app.metadata_cache import metadata_cache
+        status, etag = self._read_status(client, namespace, bucket_name)
+
+        if status and not force:
+            since_start = _age_seconds(status.get('started_at'))
+            if status.get('phase') not in ('done', 'failed', 'refused') and since_start is not None \
+                    and since_start < RECONCILE_LEASE_SECONDS:
+                print(f"[DEBUG] Reconcile skipped: run started {since_start:.0f}s ago by {status.get('owner')} is active")
+                return None
+            if since_start is not None and since_start < RECONCILE_MIN_INTERVAL:
+                print(f"[DEBUG] Reconcile skipped: last run started {since_start:.0f}s ago")
+                return None
+
+        claim = {"phase": "starting", "started_at": _utcnow().isoformat(),
+                 "owner": f"{socket.gethostname()}:{os.getpid()}",
+                 "previous_site_records": _completed_site_records(status)}
+        preconditions = {"if_match": etag} if etag else {"if_none_match": '*'}
+        try:
+            metadata_cache.put(client, namespace, bucket_name, STATUS_OBJECT, claim, **preconditions)
+        except oci.exceptions.ServiceError as e:
+            if e.status == 412:
+                # Another process claimed the run between our read and write
+                return None
+            raise
+        self.shared_status = claim
+        return status or {}
+
+    def _publish(self, client, namespace, bucket_name, report, phase):
+        """
+        Records progress locally and, for runs that hold the claim, (best
+        effort) in the shared status object.
+        """
+        from app.metadata_cache import metadata_cache
+        report.phase = phase
+        if phase in ('done', 'failed', 'refused'):
+            report.finished_at = _utcnow().isoformat()
+        if report.dry_run:
+            return
+        status = dict(report.to_dict(), owner=f"{socket.gethostname()}:{os.getpid()}")
+        try:
+            metadata_cache.put(client, namespace, bucket_name, STATUS_OBJECT, status)
+            self.shared_status = status
+        except Exception as e:
+            print(f"Warning: Could not publish reconcile status: {e}")
+
+    def status(self):
+        """
+        This process's last report and the latest shared status it has seen
+        (refreshed by its own runs and claims, never by this call), as counts.
+        """
+        return {
+            "interval_seconds": RECONCILE_INTERVAL,
+            "grace_period_seconds": RECONCILE_GRACE_PERIOD,
+            "dry_run": RECONCILE_DRY_RUN,
+            "stats": dict(self.stats),
+            "last_local_run": public_status(self.last_report.to_dict() if self.last_report else None),
+            "latest_run": public_status(self.shared_status),
+        }
+
+    # --- Passes ---
+
+    def run(self, force=False, dry_run=None):
+        """One reconciliation pass. Returns its report, or None if the run was not claimed."""
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._run(force, RECONCILE_DRY_RUN if dry_run is None else dry_run)
+        finally:
+            self._run_lock.release()
+
+    def _run(self, force, dry_run):
+        from app.routes.utils_route import get_oci_client, get_namespace, get_compartment_id
+        from app.metadata_store import metadata_store
+        client = get_oci_client('object_storage')
+        namespace = get_namespace()
+        compartment_id = get_compartment_id()
+        if not compartment_id:
+            raise RuntimeError("Server configuration error: OCI_COMPARTMENT_ID not set")
+        bucket_name = metadata_store.bucket_name
+
+        if dry_run:
+            # Changes nothing, so it needs no claim; the status is only read for the shrink guard
+            previous, _ = self._read_status(client, namespace, bucket_name)
+        else:
+            previous = self._claim(client, namespace, bucket_name, force)
+            if previous is None:
+                self.stats["runs_skipped"] += 1
+                return None
+
+        report = ReconcileReport(dry_run)
+        report.previous_site_records = _completed_site_records(previous)
+        self.last_report = report
+        self.stats["runs"] += 1
+        try:
+            # Both listings must be complete before diffing: a partial listing
+            # would make live sites look orphaned or stale
+            self._publish(client, namespace, bucket_name, report, 'listing')
+            buckets = list_site_buckets(client, namespace, compartment_id)
+            record_keys = set(metadata_store.all_site_keys())
+            known_owners = {bucket_owner_part(name) for name in metadata_store.all_usernames()}
+            report.site_buckets = len(buckets)
+            report.site_records = len(record_keys)
+
+            orphans = self._find_orphans(report, buckets, record_keys, known_owners)
+            refusal = self._refusal(report, orphans, known_owners)
+            if refusal:
+                report.error = refusal
+                self.stats["runs_refused"] += 1
+                print(f"Warning: Reconcile refused, nothing was changed: {refusal}")
+                self._publish(client, namespace, bucket_name, report, 'refused')
+            else:
+                self._publish(client, namespace, bucket_name, report, 'tearing_down')
+                self._teardown_orphans(client, namespace, report, orphans)
+
+                self._publish(client, namespace, bucket_name, report, 'repairing')
+                self._repair_stale_records(client, namespace, report, buckets, record_keys)
+
+                self._publish(client, namespace, bucket_name, report, 'done')
+        except Exception as e:
+            report.error = str(e) or e.__class__.__name__
+            self.stats["runs_failed"] += 1
+            self._publish(client, namespace, bucket_name, report, 'failed')
+            print(f"Reconcile failed: {report.error}")
+        if not report.dry_run:
+            self.stats["orphans_deleted"] += len(report.orphans_deleted)
+            self.stats["records_repaired"] += len(report.records_repaired)
+        print(f"[DEBUG] Reconcile {report.phase}: {report.to_dict()}")
+        return report
+
+    def _find_orphans(self, report, buckets, record_keys, known_owners):
+        """Site buckets without a record that are past the grace period and named after a known user."""
+        orphans = []
+        for name, time_created in sorted(buckets.items()):
+            if name in record_keys:
+                continue
+            report.orphans_found += 1
+            age = _age_seconds(time_created)
+            match = SITE_BUCKET_PATTERN.match(name)
+            if age is None or age < RECONCILE_GRACE_PERIOD:
+                report.orphans_in_grace += 1
+            elif not match or match.group('owner') not in known_owners:
+                report.orphans_unrecognized += 1
+            else:
+                orphans.append(name)
+        return orphans
+
+    def _refusal(self, report, orphans, known_owners):
+        """Why this run's view of the store can't be trusted for teardown, or None."""
+        if report.site_buckets and not report.site_records:
+            return (f"the metadata store has no site records but {report.site_buckets} site buckets exist; "
+                    "check METADATA_STORE and METADATA_BUCKET_NAME")
+        if report.site_buckets and not known_owners:
+            return "the metadata store has no users"
+        previous = report.previous_site_records
+        if previous and report.site_records < previous * (1 - RECONCILE_MAX_RECORD_DROP):
+            return f"site records dropped from {previous} to {report.site_records} since the last run"
+        if len(orphans) > report.site_buckets * RECONCILE_MAX_ORPHAN_RATIO:
+            return (f"{len(orphans)} of {report.site_buckets} site buckets would be torn down "
+                    f"(limit {RECONCILE_MAX_ORPHAN_RATIO:.0%})")
+        return None
+
+    def _teardown_orphans(self, client, namespace, report, orphans):
+        from app.metadata_store import metadata_store, delete_site_manifest
+        from app.teardown_engine import delete_bucket_with_contents, TEARDOWN_WORKERS
+        from app.dedup import dedup_index
+        report.orphans_deferred = max(0, len(orphans) - RECONCILE_MAX_TEARDOWNS)
+        orphans = orphans[:RECONCILE_MAX_TEARDOWNS]
+        if not orphans:
+            return
+
+        dry_run = report.dry_run
+        # Share the teardown engine's thread budget between the buckets torn down at once
+        per_bucket_workers = max(1, TEARDOWN_WORKERS // RECONCILE_WORKERS)
+
+        def teardown(name):
+            # Re-check: a slow deploy may have recorded the site since the listing
+            if metadata_store.get_site(name) is not None:
+                return
+            if dry_run:
+                report.add('orphans_deleted', name)
+                return
+            try:
+                result = delete_bucket_with_contents(client, namespace, name, workers=per_bucket_workers)
+                if result.ok:
+                    delete_site_manifest(name)
+                    try:
+                        dedup_index.forget_bucket(name)
+                    except Exception as e:
+                        print(f"Warning: Could not drop dedup index entries for {name}: {e}")
+                    report.add('orphans_deleted', name)
+                else:
+                    report.add('orphans_failed', name)
+            except oci.exceptions.ServiceError as e:
+                if e.status == 404:
+                    report.add('orphans_deleted', name)
+                else:
+                    print(f"Warning: Could not tear down orphan {name}: {e.message}")
+                    report.add('orphans_failed', name)
+
+        with ThreadPoolExecutor(max_workers=RECONCILE_WORKERS, thread_name_prefix='reconcile') as pool:
+            list(pool.map(teardown, orphans))
+
+    def _repair_stale_records(self, client, namespace, report, buckets, record_keys):
+        from app.metadata_store import metadata_store, delete_site_manifest
+        for bucket_key in sorted(record_keys - set(buckets)):
+            site = metadata_store.get_site(bucket_key)
+            if site is None:
+                continue
+            age = _age_seconds(site.get('launch_time'))
+            if age is None or age < RECONCILE_GRACE_PERIOD:
+                continue
+            report.stale_records += 1
+            # The listing only covers one compartment; make sure the bucket is really gone
+            try:
+                client.head_bucket(namespace, bucket_key)
+                continue
+            except oci.exceptions.ServiceError as e:
+                if e.status != 404:
+                    raise
+            if not report.dry_run:
+                metadata_store.remove_site(bucket_key)
+                delete_site_manifest(bucket_key)
+            report.add('records_repaired', bucket_key)
+
+    # --- Background loop ---
+
+    def start(self, interval=None):
+        """Starts the periodic background loop once per process (no-op when the interval is 0)."""
+        interval = RECONCILE_INTERVAL if interval is None else interval
+        if interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name='reconciler', daemon=True)
+        self._thread.start()
+
+    def _loop(self, interval):
+        # Spread worker processes out; the shared claim decides who actually runs
+        time.sleep(random.uniform(0.1, 0.5) * interval)
+        while True:
+            try:
+                self.run()
+            except Exception as e:
+                print(f"Reconcile error: {e}")
+            time.sleep(interval)
+
+
+# One reconciler per process
+reconciler = Reconciler()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Reconcile site buckets against the metadata store.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--dry-run', action='store_true', help="Report what would change without changing it")
+    mode.add_argument('--apply', action='store_true', help="Tear down and repair even if RECONCILE_DRY_RUN is set")
+    parser.add_argument('--force', action='store_true', help="Ignore the minimum interval and an active claim")
+    args = parser.parse_args()
+    # Imported after load_dotenv so the module's settings (and the store it
+    # builds) see the .env values; this __main__ copy has read them too early
+    from app.reconciler import reconciler
+    dry_run = True if args.dry_run else False if args.apply else None
+    report = reconciler.run(force=args.force, dry_run=dry_run)
+    if report is None:
+        print("Another run is active or one ran recently; use --force to run anyway.")
+
+
+if __name__ == '__main__':
+    main()
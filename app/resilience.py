@@ -0,0 +1,270 @@
+import functools
+import os
+import random
+import threading
+import time
+import oci
+from app.metrics import oci_request_duration, oci_requests
+
+# --- Configuration ---
+RETRY_MAX_ATTEMPTS = int(os.getenv('OCI_RETRY_MAX_ATTEMPTS', '6'))
+RETRY_BASE_DELAY = float(os.getenv('OCI_RETRY_BASE_DELAY', '0.2'))  # seconds
+RETRY_MAX_DELAY = float(os.getenv('OCI_RETRY_MAX_DELAY', '10'))  # seconds
+# Consecutive server/network failures, connect timeouts included, that open the circuit
+# (throttling never does)
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('OCI_BREAKER_THRESHOLD', '10'))
+# How long an open circuit fails fast before letting a trial call through
+BREAKER_RESET_TIMEOUT = float(os.getenv('OCI_BREAKER_RESET_TIMEOUT', '30'))  # seconds
+
+# Operations that must not be repeated once OCI may have executed them.
+# Conditional writes (if_match / if_none_match) are treated the same way:
+# a retry after a lost response would fail its own precondition.
+NON_IDEMPOTENT_OPERATIONS = {
+    'create_bucket',
+    'create_multipart_upload',
+    'commit_multipart_upload',
+    'create_preauthenticated_request',
+}
+
+_stats = {
+    "calls": 0,
+    "retries": 0,
+    "throttled": 0,
+    "transient_errors": 0,
+    "connect_failures": 0,
+    "breaker_trips": 0,
+    "short_circuited": 0,
+}
+_stats_lock = threading.Lock()
+_breakers = {}
+
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+@functools.lru_cache(maxsize=None)
+def circuit_open_error():
+    """
+    The CircuitOpenError class. It subclasses oci's ServiceError, so it is
+    built on first use rather than at import, keeping the SDK import
+    deferred (see app.startup).
+    """
+    class CircuitOpenError(oci.exceptions.ServiceError):
+        """
+        Raised without calling OCI while the circuit is open. It is a 503
+        ServiceError so existing OCI error handling applies unchanged.
+        """
+
+        def __init__(self, service_name, retry_in):
+            super().__init__(503, 'CircuitOpen', {},
+                             f"OCI {service_name} is degraded; failing fast for {retry_in:.0f}s")
+    return CircuitOpenError
+
+
+def __getattr__(name):
+    # `from app.resilience import CircuitOpenError` keeps working
+    if name == 'CircuitOpenError':
+        return circuit_open_error()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker. While open every call fails
+    fast; after BREAKER_RESET_TIMEOUT one trial call is let through, and its
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, threshold=None, reset_timeout=None):
+        self.name = name
+        self.threshold = threshold or BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or BREAKER_RESET_TIMEOUT
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == 'closed':
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining <= 0 and not self._trial_in_flight:
+                self.state = 'half_open'
+                self._trial_in_flight = True
+                return
+        _count("short_circuited")
+        raise circuit_open_error()(self.name, max(remaining, 0))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = 'closed'
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.threshold):
+                if self.state == 'closed':
+                    _count("breaker_trips")
+                    print(f"Warning: OCI {self.name} circuit opened after {self.failures} failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def record_neutral(self):
+        """A call that neither proves nor disproves health (e.g. throttled)."""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'closed'
+            self._trial_in_flight = False
+
+    def to_dict(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+
+def _classify(error):
+    """Returns 'throttled', 'not_sent', 'transient' or None (do not retry)."""
+    if isinstance(error, circuit_open_error()):
+        return None
+    if isinstance(error, oci.exceptions.ServiceError):
+        if error.status == 429:
+            return 'throttled'
+        if error.status >= 500:
+            return 'transient'
+        return None
+    if isinstance(error, oci.exceptions.BaseConnectTimeout):
+        # The connection was never established, so nothing ran
+        return 'not_sent'
+    if isinstance(error, (oci.exceptions.BaseRequestException, ConnectionError, TimeoutError)):
+        return 'transient'
+    return None
+
+
+def _retry_after(error):
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt):
+    # Full jitter: spreads retries from many threads instead of synchronizing them
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _rewind(args, kwargs):
+    """
+    Remembers where seekable request bodies start so a retry can resend them.
+    Returns a function that rewinds them, or None if a body cannot be rewound.
+    """
+    positions = []
+    for value in list(args) + list(kwargs.values()):
+        if hasattr(value, 'read'):
+            try:
+                positions.append((value, value.tell()))
+            except Exception:
+                return None
+
+    def rewind():
+        for body, position in positions:
+            body.seek(position)
+    return rewind
+
+
+class ResilientClient:
+    """
+    Wraps an OCI client so every operation gets exponential backoff with
+    jitter for throttling and transient errors, per-operation idempotency
+    rules, and a circuit breaker shared by all threads using the client.
+    While OCI throttles, all callers back off together instead of
+    hammering it from every thread. Anything that is not an operation
+    (base_client, endpoint, ...) passes straight through.
+    """
+
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+        self._breaker = _breakers.setdefault(name, CircuitBreaker(name))
+        self._cooldown_until = 0.0
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if attr.startswith('_') or not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            return self._call(attr, value, args, kwargs)
+        call.__name__ = attr
+        return call
+
+    def _call(self, operation, method, args, kwargs):
+        idempotent = (operation not in NON_IDEMPOTENT_OPERATIONS
+                      and 'if_match' not in kwargs and 'if_none_match' not in kwargs)
+        # Reads with if_none_match (conditional GETs) are still safe to repeat
+        if operation.startswith(('get_', 'head_', 'list_')):
+            idempotent = True
+        rewind = _rewind(args, kwargs)
+
+        for attempt in range(RETRY_MAX_ATTEMPTS):
+            wait = self._cooldown_until - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                self._breaker.before_call()
+            except circuit_open_error():
+                oci_requests.inc(operation=operation, outcome='short_circuited')
+                raise
+            _count("calls")
+            started = time.monotonic()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                oci_request_duration.observe(time.monotonic() - started, operation=operation)
+                status = getattr(e, 'status', None)
+                oci_requests.inc(operation=operation, outcome=str(status) if status else 'network_error')
+                kind = _classify(e)
+                if kind in ('transient', 'not_sent'):
+                    # An unreachable OCI (connect timeouts) is exactly what the breaker is for;
+                    # only throttling is neutral
+                    _count("transient_errors" if kind == 'transient' else "connect_failures")
+                    self._breaker.record_failure()
+                elif kind is None and isinstance(e, oci.exceptions.ServiceError):
+                    # A 4xx answer (404, 412, ...) still proves OCI is up
+                    self._breaker.record_success()
+                else:
+                    self._breaker.record_neutral()
+
+                retryable = kind in ('throttled', 'not_sent') or (kind == 'transient' and idempotent)
+                if not retryable or rewind is None or attempt == RETRY_MAX_ATTEMPTS - 1:
+                    raise
+
+                delay = _backoff(attempt)
+                if kind == 'throttled':
+                    _count("throttled")
+                    delay = max(delay, _retry_after(e) or 0)
+                    # Everyone using this client slows down, not just this thread
+                    self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+                _count("retries")
+                time.sleep(delay)
+                rewind()
+                continue
+
+            oci_request_duration.observe(time.monotonic() - started, operation=operation)
+            oci_requests.inc(operation=operation, outcome='ok')
+            self._breaker.record_success()
+            return result
+
+
+def get_resilience_stats():
+    """Retry/throttle/trip counters and the state of every circuit breaker."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["breakers"] = {name: breaker.to_dict() for name, breaker in _breakers.items()}
+    return stats
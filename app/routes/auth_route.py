@@ -1,56 +1,13 @@
-import json
-import os
-import io
 import datetime
 from flask import Blueprint, request, jsonify, session
-from werkzeug.security import generate_password_hash, check_password_hash
-from app.routes.utils_route import get_oci_client
+from app.password_hashing import hash_password, verify_password, needs_rehash, HashingBusy
+from app.metadata_writer import MutationRejected
+from app.metadata_store import metadata_store
 
 auth_bp = Blueprint('auth', __name__)
 
-# Constants
-METADATA_BUCKET = os.getenv('METADATA_BUCKET_NAME', 'host-service-metadata')
-USERS_FILE = 'users.json'
-
-def get_metadata_bucket_namespace():
-    """Helper to get the namespace (required for Object Storage calls)."""
-    client = get_oci_client('object_storage')
-    return client.get_namespace().data
-
-def load_users_db():
-    """
-    Fetches and parses users.json from OCI Object Storage.
-    Returns an empty dict if the file doesn't exist yet.
-    """
-    client = get_oci_client('object_storage')
-    namespace = get_metadata_bucket_namespace()
-    
-    try:
-        # Attempt to get the object
-        response = client.get_object(namespace, METADATA_BUCKET, USERS_FILE)
-        file_content = response.data.content.decode('utf-8')
-        return json.loads(file_content)
-    except Exception as e:
-        # If file not found (404), return empty DB. Real production code should check status code.
-        print(f"DEBUG: users.json not found or error: {e}")
-        return {}
-
-def save_users_db(users_data):
-    """
-    Uploads the updated users dictionary back to OCI as users.json.
-    """
-    client = get_oci_client('object_storage')
-    namespace = get_metadata_bucket_namespace()
-    
-    json_bytes = json.dumps(users_data, indent=2).encode('utf-8')
-    
-    client.put_object(
-        namespace,
-        METADATA_BUCKET,
-        USERS_FILE,
-        json_bytes,
-        content_type='application/json'
-    )
+def hashing_busy_response(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
 
 # --- Routes ---
 
@@ -75,27 +32,29 @@ def register():
     if not username or not password:
         return jsonify({"error": "Username and password required"}), 400
 
-    #Load existing users
-    users_db = load_users_db()
-
     #Check if user exists
-    if username in users_db:
+    if metadata_store.get_user(username):
         return jsonify({"error": "User already exists"}), 409
 
-    #Hash password 
-    hashed_pw = generate_password_hash(password)
+    #Hash password (in the hashing process pool, not on this thread)
+    try:
+        hashed_pw = hash_password(password)
+    except HashingBusy as e:
+        return hashing_busy_response(e)
 
     #Create user record [cite: 35]
-    users_db[username] = {
+    user_record = {
         "email": email,
         "password_hash": hashed_pw,
         "created_at": datetime.datetime.utcnow().isoformat()
     }
 
-    #Save back to OCI
+    #Save back to OCI (the store re-checks existence atomically)
     try:
-        save_users_db(users_db)
+        metadata_store.create_user(username, user_record)
         return jsonify({"message": "User created successfully"}), 201
+    except MutationRejected as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -109,21 +68,26 @@ def login():
     username = data.get('username')
     password = data.get('password')
 
-    #Load users
-    users_db = load_users_db()
-
     #Validate User
-    user_record = users_db.get(username)
-    
-    if not user_record:
-        return jsonify({"error": "Invalid credentials"}), 401
-
-    #Verify Hash [cite: 56]
-    if check_password_hash(user_record['password_hash'], password):
-        session['user_id'] = username
-        return jsonify({"message": "Login successful"}), 200
-    else:
-        return jsonify({"error": "Invalid credentials"}), 401
+    user_record = metadata_store.get_user(username) if username else None
+
+    #Verify Hash [cite: 56] (unknown users are checked against a dummy hash, so timing matches)
+    try:
+        stored_hash = user_record['password_hash'] if user_record else None
+        if not verify_password(stored_hash, password):
+            return jsonify({"error": "Invalid credentials"}), 401
+
+        # Transparently upgrade hashes made with an older method or work factor
+        if needs_rehash(stored_hash):
+            try:
+                metadata_store.update_user(username, {"password_hash": hash_password(password)})
+            except Exception as e:
+                print(f"Warning: could not rehash password for {username}: {e}")
+    except HashingBusy as e:
+        return hashing_busy_response(e)
+
+    session['user_id'] = username
+    return jsonify({"message": "Login successful"}), 200
 
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
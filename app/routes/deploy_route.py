@@ -1,94 +1,47 @@
 import os
-import io
 import zipfile
 import uuid
 import datetime
 import mimetypes
 import json
-from flask import Blueprint, request, jsonify, session
-from werkzeug.utils import secure_filename
-from app.routes.auth_route import get_oci_client
+import base64
+import hashlib
+from flask import Blueprint, request, jsonify, session, Response
+from app.routes.utils_route import get_oci_client, get_namespace, get_region, get_compartment_id
 from app.decorators.login_req import login_required
+from app.upload_engine import upload_zip_members, hash_members
+from app.metadata_store import (
+    metadata_store, load_site_manifest, save_site_manifest, delete_site_manifest, QuotaExceeded
+)
+from app.metadata_writer import MutationRejected
+from app.admission import deploy_admission, AdmissionRejected
+from app.deploy_jobs import DeployJob, submit_job, get_job
+from app.teardown_engine import delete_bucket_with_contents, delete_objects
+from app.metrics import time_phase
+from app.dedup import dedup_index
 import oci
 import traceback
+import tempfile
+import shutil
+import string
 
 deploy_bp = Blueprint('deploy', __name__)
 
 # --- Configuration ---
-METADATA_BUCKET = os.getenv('METADATA_BUCKET_NAME', 'host-service-metadata')
-DEPLOYMENTS_FILE = 'buckets.json'
 MAX_UNCOMPRESSED_SIZE = 100 * 1024 * 1024  # 100MB
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB per file
+# Members are streamed, so raising this costs no memory; members above
+# DEPLOY_MULTIPART_THRESHOLD (20MB) are only possible once it is raised
+MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', str(10 * 1024 * 1024)))  # 10MB per file
 MAX_FILES_IN_ZIP = 1000
-MAX_ZIP_SIZE = 50 * 1024 * 1024  # 50MB for in-memory processing
+MAX_ZIP_SIZE = 50 * 1024 * 1024  # 50MB per direct upload (spooled to disk; larger ones go through /api/uploads)
 MAX_SITES_PER_USER = int(os.getenv('MAX_SITES_PER_USER', '5'))
+MAX_LIST_PAGE_SIZE = int(os.getenv('MAX_LIST_PAGE_SIZE', '100'))
+UPLOAD_TMP_DIR = os.getenv('UPLOAD_TMP_DIR') or None  # None = system temp dir
 
 # --- Helpers ---
 
 def get_metadata_namespace():
-    client = get_oci_client('object_storage')
-    return client.get_namespace().data
-
-def load_deployments_db():
-    """Fetches buckets.json from OCI. Creates it if it doesn't exist."""
-    client = get_oci_client('object_storage')
-    namespace = get_metadata_namespace()
-    try:
-        response = client.get_object(namespace, METADATA_BUCKET, DEPLOYMENTS_FILE)
-        return json.loads(response.data.content.decode('utf-8'))
-    except oci.exceptions.ServiceError as e:
-        # If file doesn't exist (404), create it with empty list
-        if e.status == 404:
-            print(f"DEBUG: {DEPLOYMENTS_FILE} not found, creating it")
-            empty_list = []
-            save_deployments_db(empty_list)
-            return empty_list
-        # Re-raise other service errors
-        raise
-    except Exception as e:
-        print(f"ERROR loading deployments DB: {e}")
-        # Try to create the file if it doesn't exist
-        try:
-            empty_list = []
-            save_deployments_db(empty_list)
-            return empty_list
-        except:
-            return []  # Last resort fallback
-
-def save_deployments_db(deployments_data):
-    """Saves updated list to buckets.json."""
-    client = get_oci_client('object_storage')
-    namespace = get_metadata_namespace()
-    json_bytes = json.dumps(deployments_data, indent=2).encode('utf-8')
-    
-    client.put_object(
-        namespace, METADATA_BUCKET, DEPLOYMENTS_FILE, json_bytes,
-        content_type='application/json'
-    )
-
-def validate_zip_safety(zip_file):
-    """
-    Prevents Zip Bombs and validates file counts/sizes.
-    """
-    total_size = 0
-    file_count = 0
-    
-    for zinfo in zip_file.infolist():
-        if zinfo.is_dir():
-            continue
-        
-        file_count += 1
-        total_size += zinfo.file_size
-        
-        # Individual file size limit
-        if zinfo.file_size > MAX_FILE_SIZE:
-            raise ValueError(f"File {zinfo.filename} exceeds {MAX_FILE_SIZE // (1024*1024)}MB limit")
-    
-    if file_count > MAX_FILES_IN_ZIP:
-        raise ValueError(f"ZIP contains {file_count} files (max {MAX_FILES_IN_ZIP})")
-    
-    if total_size > MAX_UNCOMPRESSED_SIZE:
-        raise ValueError(f"Uncompressed size exceeds {MAX_UNCOMPRESSED_SIZE // (1024*1024)}MB limit")
+    return get_namespace()
 
 def validate_filename(filename):
     """
@@ -104,6 +57,56 @@ def validate_filename(filename):
     
     return True
 
+class SiteManifest:
+    """
+    Result of the preflight pass over a ZIP's central directory:
+    the members to upload (with resolved MIME types) and site-level facts.
+    """
+    def __init__(self):
+        self.entries = []  # (ZipInfo, content_type)
+        self.total_size = 0
+        self.has_index = False
+
+    @property
+    def file_count(self):
+        return len(self.entries)
+
+def build_manifest(zip_file):
+    """
+    Single pass over the ZIP's central directory, run before any OCI call.
+    Prevents Zip Bombs, validates names, file counts and sizes, detects
+    index.html and resolves content types for the uploader.
+    """
+    manifest = SiteManifest()
+
+    for zinfo in zip_file.infolist():
+        if zinfo.is_dir():
+            continue
+
+        filename = zinfo.filename
+        validate_filename(filename) # Security check
+
+        # Individual file size limit
+        if zinfo.file_size > MAX_FILE_SIZE:
+            raise ValueError(f"File {filename} exceeds {MAX_FILE_SIZE // (1024*1024)}MB limit")
+
+        if manifest.file_count >= MAX_FILES_IN_ZIP:
+            raise ValueError(f"ZIP contains more than {MAX_FILES_IN_ZIP} files (max {MAX_FILES_IN_ZIP})")
+
+        manifest.total_size += zinfo.file_size
+        if manifest.total_size > MAX_UNCOMPRESSED_SIZE:
+            raise ValueError(f"Uncompressed size exceeds {MAX_UNCOMPRESSED_SIZE // (1024*1024)}MB limit")
+
+        if filename.lower() == 'index.html':
+            manifest.has_index = True
+
+        content_type, _ = mimetypes.guess_type(filename)
+        if not content_type:
+            content_type = 'application/octet-stream'
+        manifest.entries.append((zinfo, content_type))
+
+    return manifest
+
 def sanitize_bucket_name(base_name):
     """
     Ensures bucket name meets OCI requirements:
@@ -123,31 +126,25 @@ def sanitize_bucket_name(base_name):
     
     return sanitized
 
-def empty_bucket(client, namespace, bucket_name):
-    """
-    Recursively delete all objects in bucket with pagination.
-    """
+def build_site_url(namespace, bucket_name, has_index):
+    """Public Object Storage URL of a site (its index.html when it has one)."""
+    base_url = f"https://objectstorage.{get_region()}.oraclecloud.com/n/{namespace}/b/{bucket_name}/o/"
+    return f"{base_url}index.html" if has_index else base_url
+
+def list_object_md5s(client, namespace, bucket_name):
+    """{object name: md5} for every object in a bucket, following the listing cursor."""
+    md5s = {}
+    start = None
     while True:
-        try:
-            response = client.list_objects(
-                namespace, 
-                bucket_name,
-                limit=1000
-            )
-            objects = response.data.objects
-            
-            if not objects:
-                break
-            
-            for obj in objects:
-                try:
-                    client.delete_object(namespace, bucket_name, obj.name)
-                except Exception as e:
-                    print(f"Warning: Failed to delete object {obj.name}: {e}")
-                    
-        except Exception as e:
-            print(f"Error listing objects in bucket {bucket_name}: {e}")
-            break
+        kwargs = {"fields": "name,md5", "limit": 1000}
+        if start:
+            kwargs["start"] = start
+        response = client.list_objects(namespace, bucket_name, **kwargs)
+        for obj in response.data.objects:
+            md5s[obj.name] = obj.md5
+        start = response.data.next_start_with
+        if not start:
+            return md5s
 
 def cleanup_bucket(namespace, bucket_name):
     """
@@ -156,169 +153,480 @@ def cleanup_bucket(namespace, bucket_name):
     """
     try:
         client = get_oci_client('object_storage')
-        empty_bucket(client, namespace, bucket_name)
-        client.delete_bucket(namespace, bucket_name)
+        result = delete_bucket_with_contents(client, namespace, bucket_name)
+        print(f"[DEBUG] Cleanup of {bucket_name}: {result.to_dict()}")
     except Exception as e:
         print(f"Cleanup error for bucket {bucket_name}: {e}")
+    forget_dedup_sources(bucket_name)
 
+def forget_dedup_sources(bucket_name):
+    """Drops dedup index entries pointing at a deleted site bucket."""
+    try:
+        dropped = dedup_index.forget_bucket(bucket_name)
+        if dropped:
+            print(f"[DEBUG] Dropped {dropped} dedup index entries for {bucket_name}")
+    except Exception as e:
+        # Copies from a missing source fail their ETag check and fall back to uploads
+        print(f"Warning: Could not drop dedup index entries for {bucket_name}: {e}")
 
 
-@deploy_bp.route('', methods=['POST'])
-@login_required
-def deploy_site():
-    print("--- [DEBUG] Starting Deployment Process ---")
+
+def run_deployment(owner_id, zf, manifest, job=None):
+    """
+    Creates the site bucket, uploads the manifest's files and records the site.
+    Shared by the synchronous route and background deploy jobs. Rolls the
+    bucket and its manifest back and re-raises on any failure.
+    """
+    # Prepare OCI Clients
+    print("[DEBUG] Initializing OCI Clients...")
+    object_storage = get_oci_client('object_storage')
+    if not object_storage:
+         raise ValueError("Failed to initialize OCI Object Storage Client")
+
+    namespace = get_metadata_namespace()
+    compartment_id = get_compartment_id()
     
+    if not compartment_id:
+        raise RuntimeError("Server configuration error: OCI_COMPARTMENT_ID not set")
+
+    # Generate Bucket Name
+    site_uid = str(uuid.uuid4())[:8]
+    base_bucket_name = f"site-{owner_id}-{site_uid}"
+    new_bucket_name = sanitize_bucket_name(base_bucket_name)
+    print(f"[DEBUG] Target Bucket Name: {new_bucket_name}")
+
+    bucket_created = False
+    manifest_saved = False
+    try:
+        # Create Bucket & Upload
+        if job: job.set_phase('creating_bucket', bucket_name=new_bucket_name)
+        create_details = oci.object_storage.models.CreateBucketDetails(
+            name=new_bucket_name,
+            compartment_id=compartment_id,
+            public_access_type='ObjectRead'
+        )
+        
+        with time_phase('create_bucket'):
+            object_storage.create_bucket(namespace, create_details)
+        bucket_created = True
+        print("[DEBUG] Bucket created successfully.")
+        has_index = manifest.has_index
+
+        print("[DEBUG] Starting file upload...")
+        if job: job.set_phase('uploading')
+        with time_phase('upload'):
+            report = upload_zip_members(
+                object_storage, namespace, new_bucket_name, zf, manifest.entries,
+                on_progress=job.file_uploaded if job else None
+            )
+        print(f"[DEBUG] Uploaded {len(report.files)} files ({report.total_bytes} bytes, "
+              f"{len(report.deduplicated_files)} copied from existing content) in {report.elapsed:.2f}s")
+        for timing in report.slowest():
+            print(f"   -> {timing['name']}: {timing['upload_seconds']}s")
+
+        # Update Metadata
+        print("[DEBUG] Upload complete. Updating metadata...")
+        if job: job.set_phase('saving_metadata')
+        site_url = build_site_url(namespace, new_bucket_name, has_index)
+        new_record = {
+            "bucket_key": new_bucket_name,
+            "owner_id": owner_id,
+            "launch_time": datetime.datetime.utcnow().isoformat(),
+            "status": "Active",
+            "url": site_url,
+            "has_index": has_index
+        }
+        with time_phase('metadata_save'):
+            save_site_manifest(new_bucket_name, report.hashes())
+            manifest_saved = True
+            # The quota is re-checked atomically here; the route's early check can race
+            metadata_store.add_site(new_record, max_sites=MAX_SITES_PER_USER)
+        print("[DEBUG] Metadata updated. Deployment Success!")
+        return {
+            "site_url": site_url,
+            "bucket_name": new_bucket_name,
+            "has_index": has_index
+        }
+
+    except Exception:
+        if bucket_created:
+            print("[DEBUG] Cleaning up bucket due to failure...")
+            cleanup_bucket(namespace, new_bucket_name)
+        if manifest_saved:
+            try:
+                delete_site_manifest(new_bucket_name)
+            except Exception as e:
+                print(f"Cleanup error for manifest of {new_bucket_name}: {e}")
+        raise
+
+def spool_upload(file_stream):
+    """
+    Copies an upload to a temp file that outlives the request, for background jobs.
+    Returns the file path; the job deletes it when done.
+    """
+    file_stream.seek(0)
+    with tempfile.NamedTemporaryFile(prefix='deploy-', suffix='.zip', dir=UPLOAD_TMP_DIR, delete=False) as tmp:
+        try:
+            shutil.copyfileobj(file_stream, tmp, length=1024 * 1024)
+        except Exception:
+            tmp.close()
+            remove_spool(tmp.name)
+            raise
+        return tmp.name
+
+def remove_spool(path):
+    """Deletes a spooled upload that no job took over."""
+    try:
+        os.remove(path)
+    except OSError as e:
+        print(f"Warning: could not remove spooled upload {path}: {e}")
+
+def run_redeployment(site, zf, manifest, job=None):
+    """
+    Updates an existing site in place: hashes every member, uploads only new
+    or changed files and deletes files that are no longer in the archive.
+    Shared by the synchronous route and background deploy jobs.
+    """
+    object_storage = get_oci_client('object_storage')
+    namespace = get_metadata_namespace()
+    bucket_name = site['bucket_key']
+
+    if job: job.set_phase('hashing', bucket_name=bucket_name)
+    with time_phase('hashing'):
+        new_hashes = hash_members(zf, manifest.entries)
+        old_hashes = load_site_manifest(bucket_name)
+    if old_hashes is None:
+        # Sites deployed before manifests existed: compare against the objects' own MD5s
+        old_hashes = list_object_md5s(object_storage, namespace, bucket_name)
+
+    changed = [(zinfo, content_type) for zinfo, content_type in manifest.entries
+               if old_hashes.get(zinfo.filename) != new_hashes[zinfo.filename]]
+    removed = [name for name in old_hashes if name not in new_hashes]
+    print(f"[DEBUG] Redeploy {bucket_name}: {len(changed)} changed, "
+          f"{manifest.file_count - len(changed)} unchanged, {len(removed)} removed")
+
+    if job: job.set_phase('uploading', files_total=len(changed),
+                          bytes_total=sum(zinfo.file_size for zinfo, _ in changed))
+    with time_phase('upload'):
+        report = upload_zip_members(
+            object_storage, namespace, bucket_name, zf, changed,
+            on_progress=job.file_uploaded if job else None
+        )
+    print(f"[DEBUG] Uploaded {len(report.files)} files ({report.total_bytes} bytes, "
+          f"{len(report.deduplicated_files)} copied from existing content) in {report.elapsed:.2f}s")
+
+    if job: job.set_phase('saving_metadata')
+    deleted = 0
+    if removed:
+        with time_phase('delete_stale'):
+            teardown = delete_objects(object_storage, namespace, bucket_name, removed)
+        print(f"[DEBUG] Removed stale files: {teardown.to_dict()}")
+        deleted = teardown.deleted
+        # Keep failed deletes in the manifest so the next redeploy retries them
+        for name in teardown.failed:
+            new_hashes[name] = old_hashes[name]
+    site_url = build_site_url(namespace, bucket_name, manifest.has_index)
+    with time_phase('metadata_save'):
+        save_site_manifest(bucket_name, new_hashes)
+        metadata_store.update_site(bucket_name, {
+            "url": site_url,
+            "has_index": manifest.has_index,
+            "updated_at": datetime.datetime.utcnow().isoformat()
+        })
+    return {
+        "site_url": site_url,
+        "bucket_name": bucket_name,
+        "has_index": manifest.has_index,
+        "uploaded": len(changed),
+        "unchanged": manifest.file_count - len(changed),
+        "deleted": deleted
+    }
+
+def run_zip_job(job, zip_path, runner, ticket):
+    """
+    Background worker entry point: opens a spooled ZIP, runs `runner(zf, manifest, job)`
+    (run_deployment or run_redeployment), then removes the file and gives
+    back the deploy's admission ticket.
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            manifest = build_manifest(zf)
+            result = runner(zf, manifest, job)
+            return {"bucket_name": result["bucket_name"], "site_url": result["site_url"]}
+    finally:
+        ticket.release()
+        os.remove(zip_path)
+
+def open_uploaded_zip():
+    """
+    Validates the request's uploaded archive (presence, size, ZIP signature).
+    Returns (file_stream, None) or (None, error response).
+    """
     if 'file' not in request.files:
-        return jsonify({"error": "No file part"}), 400
+        return None, (jsonify({"error": "No file part"}), 400)
     
     file = request.files['file']
     if file.filename == '':
-        return jsonify({"error": "No selected file"}), 400
+        return None, (jsonify({"error": "No selected file"}), 400)
 
-    try:
-        # 1. Load User's Deployment History
-        print("[DEBUG] Loading deployment DB...")
-        all_deployments = load_deployments_db()
-        user_sites = [d for d in all_deployments if d.get('owner_id') == session['user_id']]
-        
-        if len(user_sites) >= MAX_SITES_PER_USER:
-            return jsonify({"error": f"Maximum of {MAX_SITES_PER_USER} sites allowed per user"}), 403
-
-        # 2. Check File Size
-        file.seek(0, 2)
-        file_size = file.tell()
-        file.seek(0)
-        print(f"[DEBUG] File Size: {file_size} bytes")
-        
-        if file_size > MAX_ZIP_SIZE:
-            return jsonify({"error": f"ZIP file too large (max {MAX_ZIP_SIZE // (1024*1024)}MB)"}), 400
-
-        # 3. Read & Validate ZIP
-        print("[DEBUG] Reading ZIP file...")
-        file_stream = io.BytesIO(file.read())
-        
-        if not zipfile.is_zipfile(file_stream):
-            return jsonify({"error": "File is not a valid ZIP"}), 400
+    # Check File Size
+    file.seek(0, 2)
+    file_size = file.tell()
+    file.seek(0)
+    print(f"[DEBUG] File Size: {file_size} bytes")
+    
+    if file_size > MAX_ZIP_SIZE:
+        return None, (jsonify({"error": f"ZIP file too large (max {MAX_ZIP_SIZE // (1024*1024)}MB)"}), 400)
 
-        # 4. Prepare OCI Clients
-        print("[DEBUG] Initializing OCI Clients...")
-        object_storage = get_oci_client('object_storage')
-        if not object_storage:
-             raise ValueError("Failed to initialize OCI Object Storage Client")
+    # Open & Validate ZIP straight from Werkzeug's spooled upload (no extra copy)
+    print("[DEBUG] Reading ZIP file...")
+    file_stream = file.stream
+    
+    if not zipfile.is_zipfile(file_stream):
+        return None, (jsonify({"error": "File is not a valid ZIP"}), 400)
+    return file_stream, None
 
-        namespace = get_metadata_namespace()
-        compartment_id = os.getenv('OCI_COMPARTMENT_ID')
-        
-        if not compartment_id:
-            return jsonify({"error": "Server configuration error: OCI_COMPARTMENT_ID not set"}), 500
+def deploy_error_response(e):
+    """Maps a deploy/redeploy exception to the route's JSON error response."""
+    if isinstance(e, AdmissionRejected):
+        print(f"[DEBUG] Deploy not admitted: {e}")
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
 
-        # 5. Generate Bucket Name
-        site_uid = str(uuid.uuid4())[:8]
-        base_bucket_name = f"site-{session['user_id']}-{site_uid}"
-        new_bucket_name = sanitize_bucket_name(base_bucket_name)
-        print(f"[DEBUG] Target Bucket Name: {new_bucket_name}")
+    if isinstance(e, QuotaExceeded):
+        return jsonify({"error": str(e)}), 403
 
-        bucket_created = False
-        
-        # 6. Process ZIP & Upload
-        with zipfile.ZipFile(file_stream) as zf:
-            print("[DEBUG] Validating ZIP safety...")
-            validate_zip_safety(zf)
-
-            # Create Bucket
-            create_details = oci.object_storage.models.CreateBucketDetails(
-                name=new_bucket_name,
-                compartment_id=compartment_id,
-                public_access_type='ObjectRead'
-            )
-            
-            object_storage.create_bucket(namespace, create_details)
-            bucket_created = True
-            print("[DEBUG] Bucket created successfully.")
-            has_index = False
-
-            # Upload Files
-            print("[DEBUG] Starting file upload...")
-            for file_info in zf.infolist():
-                if file_info.is_dir():
-                    continue
-                
-                filename = file_info.filename
-                validate_filename(filename) # Security check
-                
-                if filename.lower() == 'index.html':
-                    has_index = True
-                
-                content = zf.read(filename)
-                content_type, _ = mimetypes.guess_type(filename)
-                if not content_type:
-                    content_type = 'application/octet-stream'
-
-                print(f"   -> Uploading: {filename} ({content_type})")
-                object_storage.put_object(
-                    namespace,
-                    new_bucket_name,
-                    filename,
-                    content,
-                    content_type=content_type
-                )
-
-            # 7. Update Metadata
-            print("[DEBUG] Upload complete. Updating metadata...")
-            if has_index:
-                site_url = f"https://objectstorage.{os.getenv('OCI_REGION')}.oraclecloud.com/n/{namespace}/b/{new_bucket_name}/o/index.html"
-            else:
-                site_url = f"https://objectstorage.{os.getenv('OCI_REGION')}.oraclecloud.com/n/{namespace}/b/{new_bucket_name}/o/"
-
-            new_record = {
-                "bucket_key": new_bucket_name,
-                "owner_id": session['user_id'],
-                "launch_time": datetime.datetime.utcnow().isoformat(),
-                "status": "Active",
-                "url": site_url,
-                "has_index": has_index
-            }
-            all_deployments.append(new_record)
-            save_deployments_db(all_deployments)
-            
-            print("[DEBUG] Metadata updated. Deployment Success!")
-            return jsonify({
-                "message": "Deployment successful",
-                "site_url": site_url,
-                "bucket_name": new_bucket_name,
-                "has_index": has_index
-            }), 201
+    if isinstance(e, MutationRejected):
+        return jsonify({"error": str(e)}), 409
 
-    except ValueError as e:
+    if isinstance(e, ValueError):
         print(f"❌ VALIDATION ERROR: {e}")
-        if bucket_created: cleanup_bucket(namespace, new_bucket_name)
         return jsonify({"error": str(e)}), 400
     
-    except oci.exceptions.ServiceError as e:
+    if isinstance(e, oci.exceptions.ServiceError):
         print(f"❌ OCI SERVICE ERROR: {e}")
-        if bucket_created: cleanup_bucket(namespace, new_bucket_name)
         if e.status == 403:
             return jsonify({"error": "Permission denied (Check OCI Policies)"}), 403
         return jsonify({"error": f"OCI Error: {e.message}"}), 500
     
+    print("❌ CRITICAL UNEXPECTED ERROR:")
+    traceback.print_exc()  # This prints the full error stack to your terminal
+    return jsonify({"error": "Deployment failed due to internal server error"}), 500
+
+def wants_async():
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def start_deployment(file_stream, owner_id, run_async, zip_path=None):
+    """
+    Validates an archive and deploys it as a new site, inline or as a
+    background job. `zip_path` is set when the archive already lives in a
+    temp file (chunked uploads); an async job then takes ownership of it.
+    Returns the route's JSON response.
+    """
+    try:
+        with zipfile.ZipFile(file_stream) as zf:
+            # Preflight: every rejection happens here, before any OCI call
+            print("[DEBUG] Building preflight manifest...")
+            with time_phase('zip_validation'):
+                manifest = build_manifest(zf)
+            print(f"[DEBUG] Manifest: {manifest.file_count} files, {manifest.total_size} bytes")
+
+            # Check the User's Site Quota
+            print("[DEBUG] Loading deployment DB...")
+            if metadata_store.count_sites(owner_id) >= MAX_SITES_PER_USER:
+                return jsonify({"error": f"Maximum of {MAX_SITES_PER_USER} sites allowed per user"}), 403
+
+            if not get_compartment_id():
+                return jsonify({"error": "Server configuration error: OCI_COMPARTMENT_ID not set"}), 500
+
+            # Admission control: waits briefly for capacity or raises AdmissionRejected (429)
+            ticket = deploy_admission.acquire(owner_id, manifest.total_size)
+
+            # Hand off to a background job...
+            if run_async:
+                job_zip_path = None
+                try:
+                    job_zip_path = zip_path or spool_upload(file_stream)
+                    job = DeployJob(owner_id, manifest.file_count, manifest.total_size)
+                    submit_job(job, lambda j: run_zip_job(
+                        j, job_zip_path, lambda zf, manifest, j: run_deployment(owner_id, zf, manifest, job=j),
+                        ticket))
+                except Exception:
+                    ticket.release()
+                    # A spool made here is ours to remove; a caller's zip_path stays the caller's
+                    if job_zip_path and job_zip_path != zip_path:
+                        remove_spool(job_zip_path)
+                    raise
+                print(f"[DEBUG] Queued deploy job {job.job_id}")
+                return jsonify({
+                    "message": "Deployment accepted",
+                    "job_id": job.job_id,
+                    "status_url": f"/api/deploy/jobs/{job.job_id}"
+                }), 202
+
+            # ...or deploy inline
+            try:
+                result = run_deployment(owner_id, zf, manifest)
+            finally:
+                ticket.release()
+            return jsonify({"message": "Deployment successful", **result}), 201
+
     except Exception as e:
-        print("❌ CRITICAL UNEXPECTED ERROR:")
-        traceback.print_exc()  # This prints the full error stack to your terminal
-        
-        if 'bucket_created' in locals() and bucket_created:
-            print("[DEBUG] Cleaning up bucket due to failure...")
-            cleanup_bucket(namespace, new_bucket_name)
-            
-        return jsonify({"error": "Deployment failed due to internal server error"}), 500
+        return deploy_error_response(e)
+
+def start_redeployment(site_record, file_stream, run_async, zip_path=None):
+    """Redeploy counterpart of start_deployment, for an already-authorized site."""
+    try:
+        with zipfile.ZipFile(file_stream) as zf:
+            with time_phase('zip_validation'):
+                manifest = build_manifest(zf)
+            ticket = deploy_admission.acquire(site_record['owner_id'], manifest.total_size)
+
+            if run_async:
+                job_zip_path = None
+                try:
+                    job_zip_path = zip_path or spool_upload(file_stream)
+                    job = DeployJob(site_record['owner_id'], manifest.file_count, manifest.total_size)
+                    submit_job(job, lambda j: run_zip_job(
+                        j, job_zip_path, lambda zf, manifest, j: run_redeployment(site_record, zf, manifest, job=j),
+                        ticket))
+                except Exception:
+                    ticket.release()
+                    # A spool made here is ours to remove; a caller's zip_path stays the caller's
+                    if job_zip_path and job_zip_path != zip_path:
+                        remove_spool(job_zip_path)
+                    raise
+                return jsonify({
+                    "message": "Redeployment accepted",
+                    "job_id": job.job_id,
+                    "status_url": f"/api/deploy/jobs/{job.job_id}"
+                }), 202
+
+            try:
+                result = run_redeployment(site_record, zf, manifest)
+            finally:
+                ticket.release()
+            return jsonify({"message": "Redeployment successful", **result}), 200
+
+    except Exception as e:
+        return deploy_error_response(e)
+
+def get_owned_site(bucket_name):
+    """The site record if it belongs to the logged-in user, else None."""
+    site_record = metadata_store.get_site(bucket_name)
+    if not site_record or site_record['owner_id'] != session['user_id']:
+        return None
+    return site_record
+
+@deploy_bp.route('', methods=['POST'])
+@login_required
+def deploy_site():
+    """
+    Deploys an uploaded ZIP as a new site. With `?async=1` the archive is
+    validated, the request returns 202 with a job ID, and the upload runs
+    on a background worker (poll GET /api/deploy/jobs/<job_id>).
+    """
+    print("--- [DEBUG] Starting Deployment Process ---")
+
+    file_stream, error = open_uploaded_zip()
+    if error:
+        return error
+
+    return start_deployment(file_stream, session['user_id'], wants_async())
+
+@deploy_bp.route('/<bucket_name>', methods=['PUT'])
+@login_required
+def redeploy_site(bucket_name):
+    """
+    Incrementally updates an existing site from a new ZIP: only new or
+    changed files are uploaded and removed files are deleted. Supports
+    `?async=1` like deploy_site.
+    """
+    print(f"--- [DEBUG] Starting Redeploy of {bucket_name} ---")
+
+    site_record = get_owned_site(bucket_name)
+    if not site_record:
+        return jsonify({"error": "Site not found or unauthorized"}), 404
+
+    file_stream, error = open_uploaded_zip()
+    if error:
+        return error
+
+    return start_redeployment(site_record, file_stream, wants_async())
+
+@deploy_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def deployment_status(job_id):
+    """Reports a background deploy's phase, file/byte progress and final URL."""
+    job = get_job(job_id) if all(c in string.hexdigits for c in job_id) else None
+    if not job or job.get('owner_id') != session['user_id']:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+def encode_cursor(site):
+    raw = json.dumps([site.get('launch_time', ''), site['bucket_key']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Returns the (launch_time, bucket_key) position a cursor points after."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        launch_time, bucket_key = json.loads(raw)
+        return str(launch_time), str(bucket_key)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def paginate_sites(sites, limit=None, cursor=None):
+    """
+    Orders sites oldest first and returns (page, next_cursor). The cursor is
+    the last returned site's (launch_time, bucket_key), so deleting sites
+    between requests never skips or repeats one.
+    """
+    ordered = sorted(sites, key=lambda d: (d.get('launch_time', ''), d['bucket_key']))
+    if cursor:
+        after = decode_cursor(cursor)
+        ordered = [d for d in ordered if (d.get('launch_time', ''), d['bucket_key']) > after]
+    if limit is None or len(ordered) <= limit:
+        return ordered, None
+    page = ordered[:limit]
+    return page, encode_cursor(page[-1])
 
 @deploy_bp.route('', methods=['GET'])
 @login_required
 def list_deployments():
-    """Returns list of sites owned by the current user."""
-    all_deployments = load_deployments_db()
-    # Filter by logged-in user
-    user_sites = [d for d in all_deployments if d.get('owner_id') == session['user_id']]
-    return jsonify({"sites": user_sites}), 200
+    """
+    Returns the sites owned by the current user.
+    Optional query parameters:
+      limit   - page size (1..MAX_LIST_PAGE_SIZE); the response then carries next_cursor
+      cursor  - next_cursor of the previous page
+      fields  - comma-separated site fields to return (bucket_key is always included)
+    Responses carry a weak ETag; a matching If-None-Match gets an empty 304.
+    """
+    try:
+        limit = request.args.get('limit', type=int)
+        if limit is not None and not 1 <= limit <= MAX_LIST_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_LIST_PAGE_SIZE}")
+        # The metadata reads below are conditional GETs, so an unchanged
+        # listing costs OCI a 304 rather than a document download
+        page, next_cursor = paginate_sites(metadata_store.list_sites(session['user_id']),
+                                           limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    fields = request.args.get('fields')
+    if fields:
+        wanted = {'bucket_key'} | {f.strip() for f in fields.split(',') if f.strip()}
+        page = [{k: v for k, v in site.items() if k in wanted} for site in page]
+
+    body = {"sites": page}
+    if limit is not None:
+        body["next_cursor"] = next_cursor
+
+    payload = json.dumps(body, sort_keys=True).encode('utf-8')
+    response = Response(payload, mimetype='application/json')
+    response.set_etag(hashlib.sha256(payload).hexdigest()[:32], weak=True)
+    # Browsers must revalidate every time; the listing changes with each deploy
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 @deploy_bp.route('/<bucket_name>', methods=['DELETE'])
 @login_required
@@ -330,22 +638,27 @@ def delete_site(bucket_name):
     namespace = get_metadata_namespace()
     
     # Verify Ownership
-    all_deployments = load_deployments_db()
-    site_record = next((d for d in all_deployments if d['bucket_key'] == bucket_name), None)
+    site_record = metadata_store.get_site(bucket_name)
     
     if not site_record or site_record['owner_id'] != session['user_id']:
         return jsonify({"error": "Site not found or unauthorized"}), 404
 
     try:
-        # Empty the bucket first (with pagination)
-        empty_bucket(object_storage, namespace, bucket_name)
-        
-        # Delete the bucket
-        object_storage.delete_bucket(namespace, bucket_name)
+        # Empty the bucket (paginated, parallel deletes), then delete it
+        with time_phase('teardown'):
+            result = delete_bucket_with_contents(object_storage, namespace, bucket_name)
+        print(f"[DEBUG] Teardown of {bucket_name}: {result.to_dict()}")
+        if not result.ok:
+            return jsonify({
+                "error": "Failed to delete site. Please try again.",
+                "deleted": result.deleted,
+                "failed": len(result.failed)
+            }), 500
 
         # Update Metadata
-        all_deployments = [d for d in all_deployments if d['bucket_key'] != bucket_name]
-        save_deployments_db(all_deployments)
+        metadata_store.remove_site(bucket_name)
+        delete_site_manifest(bucket_name)
+        forget_dedup_sources(bucket_name)
 
         return jsonify({"message": "Site deleted successfully"}), 200
 
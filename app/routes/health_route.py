@@ -1,7 +1,12 @@
-import os
-import json
-from flask import Blueprint, jsonify
-from app.routes.utils_route import get_oci_client
+from flask import Blueprint, jsonify, request
+from app.routes.utils_route import get_client_stats
+from app.health_probe import health_prober
+from app.resilience import get_resilience_stats
+from app.admission import deploy_admission
+from app.metadata_cache import metadata_cache
+from app.metrics import REGISTRY
+from app.reconciler import reconciler
+from app.dedup import dedup_index
 health_bp = Blueprint('health', __name__)
 
 @health_bp.route('/health', methods=['GET'])
@@ -11,30 +16,52 @@ def health():
 @health_bp.route('/health/oci', methods=['GET'])
 def check_oci_connection():
     """
-    Tests the connection to Oracle Cloud by fetching the Object Storage Namespace.
+    Reports OCI connectivity and metadata bucket reachability from the
+    background prober's latest result (no OCI call on the request path).
+    ?detail=1 adds client pool, resilience, admission and cache state.
     """
-    try:
-        # 1. Initialize Client
-        object_storage = get_oci_client('object_storage')
-        
-        # 2. Perform a lightweight API call
-        namespace = object_storage.get_namespace().data
-        
-        # 3. Success Response
-        return jsonify({
+    result = health_prober.latest()
+
+    if result["status"] == "connected":
+        body = {
             "status": "connected",
             "provider": "Oracle Cloud Infrastructure",
-            "namespace": namespace,
-            "message": "OCI API credentials are valid."
-        }), 200
-
-    except Exception as e:
-        # 4. Failure Response
-        return jsonify({
-            "status": "failed",
-            "error": str(e),
+            "namespace": result["namespace"],
+            "message": "OCI API credentials are valid.",
+        }
+        code = 200
+    else:
+        body = {
+            "status": result["status"],
+            "error": result.get("error") or "Health probe result is out of date",
             "tip": "Check your .env file, API Key path, or IAM Policies."
-        }), 500
+        }
+        # Failed probes keep the old 500; no or outdated results are "try later"
+        code = 500 if result["status"] == "failed" else 503
+
+    body["probe"] = {key: result.get(key) for key in
+                     ("checked_at", "age_seconds", "latency_ms", "metadata_bucket", "metadata_bucket_reachable")}
+
+    if request.args.get('detail', '').lower() in ('1', 'true', 'yes'):
+        body["detail"] = {
+            "prober": dict(health_prober.stats, interval_seconds=health_prober.interval),
+            "clients": get_client_stats(),
+            "resilience": get_resilience_stats(),
+            "admission": deploy_admission.to_dict(),
+            "metadata_cache": dict(metadata_cache.stats),
+            "metrics": REGISTRY.snapshot(),
+        }
+    return jsonify(body), code
+@health_bp.route('/health/reconciler', methods=['GET'])
+def reconciler_status():
+    """Progress of the latest orphaned-bucket reconciliation run and this process's totals."""
+    return jsonify(reconciler.status()), 200
+
+@health_bp.route('/health/dedup', methods=['GET'])
+def dedup_status():
+    """Content deduplication ratios, platform-wide and for this process."""
+    return jsonify(dedup_index.report()), 200
+
 # @health_bp.route('/health/metadata-debug', methods=['GET'])
 # def debug_metadata():
 #     """
@@ -0,0 +1,47 @@
+from flask import Blueprint, Response
+from app.metrics import REGISTRY
+from app.resilience import get_resilience_stats
+from app.admission import deploy_admission
+from app.metadata_cache import metadata_cache
+from app.routes.utils_route import get_client_stats
+from app.reconciler import reconciler
+from app.dedup import dedup_index
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+# Admission entries that are current levels and limits; the rest are running totals
+ADMISSION_GAUGES = ('in_flight', 'in_flight_bytes', 'queued', 'max_concurrent', 'max_bytes',
+                    'max_queue', 'processes')
+
+
+def _prefixed(prefix, stats, keys=None, suffix=''):
+    """Numeric entries of a stats dict (only `keys`, if given) named `<prefix>_<key><suffix>`."""
+    return {f"{prefix}_{key}{suffix}": value for key, value in stats.items()
+            if (keys is None or key in keys)
+            and isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+def _totals(prefix, stats, exclude=()):
+    """Running totals of a stats dict, as `<prefix>_<key>_total` counters."""
+    return _prefixed(prefix, {k: v for k, v in stats.items() if k not in exclude}, suffix='_total')
+
+
+# Existing in-process stats dicts, read at scrape time
+REGISTRY.add_collector(lambda: _totals('oci_resilience', get_resilience_stats()), kind='counter')
+REGISTRY.add_collector(lambda: _prefixed('deploy_admission', deploy_admission.to_dict(), ADMISSION_GAUGES))
+REGISTRY.add_collector(lambda: _totals('deploy_admission', deploy_admission.to_dict(), ADMISSION_GAUGES),
+                       kind='counter')
+REGISTRY.add_collector(lambda: _totals('metadata_cache', metadata_cache.stats), kind='counter')
+REGISTRY.add_collector(lambda: _totals('oci_client_registry', get_client_stats()), kind='counter')
+REGISTRY.add_collector(lambda: _totals('reconciler', reconciler.stats), kind='counter')
+REGISTRY.add_collector(lambda: _totals('dedup', dedup_index.stats), kind='counter')
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text exposition of request, deploy-phase and OCI timings,
+    for every worker process when METRICS_DIR is set.
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,138 @@
+import os
+import zipfile
+from flask import Blueprint, request, jsonify, session
+from app.decorators.login_req import login_required
+from app.chunked_uploads import UploadSession, UploadLimitExceeded, MAX_CHUNKED_UPLOAD_SIZE
+from app.routes.deploy_route import (
+    start_deployment, start_redeployment, get_owned_site, wants_async
+)
+
+upload_bp = Blueprint('uploads', __name__)
+
+# --- Helpers ---
+
+def get_owned_upload(upload_id):
+    """The upload session if it belongs to the logged-in user, else None."""
+    upload = UploadSession.load(upload_id)
+    if not upload or upload.owner_id != session['user_id']:
+        return None
+    return upload
+
+# --- Routes ---
+
+@upload_bp.route('', methods=['POST'])
+@login_required
+def init_upload():
+    """
+    Starts a chunked upload. Body: {"filename": ..., "size": <bytes>}.
+    Returns the upload ID and the chunk size the client must use.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get('filename') or 'site.zip')
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "A numeric 'size' is required"}), 400
+
+    try:
+        upload = UploadSession.create(session['user_id'], filename, size)
+    except UploadLimitExceeded as e:
+        return jsonify({"error": str(e)}), e.status_code
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    print(f"[DEBUG] Started chunked upload {upload.upload_id}: {size} bytes in {upload.total_chunks} chunks")
+    response = upload.to_dict()
+    response["max_size"] = MAX_CHUNKED_UPLOAD_SIZE
+    return jsonify(response), 201
+
+@upload_bp.route('/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    """Lists the chunks received so far, so a client can resume after a failure."""
+    upload = get_owned_upload(upload_id)
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(upload.to_dict()), 200
+
+@upload_bp.route('/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id, index):
+    """
+    Stores one chunk (raw request body). An optional X-Chunk-SHA256 header is
+    verified. Re-sending a chunk simply overwrites it.
+    """
+    upload = get_owned_upload(upload_id)
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+
+    try:
+        upload.write_chunk(index, request.stream, request.headers.get('X-Chunk-SHA256'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except FileNotFoundError:
+        # Completed or aborted while this chunk was in flight
+        return jsonify({"error": "Upload not found"}), 404
+
+    return jsonify({"upload_id": upload_id, "index": index}), 200
+
+@upload_bp.route('/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """
+    Deploys the assembled archive. Body may name an existing site
+    ({"bucket_name": ...}) to redeploy it instead of creating a new one.
+    Supports `?async=1` like POST /api/deploy.
+    """
+    upload = get_owned_upload(upload_id)
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+
+    missing = upload.missing_chunks()
+    if missing:
+        return jsonify({"error": "Upload is incomplete", "missing_chunks": missing}), 409
+
+    data = request.get_json(silent=True) or {}
+    site_record = None
+    if data.get('bucket_name'):
+        site_record = get_owned_site(data['bucket_name'])
+        if not site_record:
+            return jsonify({"error": "Site not found or unauthorized"}), 404
+
+    if not zipfile.is_zipfile(upload.data_path):
+        upload.discard()
+        return jsonify({"error": "File is not a valid ZIP"}), 400
+
+    zip_path = upload.detach()
+    if zip_path is None:
+        return jsonify({"error": "Upload already completed"}), 409
+
+    print(f"[DEBUG] Chunked upload {upload_id} complete, deploying from {zip_path}")
+    run_async = wants_async()
+    response = None
+    try:
+        with open(zip_path, 'rb') as archive:
+            if site_record:
+                response = start_redeployment(site_record, archive, run_async, zip_path=zip_path)
+            else:
+                response = start_deployment(archive, session['user_id'], run_async, zip_path=zip_path)
+        return response
+    finally:
+        # A queued job owns the archive (202). Turned away at admission (429),
+        # it goes back into the session so the client can retry; otherwise
+        # it is done with here
+        status = response[1] if response is not None else None
+        if status == 429:
+            upload.restore(zip_path)
+        elif status != 202:
+            os.remove(zip_path)
+
+@upload_bp.route('/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_upload(upload_id):
+    """Abandons an upload and frees its disk space."""
+    upload = get_owned_upload(upload_id)
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+    upload.discard()
+    return jsonify({"message": "Upload aborted"}), 200
@@ -1,37 +1,259 @@
 import os
+import threading
+import time
 import oci
+from app.resilience import ResilientClient
 
-def get_oci_client(service_type):
+# --- Client Pool Configuration ---
+# Max keep-alive connections kept per client; sized for parallel uploads.
+OCI_POOL_MAXSIZE = int(os.getenv('OCI_POOL_MAXSIZE', '32'))
+# Refresh the instance principal token this many seconds before it expires.
+TOKEN_REFRESH_MARGIN = int(os.getenv('OCI_TOKEN_REFRESH_MARGIN', '300'))
+# Fallback refresh interval when the token expiry cannot be read.
+TOKEN_REFRESH_FALLBACK = 600
+# Shortest sleep between refresher passes, so a failing refresh is not retried in a tight loop
+TOKEN_REFRESH_MIN_WAIT = 5
+
+
+def _client_kwargs():
+    # Retries and circuit breaking are done by app.resilience, so the SDK's own are off.
+    # (Built per client rather than at import so `oci` is only loaded when first needed.)
+    return {
+        "retry_strategy": oci.retry.NoneRetryStrategy(),
+        "circuit_breaker_strategy": oci.circuit_breaker.NoCircuitBreakerStrategy(),
+    }
+
+# One client per (service_type, auth_method), shared by every request thread.
+_clients = {}
+_signers = {}
+_signer_refreshed_at = {}  # signer name -> time.time() of its last token fetch
+_registry_lock = threading.Lock()
+_refresher = None
+_client_stats = {
+    "hits": 0,
+    "misses": 0,
+    "token_refreshes": 0,
+    "token_refresh_errors": 0,
+}
+# Counters are bumped from request threads and the refresher alike
+_stats_lock = threading.Lock()
+
+
+def _count(stat):
+    with _stats_lock:
+        _client_stats[stat] += 1
+
+
+def _build_client(service_type, auth_method):
     """
-    Factory function to create OCI clients (Identity, ObjectStorage, etc.).
+    Creates a new OCI client (Identity, ObjectStorage, etc.) for the given auth method.
     """
-    auth_method = os.getenv('OCI_AUTH_METHOD', 'instance_principal')
-
     if auth_method == 'config_file':
         # Local Development: Use keys defined in .env
         config_path = os.getenv('OCI_CONFIG_PATH', oci.config.DEFAULT_LOCATION)
         config_profile = os.getenv('OCI_CONFIG_PROFILE', 'DEFAULT')
-        
+
         try:
             config = oci.config.from_file(file_location=config_path, profile_name=config_profile)
             if service_type == 'identity':
-                return oci.identity.IdentityClient(config)
+                return oci.identity.IdentityClient(config, **_client_kwargs())
             elif service_type == 'object_storage':
-                return oci.object_storage.ObjectStorageClient(config)
+                return oci.object_storage.ObjectStorageClient(config, **_client_kwargs())
         except Exception as e:
             print(f"Error loading OCI config: {e}")
             return None
 
+    elif auth_method == 'fake':
+        # Offline development and benchmarks: in-memory Object Storage (app/fake_oci.py)
+        from app.fake_oci import get_fake_client
+        return get_fake_client() if service_type == 'object_storage' else None
+
     else:
         # [cite_start]Production: Use Instance Principals (Dynamic Groups) [cite: 83, 87]
         try:
-            signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
+            signer = _get_instance_principal_signer()
             if service_type == 'identity':
-                return oci.identity.IdentityClient(config={}, signer=signer)
+                return oci.identity.IdentityClient(config={}, signer=signer, **_client_kwargs())
             elif service_type == 'object_storage':
-                return oci.object_storage.ObjectStorageClient(config={}, signer=signer)
+                return oci.object_storage.ObjectStorageClient(config={}, signer=signer, **_client_kwargs())
         except Exception as e:
             print(f"Error initializing Instance Principals: {e}")
             return None
-            
-    return None
\ No newline at end of file
+
+    return None
+
+
+def _get_instance_principal_signer():
+    """
+    Returns the shared Instance Principals signer, creating it (and its
+    background token refresher) on first use. Caller must hold _registry_lock.
+    """
+    signer = _signers.get('instance_principal')
+    if signer is None:
+        signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
+        _signers['instance_principal'] = signer
+        _signer_refreshed_at['instance_principal'] = time.time()
+        _start_token_refresher()
+    return signer
+
+
+def _enlarge_connection_pool(client):
+    """
+    Remounts the client's HTTPS adapter with a bigger keep-alive pool so
+    concurrent request threads reuse connections instead of opening new ones.
+    """
+    session = client.base_client.session
+    adapter = session.adapters.get('https://')
+    if adapter is None or getattr(adapter, '_pool_maxsize', 0) >= OCI_POOL_MAXSIZE:
+        return
+    session.mount('https://', adapter.__class__(
+        pool_connections=getattr(adapter, '_pool_connections', 10),
+        pool_maxsize=OCI_POOL_MAXSIZE,
+    ))
+
+
+def _seconds_until_refresh(signer, refreshed_at):
+    """
+    How long until the signer's token needs renewing (0 = now). When its
+    expiry can't be read, tokens are renewed every TOKEN_REFRESH_FALLBACK
+    seconds after the last fetch instead.
+    """
+    try:
+        expires_at = signer.federation_client.security_token.jwt['exp']
+    except Exception:
+        return max(refreshed_at + TOKEN_REFRESH_FALLBACK - time.time(), 0)
+    return max(expires_at - time.time() - TOKEN_REFRESH_MARGIN, 0)
+
+
+def _token_refresh_loop():
+    """Background loop renewing security tokens ahead of expiry, off the request path."""
+    while True:
+        with _registry_lock:
+            signers = [(name, signer, _signer_refreshed_at.get(name, 0)) for name, signer in _signers.items()]
+        if not signers:
+            return
+        wait = min(_seconds_until_refresh(signer, refreshed_at) for _, signer, refreshed_at in signers)
+        time.sleep(max(wait, TOKEN_REFRESH_MIN_WAIT))
+        for name, signer, refreshed_at in signers:
+            if _seconds_until_refresh(signer, refreshed_at) > 0:
+                continue
+            try:
+                signer.refresh_security_token()
+                with _registry_lock:
+                    _signer_refreshed_at[name] = time.time()
+                _count("token_refreshes")
+            except Exception as e:
+                _count("token_refresh_errors")
+                print(f"Error refreshing OCI security token: {e}")
+
+
+def _start_token_refresher():
+    global _refresher
+    if _refresher is not None and _refresher.is_alive():
+        return
+    _refresher = threading.Thread(target=_token_refresh_loop, name='oci-token-refresher', daemon=True)
+    _refresher.start()
+
+
+def get_oci_client(service_type):
+    """
+    Returns the pooled OCI client (Identity, ObjectStorage, etc.) for the current
+    auth method, wrapped with retries and a circuit breaker (app.resilience).
+    Clients are built once per process and reused by every request.
+    """
+    auth_method = os.getenv('OCI_AUTH_METHOD', 'instance_principal')
+    key = (service_type, auth_method)
+
+    client = _clients.get(key)
+    if client is not None:
+        _count("hits")
+        return client
+
+    with _registry_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _count("hits")
+            return client
+
+        _count("misses")
+        client = _build_client(service_type, auth_method)
+        if client is not None:
+            _enlarge_connection_pool(client)
+            client = ResilientClient(client, service_type)
+            _clients[key] = client
+        return client
+
+
+def get_client_stats():
+    """Returns client registry counters (hits, misses, token refreshes) and pool state."""
+    with _stats_lock:
+        stats = dict(_client_stats)
+    with _registry_lock:
+        stats["clients"] = [f"{service}:{auth}" for service, auth in _clients]
+    return stats
+
+
+def reset_oci_clients():
+    """Drops every pooled client so the next call rebuilds it (e.g. after a credentials change)."""
+    with _registry_lock:
+        _clients.clear()
+        _signers.clear()
+        _signer_refreshed_at.clear()
+
+
+# --- Tenancy Lookups ---
+# Namespace, region and compartment never change for the life of the process,
+# so they are resolved once and shared by every route.
+_tenancy = {}
+_tenancy_lock = threading.Lock()
+
+
+def _resolve_region():
+    region = os.getenv('OCI_REGION')
+    if region:
+        return region
+    # Fall back to the region baked into the pooled client's endpoint
+    # (https://objectstorage.<region>.oraclecloud.com).
+    client = get_oci_client('object_storage')
+    endpoint = client.base_client.endpoint if client else ''
+    parts = endpoint.split('//')[-1].split('.')
+    return parts[1] if len(parts) > 2 else None
+
+
+def _lookup(key, resolver):
+    value = _tenancy.get(key)
+    if value is not None:
+        return value
+    with _tenancy_lock:
+        value = _tenancy.get(key)
+        if value is None:
+            value = resolver()
+            if value is not None:
+                _tenancy[key] = value
+        return value
+
+
+def get_namespace():
+    """Returns the Object Storage namespace, fetching it from OCI only on first use."""
+    def resolve():
+        client = get_oci_client('object_storage')
+        if not client:
+            raise ValueError("Failed to initialize OCI Object Storage Client")
+        return client.get_namespace().data
+    return _lookup('namespace', resolve)
+
+
+def get_region():
+    """Returns the OCI region the service runs in."""
+    return _lookup('region', _resolve_region)
+
+
+def get_compartment_id():
+    """Returns the compartment that site buckets are created in (None if not configured)."""
+    return _lookup('compartment_id', lambda: os.getenv('OCI_COMPARTMENT_ID'))
+
+
+def invalidate_tenancy_cache():
+    """Forgets cached namespace/region/compartment so they are re-resolved on next use."""
+    with _tenancy_lock:
+        _tenancy.clear()
@@ -0,0 +1,158 @@
+"""
+Cold-start helpers, installed by app/__init__.py before anything else is imported:
+
+  - defer_import(name): `import name` anywhere then binds a stand-in that
+    imports the real module on first attribute use, so heavy SDKs (oci)
+    stay out of startup until a route or the warm-up thread needs them.
+  - STARTUP_PROFILE=1 times every module import and prints the slowest
+    ones when create_app() returns (and any later, deferred import).
+"""
+import importlib
+import importlib.abc
+import os
+import sys
+import threading
+import time
+import types
+
+STARTUP_PROFILE = os.getenv('STARTUP_PROFILE', 'false').lower() in ('1', 'true', 'yes')
+STARTUP_PROFILE_TOP = int(os.getenv('STARTUP_PROFILE_TOP', '25'))
+
+_process_started = time.monotonic()
+
+
+def uptime():
+    """Seconds since the app package was first imported."""
+    return time.monotonic() - _process_started
+
+
+# --- Deferred imports ---
+
+class DeferredModule(types.ModuleType):
+    """
+    Placeholder for a module that has not been imported yet. The first
+    attribute lookup imports the real module (once, under a lock, so request
+    threads and the warm-up thread can race safely) and every lookup after
+    that is forwarded to it.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._deferred_lock = threading.Lock()
+        self._deferred_module = None
+
+    def _load(self):
+        module = self._deferred_module
+        if module is not None:
+            return module
+        with self._deferred_lock:
+            if self._deferred_module is None:
+                started = time.monotonic()
+                if sys.modules.get(self.__name__) is self:
+                    del sys.modules[self.__name__]
+                try:
+                    self._deferred_module = importlib.import_module(self.__name__)
+                except Exception:
+                    sys.modules.setdefault(self.__name__, self)
+                    raise
+                print(f"[DEBUG] Imported {self.__name__} on first use in "
+                      f"{(time.monotonic() - started) * 1000:.0f}ms ({uptime():.2f}s after start)")
+            return self._deferred_module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def defer_import(name):
+    """Makes `import name` cheap until the module is actually used."""
+    if name not in sys.modules:
+        sys.modules[name] = DeferredModule(name)
+
+
+def is_loaded(name):
+    module = sys.modules.get(name)
+    return module is not None and not (isinstance(module, DeferredModule) and module._deferred_module is None)
+
+
+# --- Import profiler ---
+
+class _TimedLoader:
+    """Wraps a module's loader to time exec_module; everything else passes through."""
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def exec_module(self, module):
+        self._profiler.enter(module.__name__)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.exit(module.__name__)
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """
+    Meta-path finder recording how long each module takes to import:
+    cumulative (including the modules it imports) and self time.
+    """
+
+    def __init__(self):
+        self.records = {}  # name -> [cumulative, self]
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def enter(self, name):
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append([name, time.monotonic(), 0.0])  # name, started, time spent in children
+
+    def exit(self, name):
+        stack = self._local.stack
+        _, started, children = stack.pop()
+        elapsed = time.monotonic() - started
+        if stack:
+            stack[-1][2] += elapsed
+        with self._lock:
+            self.records[name] = [elapsed, elapsed - children]
+
+    def report(self, top=STARTUP_PROFILE_TOP):
+        with self._lock:
+            items = sorted(self.records.items(), key=lambda item: item[1][0], reverse=True)
+        lines = [f"[STARTUP] {len(items)} modules imported; slowest (cumulative / self, ms):"]
+        for name, (cumulative, own) in items[:top]:
+            lines.append(f"[STARTUP]   {cumulative * 1000:8.1f} / {own * 1000:7.1f}  {name}")
+        return '\n'.join(lines)
+
+
+profiler = None
+
+
+def start_profiling():
+    """Installs the import profiler at the front of sys.meta_path (STARTUP_PROFILE)."""
+    global profiler
+    if profiler is None:
+        profiler = ImportProfiler()
+        sys.meta_path.insert(0, profiler)
+    return profiler
+
+
+def print_startup_report(label):
+    if profiler is not None:
+        print(f"[STARTUP] {label} {uptime() * 1000:.0f}ms after start")
+        print(profiler.report())
@@ -130,6 +130,8 @@ async function logout() {
     } finally {
         // Clear UI regardless of server response
         currentUser = null;
+        sitesPageCache.clear();
+        sitesRendered = false;
         dashboardSection.classList.add('hidden');
         authSection.classList.remove('hidden');
         switchTab('login');
@@ -169,26 +171,64 @@ function switchDashTab(tab) {
 
 // --- SITES MANAGEMENT ---
 
+// Listing pages by URL -> { etag, data }; unchanged pages come back as an empty 304
+const SITES_PAGE_SIZE = 50;
+const SITES_FIELDS = 'bucket_key,status,launch_time,url';
+const sitesPageCache = new Map();
+
+async function fetchSitesPage(cursor) {
+    let url = `${API_BASE_URL}/api/deploy?limit=${SITES_PAGE_SIZE}&fields=${SITES_FIELDS}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+
+    const cached = sitesPageCache.get(url);
+    const res = await fetch(url, {
+        method: 'GET',
+        credentials: 'include',
+        cache: 'no-store', // We revalidate ourselves with If-None-Match
+        headers: cached ? { 'If-None-Match': cached.etag } : {}
+    });
+
+    if (res.status === 304 && cached) {
+        return { data: cached.data, changed: false };
+    }
+    if (!res.ok) {
+        throw new Error(`Failed to load sites (${res.status})`);
+    }
+    const data = await res.json();
+    const etag = res.headers.get('ETag');
+    if (etag) sitesPageCache.set(url, { etag, data });
+    return { data, changed: true };
+}
+
+let sitesRendered = false;
+
 async function loadSites() {
     const sitesList = document.getElementById('sites-list');
     if (!sitesList) return;
-    
-    sitesList.innerHTML = '<p class="loading">Loading sites...</p>';
 
-    try {
-        const res = await fetch(`${API_BASE_URL}/api/deploy`, {
-            method: 'GET',
-            credentials: 'include'
-        });
+    if (!sitesRendered) {
+        sitesList.innerHTML = '<p class="loading">Loading sites...</p>';
+    }
 
-        if (res.ok) {
-            const data = await res.json();
-            displaySites(data.sites);
-        } else {
-            sitesList.innerHTML = '<p class="error">Failed to load sites</p>';
+    try {
+        const sites = [];
+        let changed = false;
+        let cursor = null;
+        do {
+            const page = await fetchSitesPage(cursor);
+            sites.push(...page.data.sites);
+            changed = changed || page.changed;
+            cursor = page.data.next_cursor;
+        } while (cursor);
+
+        // Nothing changed since the last render: leave the DOM alone
+        if (changed || !sitesRendered) {
+            displaySites(sites);
+            sitesRendered = true;
         }
     } catch (err) {
         console.error('Error loading sites:', err);
+        sitesRendered = false;
         sitesList.innerHTML = '<p class="error">Unable to load sites. Please try again.</p>';
     }
 }
@@ -313,38 +353,230 @@ async function handleUpload(file) {
     resultLink.classList.add('hidden');
     statusText.textContent = `Uploading ${file.name}...`;
 
-    const formData = new FormData();
-    formData.append('file', file);
-
     try {
-        const res = await fetch(`${API_BASE_URL}/api/deploy`, {
-            method: 'POST',
-            credentials: 'include',
-            body: formData
-        });
+        // Large archives go up in chunks, in parallel, and resume after a failure
+        const uploadId = await uploadInChunks(file, statusText);
+
+        // Async mode: the server validates the ZIP, returns a job ID and deploys in the background
+        let res;
+        for (let attempt = 1; ; attempt++) {
+            res = await fetch(`${API_BASE_URL}/api/uploads/${uploadId}/complete?async=1`, {
+                method: 'POST',
+                credentials: 'include',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({})
+            });
+            // 429: the server is at capacity; wait as long as it asks and try again
+            if (res.status !== 429 || attempt >= DEPLOY_ADMISSION_ATTEMPTS) break;
+            const retryAfter = parseInt(res.headers.get('Retry-After'), 10) || 5;
+            statusText.textContent = `Server busy, retrying in ${retryAfter}s...`;
+            await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+        }
 
-        if (res.ok) {
-            const data = await res.json();
-            statusText.textContent = "Done!";
-            resultLink.classList.remove('hidden');
-            
-            const link = document.getElementById('deployed-url');
-            if (link) {
-                link.href = data.site_url;
-                link.textContent = data.site_url;
-            }
-            
-            // Refresh sites list if on that tab
-            const sitesTab = document.getElementById('sites-tab');
-            if (sitesTab && !sitesTab.classList.contains('hidden')) {
-                loadSites();
+        const data = await res.json();
+        // The server has consumed (or discarded) the upload session, unless it
+        // was still too busy (429) and kept it for another attempt
+        if (res.status !== 429) localStorage.removeItem(uploadResumeKey(file));
+
+        if (res.status === 202) {
+            statusText.textContent = "Upload received. Deploying...";
+            const job = await pollDeployJob(data.job_id, statusText);
+            if (job.phase === 'done') {
+                showDeployResult(job.site_url);
+            } else {
+                statusText.textContent = "Deployment failed: " + (job.error || "Unknown error");
             }
+        } else if (res.ok) {
+            showDeployResult(data.site_url);
         } else {
-            const data = await res.json();
             statusText.textContent = "Upload failed: " + (data.error || "Server rejected the file");
         }
     } catch (err) {
         console.error('Upload error:', err);
-        statusText.textContent = "Upload failed. Please check your connection and try again.";
+        statusText.textContent = err.userMessage
+            || "Upload failed. Please check your connection and try again (the upload will resume).";
+    }
+}
+
+// --- CHUNKED UPLOADS ---
+
+const UPLOAD_CONCURRENCY = 3;
+const DEPLOY_ADMISSION_ATTEMPTS = 5;
+const CHUNK_MAX_ATTEMPTS = 5;
+const CHUNK_RETRY_BASE_MS = 500;
+
+// Same file picked again => same key => the unfinished upload is resumed
+function uploadResumeKey(file) {
+    return `upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function apiJson(path, options = {}) {
+    const res = await fetch(`${API_BASE_URL}${path}`, { credentials: 'include', ...options });
+    const data = await res.json().catch(() => ({}));
+    return { res, data };
+}
+
+// Returns an upload session for the file: the saved one if the server still has it, else a new one
+async function openUploadSession(file) {
+    const key = uploadResumeKey(file);
+    const savedId = localStorage.getItem(key);
+    if (savedId) {
+        const { res, data } = await apiJson(`/api/uploads/${savedId}`);
+        if (res.ok) return data;
+        localStorage.removeItem(key);
+    }
+
+    const { res, data } = await apiJson('/api/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size })
+    });
+    if (!res.ok) {
+        const err = new Error(data.error || 'Could not start upload');
+        err.userMessage = "Upload failed: " + (data.error || "Server rejected the file");
+        throw err;
+    }
+    localStorage.setItem(key, data.upload_id);
+    return data;
+}
+
+async function sha256Hex(blob) {
+    if (!window.crypto || !window.crypto.subtle) return null;
+    const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Sends one chunk, retrying with exponential backoff on network errors and 5xx responses
+async function uploadChunk(uploadId, index, blob) {
+    const checksum = await sha256Hex(blob);
+    const headers = { 'Content-Type': 'application/octet-stream' };
+    if (checksum) headers['X-Chunk-SHA256'] = checksum;
+
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const res = await fetch(`${API_BASE_URL}/api/uploads/${uploadId}/chunks/${index}`, {
+                method: 'PUT',
+                credentials: 'include',
+                headers,
+                body: blob
+            });
+            if (res.ok) return;
+            if (res.status < 500 && res.status !== 429) {
+                const data = await res.json().catch(() => ({}));
+                throw Object.assign(new Error(data.error || `Chunk ${index} rejected`), { fatal: true });
+            }
+        } catch (err) {
+            if (err.fatal) throw err;
+        }
+        if (attempt >= CHUNK_MAX_ATTEMPTS) throw new Error(`Chunk ${index} failed after ${attempt} attempts`);
+        await new Promise(resolve => setTimeout(resolve, CHUNK_RETRY_BASE_MS * 2 ** (attempt - 1)));
+    }
+}
+
+// Uploads every chunk the server does not have yet; returns the upload ID once all are in
+async function uploadInChunks(file, statusText) {
+    const upload = await openUploadSession(file);
+    const received = new Set(upload.received_chunks);
+    const pending = [];
+    for (let i = 0; i < upload.total_chunks; i++) {
+        if (!received.has(i)) pending.push(i);
+    }
+
+    let done = received.size;
+    const showProgress = () => {
+        const percent = Math.round((done / upload.total_chunks) * 100);
+        statusText.textContent = `Uploading ${file.name}... ${percent}%`;
+    };
+    showProgress();
+
+    const worker = async () => {
+        while (pending.length) {
+            const index = pending.shift();
+            const start = index * upload.chunk_size;
+            await uploadChunk(upload.upload_id, index, file.slice(start, start + upload.chunk_size));
+            done++;
+            showProgress();
+        }
+    };
+    await Promise.all(Array.from({ length: UPLOAD_CONCURRENCY }, worker));
+    return upload.upload_id;
+}
+
+const JOB_POLL_INTERVAL_MS = 1000;
+// Stop waiting for a deploy after this long...
+const JOB_POLL_TIMEOUT_MS = 30 * 60 * 1000;
+// ...or once the job has been missing this many polls in a row (pruned, or lost with its worker)
+const JOB_MISSING_POLLS = 3;
+
+const DEPLOY_PHASE_LABELS = {
+    queued: 'Waiting for a deploy worker...',
+    creating_bucket: 'Creating bucket...',
+    hashing: 'Comparing files...',
+    uploading: 'Uploading files',
+    saving_metadata: 'Saving site details...'
+};
+
+// Polls a background deploy job until it finishes, updating the status line as it goes.
+// A job that goes missing or never finishes comes back as a failed one.
+async function pollDeployJob(jobId, statusText) {
+    const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+    let missing = 0;
+    while (true) {
+        if (Date.now() > deadline) {
+            return { phase: 'failed', error: 'Timed out waiting for the deployment. Check your sites list before retrying.' };
+        }
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+
+        let job;
+        try {
+            const res = await fetch(`${API_BASE_URL}/api/deploy/jobs/${jobId}`, {
+                method: 'GET',
+                credentials: 'include'
+            });
+            if (res.status === 404) {
+                if (++missing >= JOB_MISSING_POLLS) {
+                    return { phase: 'failed', error: 'The deployment status was lost. Check your sites list before retrying.' };
+                }
+                statusText.textContent = 'Waiting for deployment status...';
+                continue;
+            }
+            if (!res.ok) continue; // transient error; keep polling
+            missing = 0;
+            job = await res.json();
+        } catch (err) {
+            console.error('Job poll error:', err);
+            continue;
+        }
+
+        if (job.phase === 'done' || job.phase === 'failed') {
+            return job;
+        }
+
+        let label = DEPLOY_PHASE_LABELS[job.phase] || job.phase;
+        if (job.phase === 'uploading') {
+            const percent = job.bytes_total ? Math.round(100 * job.bytes_uploaded / job.bytes_total) : 0;
+            label += ` ${job.files_uploaded}/${job.files_total} files (${percent}%)`;
+        }
+        statusText.textContent = label;
+    }
+}
+
+function showDeployResult(siteUrl) {
+    const statusText = document.getElementById('status-text');
+    const resultLink = document.getElementById('result-link');
+
+    statusText.textContent = "Done!";
+    resultLink.classList.remove('hidden');
+    
+    const link = document.getElementById('deployed-url');
+    if (link) {
+        link.href = siteUrl;
+        link.textContent = siteUrl;
+    }
+    
+    // Refresh sites list if on that tab
+    const sitesTab = document.getElementById('sites-tab');
+    if (sitesTab && !sitesTab.classList.contains('hidden')) {
+        loadSites();
     }
 }
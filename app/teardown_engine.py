@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import oci
+
+# --- Configuration ---
+TEARDOWN_WORKERS = int(os.getenv('TEARDOWN_WORKERS', '16'))
+LIST_PAGE_SIZE = 1000
+
+
+class TeardownResult:
+    """Definite outcome of emptying a bucket: what was deleted, what was not, and how long it took."""
+
+    def __init__(self, bucket_name):
+        self.bucket_name = bucket_name
+        self.deleted = 0
+        self.failed = []  # object names that could not be deleted
+        self.listing_error = None
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ok(self):
+        return not self.failed and self.listing_error is None
+
+    def to_dict(self):
+        return {
+            "bucket": self.bucket_name,
+            "deleted": self.deleted,
+            "failed": len(self.failed),
+            "listing_error": self.listing_error,
+            "elapsed_seconds": round(self.elapsed, 3),
+        }
+
+
+def _list_pages(client, namespace, bucket_name):
+    """Yields pages of object names, following the next_start_with cursor."""
+    start = None
+    while True:
+        kwargs = {"limit": LIST_PAGE_SIZE}
+        if start:
+            kwargs["start"] = start
+        response = client.list_objects(namespace, bucket_name, **kwargs)
+        names = [obj.name for obj in response.data.objects]
+        if names:
+            yield names
+        start = response.data.next_start_with
+        if not start:
+            return
+
+
+def _delete_names(client, namespace, bucket_name, name_pages, result, workers):
+    """Deletes every name yielded by `name_pages` on a bounded pool, recording outcomes in `result`."""
+    # Bound queued deletes so a huge listing never piles up in memory
+    slots = threading.BoundedSemaphore(workers * 4)
+
+    def delete(name):
+        try:
+            client.delete_object(namespace, bucket_name, name)
+            with result._lock:
+                result.deleted += 1
+        except oci.exceptions.ServiceError as e:
+            with result._lock:
+                if e.status == 404:
+                    # Already gone (e.g. a concurrent teardown)
+                    result.deleted += 1
+                else:
+                    print(f"Warning: Failed to delete object {name}: {e.message}")
+                    result.failed.append(name)
+        except Exception as e:
+            print(f"Warning: Failed to delete object {name}: {e}")
+            with result._lock:
+                result.failed.append(name)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='teardown') as pool:
+        try:
+            for names in name_pages:
+                for name in names:
+                    slots.acquire()
+                    pool.submit(delete, name)
+        except Exception as e:
+            print(f"Error listing objects in bucket {bucket_name}: {e}")
+            result.listing_error = str(e)
+
+
+def empty_bucket(client, namespace, bucket_name, workers=None):
+    """
+    Deletes every object in a bucket: pages through the listing with proper
+    cursors and deletes each page in parallel with bounded concurrency.
+    Every object is attempted exactly once, so a persistently failing object
+    cannot make this loop forever. Returns a TeardownResult.
+    """
+    result = TeardownResult(bucket_name)
+    started = time.monotonic()
+    _delete_names(client, namespace, bucket_name, _list_pages(client, namespace, bucket_name),
+                  result, workers or TEARDOWN_WORKERS)
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+def delete_objects(client, namespace, bucket_name, names, workers=None):
+    """Deletes a known set of objects in parallel. Returns a TeardownResult."""
+    result = TeardownResult(bucket_name)
+    started = time.monotonic()
+    _delete_names(client, namespace, bucket_name, [list(names)], result, workers or TEARDOWN_WORKERS)
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+def abort_multipart_uploads(client, namespace, bucket_name):
+    """
+    Aborts uncommitted multipart uploads (e.g. from a deploy that crashed
+    mid-file); a bucket that still has any cannot be deleted.
+    Returns the number aborted.
+    """
+    aborted = 0
+    page = None
+    while True:
+        kwargs = {"limit": LIST_PAGE_SIZE}
+        if page:
+            kwargs["page"] = page
+        response = client.list_multipart_uploads(namespace, bucket_name, **kwargs)
+        for upload in response.data:
+            try:
+                client.abort_multipart_upload(namespace, bucket_name, upload.object, upload.upload_id)
+                aborted += 1
+            except oci.exceptions.ServiceError as e:
+                if e.status != 404:
+                    print(f"Warning: Failed to abort multipart upload {upload.upload_id}: {e.message}")
+        page = response.next_page
+        if not page:
+            return aborted
+
+
+def delete_bucket_with_contents(client, namespace, bucket_name, workers=None):
+    """
+    Empties and then deletes a bucket, including uncommitted multipart
+    uploads. The bucket itself is only deleted when every object is gone;
+    the TeardownResult says what happened either way.
+    """
+    result = empty_bucket(client, namespace, bucket_name, workers)
+    try:
+        abort_multipart_uploads(client, namespace, bucket_name)
+    except oci.exceptions.ServiceError as e:
+        print(f"Warning: Could not list multipart uploads in {bucket_name}: {e.message}")
+    if result.ok:
+        client.delete_bucket(namespace, bucket_name)
+    return result
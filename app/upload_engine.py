@@ -0,0 +1,437 @@
+import base64
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import oci
+from app.asset_processing import is_compressible, cache_control_for, gzip_bytes, gzip_stream
+from app.dedup import dedup_index, content_sha256, DEDUP_ENABLED, DEDUP_MIN_SIZE
+
+# --- Configuration ---
+UPLOAD_WORKERS = int(os.getenv('DEPLOY_UPLOAD_WORKERS', '8'))
+MAX_INFLIGHT_BYTES = int(os.getenv('DEPLOY_MAX_INFLIGHT_BYTES', str(32 * 1024 * 1024)))  # 32MB
+# Members up to this size are decompressed ahead; larger ones are streamed in chunks.
+STREAM_THRESHOLD = int(os.getenv('DEPLOY_STREAM_THRESHOLD', str(256 * 1024)))  # 256KB
+# Bodies above this size go through multipart upload, several parts at a time.
+MULTIPART_THRESHOLD = int(os.getenv('DEPLOY_MULTIPART_THRESHOLD', str(20 * 1024 * 1024)))  # 20MB
+MULTIPART_PART_SIZE = int(os.getenv('DEPLOY_MULTIPART_PART_SIZE', str(10 * 1024 * 1024)))  # 10MB (OCI minimum)
+MULTIPART_PART_WORKERS = int(os.getenv('DEPLOY_MULTIPART_PART_WORKERS', '4'))
+# Multipart parts held in memory per deploy. This is a budget of its own: an uploader
+# holding a member reservation must never wait on the member budget for its parts.
+MULTIPART_INFLIGHT_BYTES = int(os.getenv('DEPLOY_MULTIPART_INFLIGHT_BYTES',
+                                         str(MULTIPART_PART_SIZE * MULTIPART_PART_WORKERS)))  # 40MB
+
+
+class UploadAborted(Exception):
+    """Raised inside the engine when a sibling upload already failed."""
+
+
+class ByteBudget:
+    """
+    Caps the number of decompressed bytes held in memory by queued and running uploads.
+    A single member bigger than the whole budget is still admitted, alone.
+    """
+
+    def __init__(self, limit):
+        self.limit = max(limit, 1)
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size, stop_event):
+        size = min(size, self.limit)
+        with self._cond:
+            while self.in_use + size > self.limit:
+                if stop_event.is_set():
+                    raise UploadAborted()
+                self._cond.wait(timeout=0.5)
+            self.in_use += size
+        return size
+
+    def release(self, size):
+        with self._cond:
+            self.in_use -= size
+            self._cond.notify_all()
+
+
+class MemberStream:
+    """
+    Read-only, file-like view of one ZIP member that decompresses as it is read,
+    so put_object streams the body instead of receiving the whole file in memory.
+    Exposes `len` so the HTTP layer sets Content-Length without seeking to the end,
+    and hashes what it streams so the content MD5 is known once the upload ends.
+    """
+
+    def __init__(self, zip_file, zinfo):
+        self.len = zinfo.file_size
+        self._fh = zip_file.open(zinfo)
+        self._md5 = hashlib.md5()
+
+    def read(self, size=-1):
+        chunk = self._fh.read(size)
+        self._md5.update(chunk)
+        return chunk
+
+    def tell(self):
+        return self._fh.tell()
+
+    def seek(self, offset, whence=0):
+        # Used by the SDK to rewind the body before a retry
+        position = self._fh.seek(offset, whence)
+        if position == 0:
+            self._md5 = hashlib.md5()
+        return position
+
+    def md5(self):
+        return _b64(self._md5.digest())
+
+    def close(self):
+        self._fh.close()
+
+
+def _b64(digest):
+    return base64.b64encode(digest).decode('ascii')
+
+
+def content_md5(data):
+    """Base64 MD5 of a member's content, the same format OCI reports for single-part objects."""
+    return _b64(hashlib.md5(data).digest())
+
+
+def hash_members(zip_file, members):
+    """
+    Hashes ZIP members without holding more than one chunk of each in memory.
+    `members` is an iterable of (ZipInfo, content_type); returns {name: md5}.
+    """
+    hashes = {}
+    for zinfo, _ in members:
+        digest = hashlib.md5()
+        with zip_file.open(zinfo) as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+                digest.update(chunk)
+        hashes[zinfo.filename] = _b64(digest.digest())
+    return hashes
+
+
+class UploadReport:
+    """Per-file timings and totals for one deployment's uploads."""
+
+    def __init__(self):
+        self.files = []
+        self.total_bytes = 0
+        self.stored_bytes = 0
+        self.dedup_candidates = 0  # files big enough to be looked up in the dedup index
+        self.dedup_candidate_bytes = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, name, size, read_seconds, upload_seconds, md5=None, stored_size=None, encoding=None,
+               deduplicated=False):
+        stored_size = size if stored_size is None else stored_size
+        with self._lock:
+            self.files.append({
+                "name": name,
+                "size": size,
+                "stored_size": stored_size,
+                "encoding": encoding,
+                "md5": md5,
+                "deduplicated": deduplicated,
+                "read_seconds": round(read_seconds, 4),
+                "upload_seconds": round(upload_seconds, 4),
+            })
+            self.total_bytes += size
+            self.stored_bytes += stored_size
+
+    def dedup_candidate(self, size):
+        with self._lock:
+            self.dedup_candidates += 1
+            self.dedup_candidate_bytes += size
+
+    @property
+    def deduplicated_files(self):
+        return [f for f in self.files if f["deduplicated"]]
+
+    def hashes(self):
+        """{name: content md5} for every uploaded file (of the original, uncompressed content)."""
+        return {f["name"]: f["md5"] for f in self.files}
+
+    def slowest(self, count=5):
+        return sorted(self.files, key=lambda f: f["upload_seconds"], reverse=True)[:count]
+
+    def to_dict(self):
+        return {
+            "files": len(self.files),
+            "bytes": self.total_bytes,
+            "stored_bytes": self.stored_bytes,
+            "compressed_files": sum(1 for f in self.files if f["encoding"]),
+            "deduplicated_files": len(self.deduplicated_files),
+            "deduplicated_bytes": sum(f["size"] for f in self.deduplicated_files),
+            "elapsed_seconds": round(self.elapsed, 3),
+            "slowest": self.slowest(),
+        }
+
+
+def _prepare_body(zip_file, zinfo, content, content_type):
+    """
+    Asset-processing stage, run on the uploader thread: gzips compressible
+    files when that saves space. Returns (body, length, content_encoding, md5),
+    where md5 is None if it is only known once a streamed body has been read.
+    """
+    size = zinfo.file_size
+    if content is not None:
+        md5 = content_md5(content)
+        if is_compressible(content_type, size):
+            compressed = gzip_bytes(content)
+            if compressed is not None:
+                return compressed, len(compressed), 'gzip', md5
+        return content, size, None, md5
+
+    if is_compressible(content_type, size):
+        source = MemberStream(zip_file, zinfo)
+        try:
+            compressed = gzip_stream(source, size)
+            md5 = source.md5()
+        finally:
+            source.close()
+        if compressed is not None:
+            spool, length = compressed
+            return spool, length, 'gzip', md5
+        # Not worth it: stream the original again (its hash is already known)
+        return MemberStream(zip_file, zinfo), size, None, md5
+
+    return MemberStream(zip_file, zinfo), size, None, None
+
+
+def _read_exactly(body, size):
+    """Reads up to `size` bytes, looping over short reads from decompressing streams."""
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = body.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def multipart_upload(client, namespace, bucket_name, object_name, body, length, budget, stop_event,
+                     content_type=None, content_encoding=None, cache_control=None):
+    """
+    Uploads a file-like body through OCI multipart upload. Parts are read from
+    `body` one at a time (so a ZIP member is never materialized) and uploaded
+    by a small pool; each part holds a reservation in `budget`, the deploy's
+    part budget (never the member budget the calling uploader already holds a
+    reservation in), and is retried on its own by the client's retry layer. On any failure the upload is aborted so no
+    uncommitted parts are left behind. Returns the committed object's ETag.
+    """
+    details = oci.object_storage.models.CreateMultipartUploadDetails(
+        object=object_name,
+        content_type=content_type,
+        content_encoding=content_encoding,
+        cache_control=cache_control
+    )
+    upload_id = client.create_multipart_upload(namespace, bucket_name, details).data.upload_id
+    part_count = -(-length // MULTIPART_PART_SIZE)
+    etags = {}
+
+    def upload_part(part_num, data, reserved):
+        try:
+            if stop_event.is_set():
+                raise UploadAborted()
+            # Each part is its own call, so the client's retry layer retries parts individually
+            response = client.upload_part(
+                namespace, bucket_name, object_name, upload_id, part_num, data,
+                content_length=len(data), content_md5=content_md5(data)
+            )
+            etags[part_num] = response.headers['etag']
+        except Exception:
+            stop_event.set()
+            raise
+        finally:
+            budget.release(reserved)
+
+    try:
+        futures = []
+        with ThreadPoolExecutor(max_workers=MULTIPART_PART_WORKERS, thread_name_prefix='zip-part') as pool:
+            try:
+                for part_num in range(1, part_count + 1):
+                    reserved = budget.acquire(MULTIPART_PART_SIZE, stop_event)
+                    try:
+                        if stop_event.is_set():
+                            raise UploadAborted()
+                        data = _read_exactly(body, MULTIPART_PART_SIZE)
+                    except Exception:
+                        budget.release(reserved)
+                        raise
+                    futures.append(pool.submit(upload_part, part_num, data, reserved))
+            except UploadAborted:
+                pass
+
+        # Surface the part failure itself rather than the aborts it caused
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        for error in errors:
+            if not isinstance(error, UploadAborted):
+                raise error
+        if errors or stop_event.is_set():
+            raise UploadAborted()
+
+        parts = [oci.object_storage.models.CommitMultipartUploadPartDetails(part_num=n, etag=etags[n])
+                 for n in sorted(etags)]
+        response = client.commit_multipart_upload(
+            namespace, bucket_name, object_name, upload_id,
+            oci.object_storage.models.CommitMultipartUploadDetails(parts_to_commit=parts)
+        )
+        return response.headers.get('etag')
+    except Exception:
+        try:
+            client.abort_multipart_upload(namespace, bucket_name, object_name, upload_id)
+        except Exception as e:
+            print(f"Warning: could not abort multipart upload of {object_name}: {e}")
+        raise
+
+
+def upload_zip_members(client, namespace, bucket_name, zip_file, members,
+                       workers=None, max_inflight_bytes=None, on_progress=None):
+    """
+    Uploads ZIP members to a bucket using a bounded worker pool.
+
+    `members` is an iterable of (ZipInfo, content_type). Small members are
+    decompressed by the calling thread ahead of the uploaders; members above
+    STREAM_THRESHOLD are streamed from the archive in chunks by the uploader
+    itself, and those above MULTIPART_THRESHOLD go up as concurrent multipart
+    parts. Memory held by queued and running uploads never exceeds
+    `max_inflight_bytes`, plus MULTIPART_INFLIGHT_BYTES for multipart parts. Each uploader also runs the asset-processing stage
+    (gzip for compressible types, Cache-Control policy) so that CPU work stays
+    off the request thread. The first failure stops all remaining work and is
+    re-raised so the caller can roll the bucket back. `on_progress(name, size)`
+    is called from the uploader threads after each file lands.
+
+    With DEPLOY_DEDUP on, members of at least DEPLOY_DEDUP_MIN_SIZE are
+    looked up by SHA-256 in the platform-wide dedup index first and
+    server-side copied from wherever that content is already stored;
+    anything that cannot be copied is uploaded as usual and indexed.
+    """
+    workers = workers or UPLOAD_WORKERS
+    budget = ByteBudget(max_inflight_bytes or MAX_INFLIGHT_BYTES)
+    part_budget = ByteBudget(MULTIPART_INFLIGHT_BYTES)
+    stop_event = threading.Event()
+    report = UploadReport()
+    started = time.monotonic()
+
+    def upload(zinfo, content, content_type, read_seconds, reserved):
+        body = None
+        try:
+            if stop_event.is_set():
+                raise UploadAborted()
+            upload_start = time.monotonic()
+            cache_control = cache_control_for(zinfo.filename, content_type)
+
+            dedup = None
+            if DEDUP_ENABLED and zinfo.file_size >= DEDUP_MIN_SIZE:
+                report.dedup_candidate(zinfo.file_size)
+                sha256 = content_sha256(zip_file, zinfo, content)
+                entry, index_etag = dedup_index.lookup(sha256)
+                if entry is None:
+                    dedup = (sha256, None)
+                elif entry.get("content_type") == content_type and entry.get("cache_control") == cache_control:
+                    if dedup_index.copy(client, namespace, entry, bucket_name, zinfo.filename):
+                        report.record(zinfo.filename, zinfo.file_size, read_seconds,
+                                      time.monotonic() - upload_start, entry["md5"],
+                                      entry["stored_size"], entry["encoding"], deduplicated=True)
+                        if on_progress:
+                            on_progress(zinfo.filename, zinfo.file_size)
+                        return
+                    # The indexed copy is gone or changed: this upload becomes the new source
+                    dedup = (sha256, index_etag)
+
+            body, length, encoding, md5 = _prepare_body(zip_file, zinfo, content, content_type)
+            if length > MULTIPART_THRESHOLD and content is None:
+                etag = multipart_upload(client, namespace, bucket_name, zinfo.filename, body, length,
+                                        part_budget, stop_event, content_type, encoding, cache_control)
+            else:
+                etag = client.put_object(
+                    namespace,
+                    bucket_name,
+                    zinfo.filename,
+                    body,
+                    content_length=length,
+                    content_type=content_type,
+                    content_encoding=encoding,
+                    cache_control=cache_control
+                ).headers.get('etag')
+            if md5 is None:
+                md5 = body.md5()
+            if dedup and etag:
+                sha256, replace_etag = dedup
+                dedup_index.register(sha256, {
+                    "bucket": bucket_name, "object": zinfo.filename, "etag": etag, "md5": md5,
+                    "size": zinfo.file_size, "stored_size": length, "encoding": encoding,
+                    "content_type": content_type, "cache_control": cache_control,
+                }, replace_etag)
+            report.record(zinfo.filename, zinfo.file_size, read_seconds, time.monotonic() - upload_start,
+                          md5, length, encoding)
+            if on_progress:
+                on_progress(zinfo.filename, zinfo.file_size)
+        except Exception:
+            stop_event.set()
+            raise
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            budget.release(reserved)
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zip-upload') as pool:
+        try:
+            for zinfo, content_type in members:
+                streamed = zinfo.file_size > STREAM_THRESHOLD
+                # Streamed members only ever hold about one threshold's worth of buffers;
+                # in-memory members that get gzipped briefly hold a compressed copy too
+                if streamed:
+                    reservation = STREAM_THRESHOLD
+                elif is_compressible(content_type, zinfo.file_size):
+                    reservation = zinfo.file_size * 2
+                else:
+                    reservation = zinfo.file_size
+                reserved = budget.acquire(reservation, stop_event)
+                content, read_seconds = None, 0.0
+                if not streamed:
+                    try:
+                        read_start = time.monotonic()
+                        content = zip_file.read(zinfo)
+                        read_seconds = time.monotonic() - read_start
+                    except Exception:
+                        budget.release(reserved)
+                        raise
+                futures.append(pool.submit(upload, zinfo, content, content_type, read_seconds, reserved))
+                if stop_event.is_set():
+                    break
+        except UploadAborted:
+            pass
+        except Exception:
+            stop_event.set()
+            raise
+        finally:
+            if stop_event.is_set():
+                for future in futures:
+                    future.cancel()
+
+    report.elapsed = time.monotonic() - started
+
+    # Surface the first real failure (not the aborts it caused in siblings)
+    for future in futures:
+        if future.cancelled() or not future.done():
+            continue
+        error = future.exception()
+        if error is not None and not isinstance(error, UploadAborted):
+            raise error
+    if stop_event.is_set():
+        # Never report success for a partial upload, even without a concrete error
+        raise UploadAborted("Upload stopped before every file was stored")
+
+    if report.dedup_candidates:
+        deduplicated = report.deduplicated_files
+        dedup_index.record_deploy(report.dedup_candidates, len(deduplicated), report.dedup_candidate_bytes,
+                                  sum(f["size"] for f in deduplicated))
+    return report
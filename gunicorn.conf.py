@@ -0,0 +1,80 @@
+"""
+Production server settings. Start with:
+
+    gunicorn -c gunicorn.conf.py run:app
+
+Every setting can be overridden through the environment (see below).
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Listening ---
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:443')
+# TLS with a real certificate; leave both unset when a proxy/load balancer terminates TLS
+certfile = os.getenv('TLS_CERT_FILE') or None
+keyfile = os.getenv('TLS_KEY_FILE') or None
+
+# --- Workers ---
+# Requests mostly wait on OCI, so each process runs a pool of threads;
+# processes spread ZIP parsing, gzip and hashing across the VM's cores.
+workers = int(os.getenv('WEB_WORKERS', str(multiprocessing.cpu_count())))
+# The app splits its server-wide deploy limits (app/admission.py) between the workers
+os.environ['WEB_WORKERS'] = str(workers)
+# Each worker keeps its own metrics and shares them through this directory, so
+# a scrape of any worker returns every worker's series (app/metrics.py). Unless
+# the operator names one, a private directory is made for this server run.
+_owns_metrics_dir = 'METRICS_DIR' not in os.environ
+if _owns_metrics_dir:
+    os.environ['METRICS_DIR'] = os.path.join(tempfile.gettempdir(), f"host-service-metrics-{os.getpid()}")
+threads = int(os.getenv('WEB_THREADS', '8'))
+worker_class = 'gthread'
+# Worker heartbeat, not a request limit: a gthread worker's main loop checks in
+# every second whatever its request threads are doing, and the master restarts
+# a worker that stays silent this long (a hung process). It does not bound how
+# long a request such as a synchronous deploy may run.
+timeout = int(os.getenv('WEB_TIMEOUT', '30'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+# On restart (SIGHUP) or stop (SIGTERM), workers stop accepting connections and
+# get this long to finish in-flight requests and background deploy jobs
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '600'))
+# Recycle workers now and then to bound memory growth; jitter avoids simultaneous restarts
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', '50'))
+
+# Import the app once in the master so workers fork with the code already loaded.
+# The OCI SDK import is deferred (app.startup) and OCI clients are not built
+# here: connection pools and threads don't survive fork, so each worker
+# warms its own in post_fork.
+preload_app = os.getenv('WEB_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-') or None  # empty disables it
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # In the background: the worker starts accepting requests immediately
+    from app.lifecycle import start_warm_up
+    start_warm_up()
+
+
+def worker_exit(server, worker):
+    from app.lifecycle import drain
+    drain()
+
+
+def child_exit(server, worker):
+    from app.metrics import REGISTRY
+    REGISTRY.forget_worker(worker.pid)
+
+
+def on_exit(server):
+    # Only a directory made above is removed; in one the operator supplied,
+    # child_exit has already removed each worker's own files
+    if _owns_metrics_dir:
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
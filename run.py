@@ -1,7 +1,13 @@
+import os
 from app import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
+    # Development server only; production runs `gunicorn -c gunicorn.conf.py run:app`
+    cert, key = os.getenv('TLS_CERT_FILE'), os.getenv('TLS_KEY_FILE')
+    ssl_context = (cert, key) if cert and key else 'adhoc'
+    from app.lifecycle import start_warm_up
+    start_warm_up()
     # [cite_start]Running on port 80 as defined in architecture [cite: 77]
-    app.run(host='0.0.0.0', port=443, ssl_context='adhoc')
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', '443')), ssl_context=ssl_context)
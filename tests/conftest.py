@@ -0,0 +1,74 @@
+"""
+Tests run against the in-process OCI fake (app/fake_oci.py); nothing here
+needs OCI credentials or network access.
+"""
+import datetime
+import io
+import os
+import uuid
+import zipfile
+
+# Settings are read at import, so they must be in place before `app` is imported
+os.environ['OCI_AUTH_METHOD'] = 'fake'
+os.environ.setdefault('OCI_COMPARTMENT_ID', 'ocid1.compartment.oc1..tests')
+os.environ.setdefault('SECRET_KEY', 'tests')
+os.environ.setdefault('RECONCILE_INTERVAL', '0')
+
+import pytest
+
+from app.fake_oci import get_fake_client, METADATA_BUCKET
+from app.metadata_cache import metadata_cache
+
+COMPARTMENT_ID = os.environ['OCI_COMPARTMENT_ID']
+
+
+@pytest.fixture
+def fake():
+    """The process-wide fake, emptied down to the metadata bucket for each test."""
+    client = get_fake_client()
+    with client._lock:
+        client._buckets = {METADATA_BUCKET: {"compartment_id": None, "time_created": datetime.datetime.now(
+            datetime.timezone.utc), "etag": uuid.uuid4().hex, "objects": {}}}
+        client._uploads = {}
+        client.latency = 0
+        client.throttle_rate = 0
+        client.failure_rate = 0
+        client.fail_ops = set()
+    client.reset_call_counts()
+    metadata_cache.invalidate()
+    yield client
+    metadata_cache.invalidate()
+
+
+def make_bucket(fake, name, age_seconds=0, objects=None):
+    """Creates a site bucket in the fake compartment, `age_seconds` old."""
+    created = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=age_seconds)
+    with fake._lock:
+        fake._buckets[name] = {"compartment_id": COMPARTMENT_ID, "time_created": created,
+                               "etag": uuid.uuid4().hex, "objects": {}}
+    for object_name, content in (objects or {}).items():
+        fake._store(name, object_name, content)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def client(app, fake):
+    """A test client logged in as 'alice'."""
+    test_client = app.test_client()
+    with test_client.session_transaction() as session:
+        session['user_id'] = 'alice'
+    return test_client
+
+
+def build_zip(files):
+    """A ZIP archive (bytes) of {name: content}."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+    return buffer.getvalue()
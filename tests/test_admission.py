@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from app import admission
+from app.admission import AdmissionController, AdmissionRejected, UserDeployLeases
+
+
+def local(**kwargs):
+    kwargs.setdefault('shared_user_leases', False)
+    return AdmissionController(**kwargs)
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    controller = local(max_concurrent=1, max_bytes=100, max_per_user=1, timeout=5, max_queue=10)
+    first = controller.acquire('u0', 10)
+    order = []
+
+    def wait_for_turn(owner_id):
+        ticket = controller.acquire(owner_id, 10)
+        order.append(owner_id)
+        ticket.release()
+
+    threads = []
+    for i in range(1, 5):
+        thread = threading.Thread(target=wait_for_turn, args=(f'u{i}',))
+        thread.start()
+        threads.append(thread)
+        # Queue them one after the other
+        while controller.to_dict()["queued"] < i:
+            time.sleep(0.01)
+    first.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ['u1', 'u2', 'u3', 'u4']
+
+
+def test_user_over_their_cap_is_rejected_at_once():
+    controller = local(max_concurrent=4, max_per_user=1, timeout=5)
+    ticket = controller.acquire('alice', 10)
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected):
+        controller.acquire('alice', 10)
+    assert time.monotonic() - started < 1
+    ticket.release()
+    controller.acquire('alice', 10).release()
+
+
+def test_full_queue_and_timeout_reject_with_retry_after():
+    controller = local(max_concurrent=1, timeout=0.2, max_queue=1)
+    ticket = controller.acquire('a', 10)
+    waiter = threading.Thread(target=lambda: pytest.raises(AdmissionRejected, controller.acquire, 'b', 10))
+    waiter.start()
+    while controller.to_dict()["queued"] < 1:
+        time.sleep(0.01)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('c', 10)
+    assert rejected.value.retry_after >= 1
+    waiter.join(2)
+    stats = controller.to_dict()
+    assert stats["rejected_queue_full"] == 1 and stats["rejected_timeout"] == 1
+    ticket.release()
+
+
+def test_byte_cap_admits_one_oversized_deploy_alone():
+    controller = local(max_concurrent=4, max_bytes=100, timeout=0.2)
+    big = controller.acquire('a', 500)
+    with pytest.raises(AdmissionRejected):
+        controller.acquire('b', 10)
+    big.release()
+    controller.acquire('b', 10).release()
+
+
+def test_per_user_cap_holds_across_processes(fake):
+    # Two controllers stand in for two gunicorn workers sharing the metadata bucket
+    worker_a = AdmissionController(max_per_user=1, timeout=1, shared_user_leases=True)
+    worker_b = AdmissionController(max_per_user=1, timeout=1, shared_user_leases=True)
+
+    ticket = worker_a.acquire('alice', 10)
+    with pytest.raises(AdmissionRejected):
+        worker_b.acquire('alice', 10)
+    worker_b.acquire('bob', 10).release()
+
+    ticket.release()
+    worker_b.acquire('alice', 10).release()
+
+
+def test_expired_lease_of_a_dead_process_is_taken_over(fake):
+    # Taken by a process that died: never renewed, never dropped
+    UserDeployLeases(1, ttl=-1).take('alice')
+
+    AdmissionController(max_per_user=1, shared_user_leases=True).acquire('alice', 10).release()
+
+
+def test_running_deploy_keeps_its_lease_past_the_ttl(fake, monkeypatch):
+    monkeypatch.setattr(admission, 'USER_LEASE_TTL', 0.3)
+    worker_a = AdmissionController(max_per_user=1, shared_user_leases=True)
+    worker_b = AdmissionController(max_per_user=1, shared_user_leases=True)
+
+    ticket = worker_a.acquire('alice', 10)
+    time.sleep(1)  # over three TTLs; the renewer keeps it alive
+    with pytest.raises(AdmissionRejected):
+        worker_b.acquire('alice', 10)
+    assert worker_a.stats["leases_lost"] == 0
+
+    ticket.release()
+    worker_b.acquire('alice', 10).release()
+    time.sleep(0.3)
+    assert worker_a._renewer is None  # nothing left to renew
+
+
+def test_lease_is_returned_when_the_local_queue_rejects(fake):
+    controller = AdmissionController(max_concurrent=1, max_per_user=1, timeout=0.1, max_queue=0,
+                                     shared_user_leases=True)
+    held = controller.acquire('alice', 10)
+    with pytest.raises(AdmissionRejected):
+        controller.acquire('bob', 10)  # queue full
+    held.release()
+    controller.acquire('bob', 10).release()
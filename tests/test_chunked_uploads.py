@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+from app import chunked_uploads
+from app.admission import AdmissionRejected
+from app.routes import deploy_route
+from tests.conftest import build_zip
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunked_uploads, 'CHUNKED_UPLOAD_DIR', str(tmp_path))
+    return tmp_path
+
+
+def upload(client, archive):
+    r = client.post('/api/uploads', json={"filename": "site.zip", "size": len(archive)})
+    assert r.status_code == 201
+    info = r.get_json()
+    size = info["chunk_size"]
+    for index in range(info["total_chunks"]):
+        r = client.put(f'/api/uploads/{info["upload_id"]}/chunks/{index}',
+                       data=archive[index * size:(index + 1) * size])
+        assert r.status_code == 200
+    return info["upload_id"]
+
+
+def test_complete_after_429_keeps_the_upload_for_a_retry(client, upload_dir, monkeypatch):
+    upload_id = upload(client, build_zip({"index.html": "<h1>hi</h1>"}))
+
+    real_acquire = deploy_route.deploy_admission.acquire
+    calls = []
+
+    def busy_once(owner_id, size):
+        calls.append(owner_id)
+        if len(calls) == 1:
+            raise AdmissionRejected("Server is busy, please retry shortly", 3)
+        return real_acquire(owner_id, size)
+    monkeypatch.setattr(deploy_route.deploy_admission, 'acquire', busy_once)
+
+    r = client.post(f'/api/uploads/{upload_id}/complete', json={})
+    assert r.status_code == 429
+    assert r.headers['Retry-After'] == '3'
+    # The session and its archive are still there, with every chunk received
+    status = client.get(f'/api/uploads/{upload_id}').get_json()
+    assert status["received_chunks"] == list(range(status["total_chunks"]))
+
+    r = client.post(f'/api/uploads/{upload_id}/complete', json={})
+    assert r.status_code == 201, r.get_json()
+    assert client.get(f'/api/uploads/{upload_id}').status_code == 404
+    assert not list(upload_dir.iterdir())
+
+
+def test_open_uploads_are_capped_per_user(client, monkeypatch):
+    monkeypatch.setattr(chunked_uploads, 'MAX_OPEN_UPLOADS_PER_USER', 2)
+    monkeypatch.setattr(chunked_uploads, 'MAX_OPEN_UPLOAD_BYTES_PER_USER', 1000)
+
+    first = client.post('/api/uploads', json={"filename": "a.zip", "size": 600})
+    assert first.status_code == 201
+    # Declared bytes: 600 + 500 is over the 1000 allowed
+    assert client.post('/api/uploads', json={"filename": "b.zip", "size": 500}).status_code == 413
+    assert client.post('/api/uploads', json={"filename": "b.zip", "size": 400}).status_code == 201
+    assert client.post('/api/uploads', json={"filename": "c.zip", "size": 1}).status_code == 429
+
+    # Aborting one frees its place
+    client.delete(f'/api/uploads/{first.get_json()["upload_id"]}')
+    assert client.post('/api/uploads', json={"filename": "c.zip", "size": 1}).status_code == 201
+
+
+def test_sessions_without_chunks_expire_early(upload_dir, monkeypatch):
+    idle = chunked_uploads.UploadSession.create('alice', 'idle.zip', 10)
+    busy = chunked_uploads.UploadSession.create('alice', 'busy.zip', 10)
+    busy.write_chunk(0, io.BytesIO(b'x' * 10))
+
+    monkeypatch.setattr(chunked_uploads, 'IDLE_UPLOAD_SESSION_TTL', -1)
+    chunked_uploads.prune_expired_sessions()
+
+    assert chunked_uploads.UploadSession.load(idle.upload_id) is None
+    assert chunked_uploads.UploadSession.load(busy.upload_id) is not None
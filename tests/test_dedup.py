@@ -0,0 +1,96 @@
+import datetime
+
+import pytest
+
+from app import dedup
+from app.dedup import DedupIndex, CopyUnresolved, dedup_index
+from app.fake_oci import METADATA_BUCKET
+from app.metadata_store import metadata_store
+from oci.object_storage import models
+from tests.conftest import make_bucket
+
+
+def _entry(bucket, object_name='big.bin', etag='etag'):
+    return {"bucket": bucket, "object": object_name, "etag": etag, "md5": "md5", "size": 1,
+            "stored_size": 1, "encoding": None, "content_type": "application/octet-stream",
+            "cache_control": None}
+
+
+def _index_names(fake):
+    return sorted(n for n in fake._buckets[METADATA_BUCKET]["objects"] if n.startswith(dedup.INDEX_PREFIX))
+
+
+def test_forget_bucket_drops_only_entries_still_pointing_there(fake):
+    index = DedupIndex()
+    index.register('a' * 64, _entry('site-alice-0000aaaa'))
+    index.register('b' * 64, _entry('site-alice-0000aaaa'))
+    index.register('c' * 64, _entry('site-bob-0000bbbb'))
+    # Re-pointed to another bucket after its source went stale
+    _, etag = index.lookup('b' * 64)
+    index.register('b' * 64, _entry('site-bob-0000bbbb'), replace_etag=etag)
+
+    assert index.forget_bucket('site-alice-0000aaaa') == 1
+
+    assert _index_names(fake) == [f"dedup/objects/{'b' * 64}.json", f"dedup/objects/{'c' * 64}.json"]
+    assert index.lookup('a' * 64) == (None, None)
+    assert index.forget_bucket('site-alice-0000aaaa') == 0
+
+
+def test_delete_site_forgets_its_dedup_entries(client, fake):
+    make_bucket(fake, 'site-alice-0000aaaa', objects={"big.bin": b"x"})
+    metadata_store.add_site({"bucket_key": 'site-alice-0000aaaa', "owner_id": 'alice',
+                             "launch_time": datetime.datetime.utcnow().isoformat()})
+    dedup_index.register('a' * 64, _entry('site-alice-0000aaaa'))
+
+    response = client.delete('/api/deploy/site-alice-0000aaaa')
+
+    assert response.status_code == 200
+    assert _index_names(fake) == []
+
+
+class _StuckCopies:
+    """Work requests that stay IN_PROGRESS until canceled (or forever, with cancelable=False)."""
+
+    def __init__(self, fake, monkeypatch, cancelable=True, completes_on_cancel=False):
+        self.canceled = []
+        self.cancelable = cancelable
+        self.completes_on_cancel = completes_on_cancel
+        monkeypatch.setattr(fake, 'get_work_request', self.get_work_request)
+        monkeypatch.setattr(fake, 'cancel_work_request', self.cancel_work_request)
+
+    def get_work_request(self, work_request_id, **kwargs):
+        status = 'IN_PROGRESS'
+        if work_request_id in self.canceled and self.cancelable:
+            status = 'COMPLETED' if self.completes_on_cancel else 'CANCELED'
+        return type('R', (), {"data": models.WorkRequest(id=work_request_id, status=status)})()
+
+    def cancel_work_request(self, work_request_id, **kwargs):
+        self.canceled.append(work_request_id)
+
+
+@pytest.fixture
+def copy_source(fake, monkeypatch):
+    monkeypatch.setattr(dedup, 'DEDUP_COPY_TIMEOUT', 0.05)
+    monkeypatch.setattr(dedup, 'DEDUP_CANCEL_TIMEOUT', 0.05)
+    monkeypatch.setattr(dedup, 'COPY_POLL_INTERVAL', 0.01)
+    make_bucket(fake, 'site-alice-0000aaaa')
+    make_bucket(fake, 'site-bob-0000bbbb')
+    etag = fake.put_object('ns', 'site-alice-0000aaaa', 'big.bin', b"x").headers['etag']
+    return _entry('site-alice-0000aaaa', etag=etag)
+
+
+def test_timed_out_copy_is_canceled_before_falling_back(fake, monkeypatch, copy_source):
+    stuck = _StuckCopies(fake, monkeypatch)
+    assert DedupIndex().copy(fake, 'ns', copy_source, 'site-bob-0000bbbb', 'big.bin') is False
+    assert len(stuck.canceled) == 1
+
+
+def test_copy_that_completes_while_canceling_counts(fake, monkeypatch, copy_source):
+    _StuckCopies(fake, monkeypatch, completes_on_cancel=True)
+    assert DedupIndex().copy(fake, 'ns', copy_source, 'site-bob-0000bbbb', 'big.bin') is True
+
+
+def test_copy_that_cannot_be_stopped_fails_the_deploy(fake, monkeypatch, copy_source):
+    _StuckCopies(fake, monkeypatch, cancelable=False)
+    with pytest.raises(CopyUnresolved):
+        DedupIndex().copy(fake, 'ns', copy_source, 'site-bob-0000bbbb', 'big.bin')
@@ -0,0 +1,94 @@
+import datetime
+import io
+import threading
+import time
+
+from app import deploy_jobs
+from app.admission import deploy_admission
+from app.deploy_jobs import DeployJob
+from app.fake_oci import METADATA_BUCKET
+from app.routes import deploy_route
+from tests.conftest import build_zip
+
+
+def _snapshot_names(fake):
+    return sorted(n for n in fake._buckets[METADATA_BUCKET]["objects"] if n.startswith(deploy_jobs.JOB_PREFIX))
+
+
+def test_progress_callbacks_do_not_write(fake):
+    job = DeployJob('alice', files_total=40)
+    fake.reset_call_counts()
+
+    threads = [threading.Thread(target=lambda: [job.file_uploaded(f"f{i}", 10) for i in range(10)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake.calls["put_object"] == 0
+    assert job.dirty and job.files_uploaded == 40 and job.bytes_uploaded == 400
+
+    job.persist()
+    assert not job.dirty
+    assert fake.calls["put_object"] == 1
+
+
+def test_retention_counts_from_when_the_job_finished(fake):
+    job = DeployJob('alice')  # still running: never pruned, however long it takes
+    with deploy_jobs._jobs_lock:
+        deploy_jobs._jobs[job.job_id] = job
+    deploy_jobs._prune_finished_jobs()
+    assert job.job_id in deploy_jobs._jobs
+
+    # Ran for longer than the retention period, but only just finished
+    job.set_phase('done')
+    deploy_jobs._prune_finished_jobs()
+    assert deploy_jobs.get_job(job.job_id)["phase"] == 'done'
+    with deploy_jobs._jobs_lock:
+        del deploy_jobs._jobs[job.job_id]
+
+
+def test_pruned_jobs_lose_their_snapshots(fake):
+    job = DeployJob('alice')
+    with deploy_jobs._jobs_lock:
+        deploy_jobs._jobs[job.job_id] = job
+    job.set_phase('done')
+    job.finished_time = time.time() - deploy_jobs.JOB_RETENTION_SECONDS - 1
+    assert _snapshot_names(fake) == [f"jobs/{job.job_id}.json"]
+
+    deploy_jobs._prune_finished_jobs()
+
+    assert job.job_id not in deploy_jobs._jobs
+    assert _snapshot_names(fake) == []
+    assert deploy_jobs.get_job(job.job_id) is None
+
+
+def test_expired_snapshots_are_swept(fake, monkeypatch):
+    monkeypatch.setattr(deploy_jobs, 'LIST_PAGE_SIZE', 2)
+    old = [DeployJob('alice') for _ in range(3)]
+    fresh = DeployJob('bob')
+    for job in old + [fresh]:
+        job.persist()
+    stale = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        seconds=deploy_jobs.JOB_RETENTION_SECONDS + 60)
+    for job in old:
+        fake._buckets[METADATA_BUCKET]["objects"][f"jobs/{job.job_id}.json"]["time_created"] = stale
+
+    assert deploy_jobs.expire_job_snapshots() == 3
+    assert _snapshot_names(fake) == [f"jobs/{fresh.job_id}.json"]
+
+
+def test_failed_hand_off_removes_the_spooled_upload(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(deploy_route, 'UPLOAD_TMP_DIR', str(tmp_path))
+
+    def shut_down(job, work):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+    monkeypatch.setattr(deploy_route, 'submit_job', shut_down)
+
+    archive = io.BytesIO(build_zip({"index.html": "<h1>hi</h1>"}))
+    response = client.post('/api/deploy?async=1', data={"file": (archive, 'site.zip')})
+
+    assert response.status_code == 500
+    assert list(tmp_path.iterdir()) == []
+    assert deploy_admission.to_dict()["in_flight"] == 0
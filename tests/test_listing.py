@@ -0,0 +1,46 @@
+import datetime
+
+from app.metadata_store import metadata_store
+
+
+def add_sites(owner_id, count, first=0):
+    start = datetime.datetime(2026, 1, 1)
+    for i in range(first, first + count):
+        metadata_store.add_site({"bucket_key": f"site-{owner_id}-{i:08x}", "owner_id": owner_id,
+                                 "launch_time": (start + datetime.timedelta(minutes=i)).isoformat()})
+
+
+def test_pages_cover_every_site_once_despite_deletes(client):
+    add_sites('alice', 5)
+    add_sites('bob', 2)
+
+    first = client.get('/api/deploy?limit=2').get_json()
+    assert [s["bucket_key"] for s in first["sites"]] == ['site-alice-00000000', 'site-alice-00000001']
+    # Deleting an already listed site must not shift the next page
+    metadata_store.remove_site('site-alice-00000000')
+    seen = [s["bucket_key"] for s in first["sites"]]
+    cursor = first["next_cursor"]
+    while cursor:
+        page = client.get(f'/api/deploy?limit=2&cursor={cursor}').get_json()
+        seen += [s["bucket_key"] for s in page["sites"]]
+        cursor = page["next_cursor"]
+
+    assert seen == [f'site-alice-{i:08x}' for i in range(5)]
+
+
+def test_unchanged_listing_gets_304(client):
+    add_sites('alice', 2)
+    first = client.get('/api/deploy?fields=launch_time')
+    etag = first.headers['ETag']
+
+    again = client.get('/api/deploy?fields=launch_time', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.data == b''
+
+    add_sites('alice', 1, first=2)
+    changed = client.get('/api/deploy?fields=launch_time', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and len(changed.get_json()["sites"]) == 3
+
+
+def test_bad_cursor_and_limit_are_rejected(client):
+    assert client.get('/api/deploy?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/deploy?limit=0').status_code == 400
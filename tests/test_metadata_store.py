@@ -0,0 +1,52 @@
+import io
+import json
+
+from app import metadata_store
+from app.fake_oci import METADATA_BUCKET
+from app.metadata_store import ShardedStore, QuotaExceeded
+from app.migrate_metadata import migrate
+from tests.conftest import build_zip
+
+
+def _seed_monolithic(fake):
+    fake.put_object('ns', METADATA_BUCKET, 'users.json', json.dumps({"alice": {"password": "x"}}).encode())
+    fake.put_object('ns', METADATA_BUCKET, 'buckets.json', json.dumps(
+        [{"bucket_key": "site-alice-0000aaaa", "owner_id": "alice"}]).encode())
+
+
+def test_migration_rerun_keeps_newer_records(fake):
+    _seed_monolithic(fake)
+    assert migrate() == (3, 0)
+
+    store = ShardedStore()
+    store.update_user('alice', {"password": "changed"})
+
+    assert migrate() == (0, 3)
+    assert store.get_user('alice')["password"] == "changed"
+
+
+def test_owner_writers_are_bounded(fake, monkeypatch):
+    monkeypatch.setattr(metadata_store, 'MAX_OWNER_WRITERS', 3)
+    store = ShardedStore()
+    first = store._owner_writer('u0')
+    for i in range(1, 3):
+        store._owner_writer(f'u{i}')
+    assert store._owner_writer('u0') is first  # now the most recently used
+
+    store._owner_writer('u3')
+    assert list(store._owner_writers) == ['u2', 'u0', 'u3']
+
+
+def test_deploy_over_quota_leaves_no_manifest_behind(client, fake, monkeypatch):
+    # Another deploy took the last site slot after the route's early check
+    def full(record, max_sites=None):
+        raise QuotaExceeded("Site limit reached")
+    monkeypatch.setattr(metadata_store.metadata_store, 'add_site', full)
+
+    archive = io.BytesIO(build_zip({"index.html": "<h1>hi</h1>"}))
+    response = client.post('/api/deploy', data={"file": (archive, 'site.zip')})
+
+    assert response.status_code == 403
+    assert [name for name in fake._buckets if name.startswith('site-')] == []
+    assert not [name for name in fake._buckets[METADATA_BUCKET]["objects"]
+                if name.startswith(metadata_store.MANIFEST_PREFIX)]
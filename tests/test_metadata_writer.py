@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from app import metadata_writer
+from app.fake_oci import METADATA_BUCKET
+from app.metadata_writer import MetadataWriter, MutationRejected, MetadataConflictError
+
+
+def _append(value):
+    def mutation(document):
+        document["items"].append(value)
+        return len(document["items"])
+    return mutation
+
+
+def test_concurrent_mutations_share_one_put(fake):
+    writer = MetadataWriter(METADATA_BUCKET, 'doc.json', lambda: {"items": []}, window=0.1)
+    results = []
+    threads = [threading.Thread(target=lambda v=v: results.append(writer.submit(_append(v)))) for v in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake.calls["put_object"] == 1
+    assert writer.stats["commits"] == 1 and writer.stats["mutations"] == 8
+    assert sorted(results) == list(range(1, 9))
+
+
+def test_rejected_mutation_does_not_block_the_rest(fake):
+    writer = MetadataWriter(METADATA_BUCKET, 'doc.json', lambda: {"items": []}, window=0)
+    writer.submit(_append('a'))
+
+    def refuse(document):
+        raise MutationRejected("no")
+
+    with pytest.raises(MutationRejected):
+        writer.submit(refuse)
+    assert writer.submit(_append('b')) == 2
+
+
+def test_lost_etag_race_is_retried_on_fresh_data(fake):
+    writer = MetadataWriter(METADATA_BUCKET, 'doc.json', lambda: {"items": []}, window=0)
+    other = MetadataWriter(METADATA_BUCKET, 'doc.json', lambda: {"items": []}, window=0)
+    writer.submit(_append('a'))
+    raced = []
+
+    def racing(document):
+        if not raced:
+            # Another process commits between this commit's read and write
+            raced.append(True)
+            other.submit(_append('other'))
+        document["items"].append('b')
+
+    writer.submit(racing)
+
+    assert writer.stats["conflicts"] == 1
+    assert MetadataWriter(METADATA_BUCKET, 'doc.json', dict, window=0).submit(lambda d: d["items"]) == \
+        ['a', 'other', 'b']
+
+
+def test_gives_up_after_repeated_conflicts(fake, monkeypatch):
+    monkeypatch.setattr(metadata_writer, 'MAX_COMMIT_ATTEMPTS', 2)
+    writer = MetadataWriter(METADATA_BUCKET, 'doc.json', lambda: {"items": []}, window=0)
+    other = MetadataWriter(METADATA_BUCKET, 'doc.json', lambda: {"items": []}, window=0)
+
+    def always_raced(document):
+        other.submit(_append('other'))
+        document["items"].append('mine')
+
+    with pytest.raises(MetadataConflictError):
+        writer.submit(always_raced)
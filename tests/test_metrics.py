@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+from app.metrics import Counter, Registry
+
+
+def test_running_totals_are_counters(client):
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert '# TYPE reconciler_runs_total counter' in body
+    assert '# TYPE dedup_lookups_total counter' in body
+    assert '# TYPE deploy_admission_admitted_total counter' in body
+    assert '# TYPE deploy_admission_in_flight gauge' in body
+    assert 'deploy_admission_in_flight_total' not in body
+
+
+def test_scrape_renders_every_live_worker(tmp_path):
+    registry = Registry(metrics_dir=str(tmp_path))
+    deploys = registry.register(Counter('deploys_total', "Deploys", ('result',)))
+    registry.add_collector(lambda: {"queue_depth": 2})
+    deploys.inc(result='ok')
+
+    # Another live worker (this test's parent process stands in for it)...
+    other = Registry(metrics_dir=str(tmp_path))
+    other.register(Counter('deploys_total', "Deploys", ('result',))).inc(3, result='ok')
+    (tmp_path / f"{os.getppid()}.json").write_text(json.dumps(other.collect()))
+    # ...and one that has exited
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    (tmp_path / f"{exited.pid}.json").write_text(json.dumps(other.collect()))
+
+    body = registry.render()
+
+    assert body.count('# TYPE deploys_total counter') == 1
+    assert f'deploys_total{{result="ok",worker="{os.getpid()}"}} 1' in body
+    assert f'deploys_total{{result="ok",worker="{os.getppid()}"}} 3' in body
+    assert f'queue_depth{{worker="{os.getpid()}"}} 2' in body
+    assert str(exited.pid) not in body
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([f"{os.getpid()}.json", f"{os.getppid()}.json"])
+
+
+def test_single_process_has_no_worker_label():
+    registry = Registry(metrics_dir='')
+    registry.register(Counter('deploys_total', "Deploys")).inc()
+    assert registry.render().splitlines()[-1] == 'deploys_total 1'
+
+
+def test_forget_worker_removes_only_that_workers_files(tmp_path):
+    (tmp_path / 'notes.txt').write_text('operator file')
+    (tmp_path / '123.json').write_text('[]')
+    (tmp_path / '123.json.456.tmp').write_text('[')
+    (tmp_path / '1234.json').write_text('[]')
+
+    Registry(metrics_dir=str(tmp_path)).forget_worker(123)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['1234.json', 'notes.txt']
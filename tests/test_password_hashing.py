@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import password_hashing
+from app.password_hashing import HashingBusy, verify_password
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A thread pool in place of the process pool, with small limits."""
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(password_hashing, 'PASSWORD_HASH_WORKERS', 2)
+    monkeypatch.setattr(password_hashing, 'PASSWORD_HASH_TIMEOUT', 0.05)
+    monkeypatch.setattr(password_hashing, '_get_pool', lambda: executor)
+    monkeypatch.setattr(password_hashing, '_slots', threading.BoundedSemaphore(2))
+    monkeypatch.setattr(password_hashing, '_dummy_hash', 'dummy')
+    gate = threading.Event()
+    yield gate
+    gate.set()
+    executor.shutdown(wait=True)
+
+
+def test_timed_out_hashes_keep_their_slots(pool):
+    def slow():
+        pool.wait(5)
+        return True
+
+    for _ in range(2):
+        with pytest.raises(HashingBusy, match='too long'):
+            password_hashing._run(slow)
+    # Both hashes are still running: the queue is full and the next caller is turned away at once
+    with pytest.raises(HashingBusy, match='Too many'):
+        password_hashing._run(slow)
+
+    pool.set()
+    wait_until(lambda: password_hashing._slots._value == 2)
+    assert password_hashing._run(lambda: 'ok') == 'ok'
+
+
+def test_known_and_unknown_users_share_the_queue(pool, monkeypatch):
+    monkeypatch.setattr(password_hashing, 'PASSWORD_HASH_TIMEOUT', 5)
+    monkeypatch.setattr(password_hashing, '_verify', lambda stored, password: pool.wait(5) and stored != 'dummy')
+    waiting = [threading.Thread(target=verify_password, args=(None, f'guess {i}')) for i in range(2)]
+    for thread in waiting:
+        thread.start()
+    wait_until(lambda: password_hashing._slots._value == 0)
+
+    # With the queue full, a real account is turned away exactly like an unknown one
+    with pytest.raises(HashingBusy, match='Too many'):
+        verify_password('real', 'secret')
+    with pytest.raises(HashingBusy, match='Too many'):
+        verify_password(None, 'another guess')
+
+    pool.set()
+    for thread in waiting:
+        thread.join(5)
+    wait_until(lambda: password_hashing._slots._value == 2)
+    assert verify_password('real', 'secret') is True
+    assert verify_password(None, 'guess') is False
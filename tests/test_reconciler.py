@@ -0,0 +1,129 @@
+import datetime
+import subprocess
+import sys
+
+import pytest
+
+from app import reconciler as reconciler_module
+from app.fake_oci import METADATA_BUCKET
+from app.metadata_store import metadata_store
+from app.reconciler import Reconciler
+from tests.conftest import make_bucket
+
+OLD = 2 * 3600  # seconds; past the default grace period
+
+
+def add_site(bucket_key, owner_id, age_seconds=OLD):
+    launched = datetime.datetime.utcnow() - datetime.timedelta(seconds=age_seconds)
+    metadata_store.add_site({"bucket_key": bucket_key, "owner_id": owner_id,
+                             "launch_time": launched.isoformat()})
+
+
+@pytest.fixture
+def users(fake):
+    for name in ('alice', 'bob'):
+        metadata_store.create_user(name, {"password_hash": "x"})
+
+
+def test_empty_store_refuses_teardown(fake):
+    # e.g. buckets.json missing, or METADATA_STORE pointing at the wrong layout
+    for name in ('site-alice-0000aaaa', 'site-bob-0000bbbb'):
+        make_bucket(fake, name, OLD, {"index.html": b"live"})
+
+    report = Reconciler().run(force=True, dry_run=False)
+
+    assert report.phase == 'refused'
+    assert report.orphans_deleted == []
+    assert 'site-alice-0000aaaa' in fake._buckets and 'site-bob-0000bbbb' in fake._buckets
+
+
+def test_large_orphan_share_refuses_teardown(fake, users):
+    add_site('site-alice-0000aaaa', 'alice')
+    for name in ('site-alice-0000aaaa', 'site-alice-1111aaaa', 'site-bob-2222bbbb'):
+        make_bucket(fake, name, OLD)
+
+    report = Reconciler().run(force=True, dry_run=False)
+
+    assert report.phase == 'refused'
+    assert 'site-alice-1111aaaa' in fake._buckets and 'site-bob-2222bbbb' in fake._buckets
+
+
+def test_record_drop_since_last_run_refuses(fake, users):
+    for i in range(4):
+        add_site(f'site-alice-{i:04d}aaaa', 'alice')
+        make_bucket(fake, f'site-alice-{i:04d}aaaa', OLD)
+    assert Reconciler().run(force=True, dry_run=False).phase == 'done'
+
+    # Three records vanish at once while their buckets are still there
+    for i in range(1, 4):
+        metadata_store.remove_site(f'site-alice-{i:04d}aaaa')
+    report = Reconciler().run(force=True, dry_run=False)
+
+    assert report.phase == 'refused'
+    assert all(f'site-alice-{i:04d}aaaa' in fake._buckets for i in range(4))
+
+
+def test_tears_down_only_old_orphans_of_known_users(fake, users):
+    for i in range(3):
+        add_site(f'site-alice-{i:04d}aaaa', 'alice')
+        make_bucket(fake, f'site-alice-{i:04d}aaaa', OLD)
+    make_bucket(fake, 'site-bob-dead0000', OLD, {"index.html": b"orphan"})
+    make_bucket(fake, 'site-bob-0e000000', 60)  # still in its grace period
+    make_bucket(fake, 'site-mallory-dead0000', OLD)  # not a known user
+
+    report = Reconciler().run(force=True, dry_run=False)
+
+    assert report.phase == 'done'
+    assert report.orphans_deleted == ['site-bob-dead0000']
+    assert report.orphans_in_grace == 1
+    assert report.orphans_unrecognized == 1
+    assert 'site-bob-dead0000' not in fake._buckets
+    assert 'site-bob-0e000000' in fake._buckets and 'site-mallory-dead0000' in fake._buckets
+
+
+def test_dry_run_is_the_default(fake, users):
+    for i in range(3):
+        add_site(f'site-alice-{i:04d}aaaa', 'alice')
+        make_bucket(fake, f'site-alice-{i:04d}aaaa', OLD)
+    make_bucket(fake, 'site-bob-dead0000', OLD)
+
+    assert reconciler_module.RECONCILE_DRY_RUN
+    report = Reconciler().run(force=True)
+
+    assert report.dry_run and report.orphans_deleted == ['site-bob-dead0000']
+    assert 'site-bob-dead0000' in fake._buckets
+
+
+def test_dry_run_neither_claims_nor_writes_status(fake, users):
+    add_site('site-alice-0000aaaa', 'alice')
+    make_bucket(fake, 'site-alice-0000aaaa', OLD)
+
+    assert Reconciler().run(dry_run=True).phase == 'done'
+    # Back to back: no claim means no minimum interval to wait out either
+    assert Reconciler().run(dry_run=True).phase == 'done'
+    assert reconciler_module.STATUS_OBJECT not in fake._buckets[METADATA_BUCKET]["objects"]
+
+
+def test_status_is_cached_and_shows_only_counts(fake, users):
+    for i in range(3):
+        add_site(f'site-alice-{i:04d}aaaa', 'alice')
+        make_bucket(fake, f'site-alice-{i:04d}aaaa', OLD)
+    make_bucket(fake, 'site-bob-dead0000', OLD)
+    reconciler = Reconciler()
+    reconciler.run(force=True, dry_run=False)
+    fake.reset_call_counts()
+
+    status = reconciler.status()
+
+    assert sum(fake.calls.values()) == 0
+    assert status["latest_run"]["phase"] == 'done'
+    assert status["latest_run"]["orphans_deleted"] == 1
+    assert status["last_local_run"]["orphans_deleted"] == 1
+    assert 'owner' not in status["latest_run"]
+    assert 'alice' not in str(status) and 'bob' not in str(status)
+
+
+def test_cli_module_does_not_build_the_store_before_loading_env():
+    code = "import sys, app.reconciler; print('app.metadata_store' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == 'False'
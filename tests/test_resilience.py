@@ -0,0 +1,75 @@
+import oci
+import pytest
+
+from app import resilience
+from app.resilience import CircuitBreaker, ResilientClient, circuit_open_error
+
+
+class Flaky:
+    """Stands in for an OCI client; `get_thing` raises the queued errors, then succeeds."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def get_thing(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(resilience, 'RETRY_BASE_DELAY', 0.001)
+    monkeypatch.setattr(resilience, 'RETRY_MAX_ATTEMPTS', 3)
+
+
+def wrap(target, name, threshold=3):
+    resilience._breakers[name] = CircuitBreaker(name, threshold=threshold, reset_timeout=60)
+    return ResilientClient(target, name)
+
+
+def test_connect_timeouts_open_the_circuit():
+    target = Flaky([oci.exceptions.ConnectTimeout("connect timed out")] * 10)
+    client = wrap(target, 'test-connect')
+
+    with pytest.raises(oci.exceptions.ConnectTimeout):
+        client.get_thing()
+    assert client._breaker.state == 'open'
+
+    calls = target.calls
+    with pytest.raises(circuit_open_error()):
+        client.get_thing()
+    assert target.calls == calls  # failed fast, OCI was not called
+
+
+def test_throttling_never_opens_the_circuit():
+    target = Flaky([oci.exceptions.ServiceError(429, 'TooManyRequests', {}, 'slow down')] * 10)
+    client = wrap(target, 'test-throttle', threshold=2)
+    for _ in range(3):
+        with pytest.raises(oci.exceptions.ServiceError):
+            client.get_thing()
+    assert client._breaker.state == 'closed'
+
+
+def test_transient_errors_are_retried_and_client_errors_are_not():
+    target = Flaky([oci.exceptions.ServiceError(503, 'Unavailable', {}, 'x')] * 2)
+    assert wrap(target, 'test-retry', threshold=10).get_thing() == 'ok'
+    assert target.calls == 3
+
+    target = Flaky([oci.exceptions.ServiceError(404, 'NotFound', {}, 'x')])
+    with pytest.raises(oci.exceptions.ServiceError):
+        wrap(target, 'test-404').get_thing()
+    assert target.calls == 1
+
+
+def test_half_open_trial_closes_the_circuit():
+    target = Flaky([oci.exceptions.ServiceError(500, 'Internal', {}, 'x')] * 3)
+    client = wrap(target, 'test-half-open', threshold=3)
+    with pytest.raises(oci.exceptions.ServiceError):
+        client.get_thing()
+    assert client._breaker.state == 'open'
+    client._breaker.opened_at -= 120  # past the reset timeout
+    assert client.get_thing() == 'ok'
+    assert client._breaker.state == 'closed'
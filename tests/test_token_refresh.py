@@ -0,0 +1,41 @@
+import threading
+import time
+
+from app.routes import utils_route
+
+
+class OpaqueSigner:
+    """A signer whose token expiry can't be read (no federation_client)."""
+
+    def __init__(self):
+        self.refreshes = 0
+        self.refreshed = threading.Event()
+
+    def refresh_security_token(self):
+        self.refreshes += 1
+        self.refreshed.set()
+
+
+def test_unknown_expiry_refreshes_on_the_fallback_schedule():
+    signer = OpaqueSigner()
+    assert utils_route._seconds_until_refresh(signer, time.time()) > 0
+    assert utils_route._seconds_until_refresh(signer, time.time() - utils_route.TOKEN_REFRESH_FALLBACK) == 0
+
+
+def test_refresher_renews_a_signer_without_a_readable_expiry(monkeypatch):
+    monkeypatch.setattr(utils_route, 'TOKEN_REFRESH_FALLBACK', 0.05)
+    monkeypatch.setattr(utils_route, 'TOKEN_REFRESH_MIN_WAIT', 0.01)
+    signer = OpaqueSigner()
+    before = utils_route.get_client_stats()["token_refreshes"]
+    utils_route._signers['test'] = signer
+    utils_route._signer_refreshed_at['test'] = time.time()
+    thread = threading.Thread(target=utils_route._token_refresh_loop, daemon=True)
+    try:
+        thread.start()
+        assert signer.refreshed.wait(2)
+    finally:
+        utils_route._signers.pop('test', None)
+        utils_route._signer_refreshed_at.pop('test', None)
+        thread.join(2)
+    assert not thread.is_alive()
+    assert utils_route.get_client_stats()["token_refreshes"] >= before + 1
@@ -0,0 +1,118 @@
+import io
+import os
+import threading
+import zipfile
+
+import pytest
+
+from app import upload_engine
+from app.upload_engine import ByteBudget, UploadAborted, upload_zip_members
+from tests.conftest import make_bucket
+
+NAMESPACE = 'fakenamespace'
+
+
+def archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+        for name, content in members.items():
+            zf.writestr(name, content)
+    return zipfile.ZipFile(io.BytesIO(buffer.getvalue()))
+
+
+class StoppableBudget(ByteBudget):
+    """Remembers the stop events it waits on, so a hung upload can be stopped."""
+    stop_events = set()
+
+    def acquire(self, size, stop_event):
+        self.stop_events.add(stop_event)
+        return super().acquire(size, stop_event)
+
+
+def run_with_timeout(target, timeout=10):
+    result = {}
+
+    def run():
+        try:
+            result["value"] = target()
+        except Exception as e:
+            result["error"] = e
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        # Unblock the uploader threads so a regression fails instead of hanging the run
+        for stop_event in StoppableBudget.stop_events:
+            stop_event.set()
+        thread.join(timeout)
+        pytest.fail("upload did not finish: the byte budgets deadlocked")
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+@pytest.fixture
+def small_thresholds(monkeypatch):
+    # The same shape as >20MB members against the 32MB budget, scaled down so the test stays fast
+    monkeypatch.setattr(upload_engine, 'STREAM_THRESHOLD', 16 * 1024)
+    monkeypatch.setattr(upload_engine, 'MULTIPART_THRESHOLD', 64 * 1024)
+    monkeypatch.setattr(upload_engine, 'MULTIPART_PART_SIZE', 32 * 1024)
+    monkeypatch.setattr(upload_engine, 'ByteBudget', StoppableBudget)
+
+
+def test_multipart_members_do_not_starve_on_the_member_budget(fake, small_thresholds):
+    make_bucket(fake, 'site-alice-0000aaaa')
+    members = {f"large-{i}.bin": os.urandom(200 * 1024) for i in range(3)}
+    members.update({f"small-{i}.bin": os.urandom(8 * 1024) for i in range(40)})
+    zf = archive(members)
+    infos = [(zinfo, 'application/octet-stream') for zinfo in zf.infolist()]
+
+    # Fewer upload workers than large members, and a budget the small members can fill
+    report = run_with_timeout(lambda: upload_zip_members(
+        fake, NAMESPACE, 'site-alice-0000aaaa', zf, infos, workers=2, max_inflight_bytes=96 * 1024))
+
+    assert report.to_dict()["files"] == len(members)
+    stored = fake._buckets['site-alice-0000aaaa']["objects"]
+    assert {name: stored[name]["content"] for name in members} == members
+    assert fake.calls["commit_multipart_upload"] == 3
+
+
+def test_byte_budget_admits_an_oversized_reservation_alone():
+    budget = ByteBudget(100)
+    stop = threading.Event()
+    assert budget.acquire(60, stop) == 60
+    waiter_got = []
+    waiter = threading.Thread(target=lambda: waiter_got.append(budget.acquire(500, stop)))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive()  # capped at the limit, so it waits for the 60 to go
+    budget.release(60)
+    waiter.join(2)
+    assert waiter_got == [100] and budget.in_use == 100
+
+
+def test_byte_budget_wait_ends_when_the_upload_stops():
+    budget = ByteBudget(10)
+    stop = threading.Event()
+    budget.acquire(10, stop)
+    stop.set()
+    with pytest.raises(UploadAborted):
+        budget.acquire(1, stop)
+
+
+def test_default_sizes_with_fewer_workers_than_large_members(fake, monkeypatch):
+    monkeypatch.setattr(upload_engine, 'ByteBudget', StoppableBudget)
+    make_bucket(fake, 'site-alice-0000aaaa')
+    large = os.urandom(upload_engine.MULTIPART_THRESHOLD + 1024 * 1024)
+    members = {f"video-{i}.bin": large for i in range(3)}
+    # Enough in-memory members to fill the whole 32MB member budget behind them
+    small = os.urandom(200 * 1024)
+    members.update({f"img/{i}.bin": small for i in range(200)})
+    zf = archive(members)
+    infos = [(zinfo, 'application/octet-stream') for zinfo in zf.infolist()]
+
+    report = run_with_timeout(lambda: upload_zip_members(fake, NAMESPACE, 'site-alice-0000aaaa', zf, infos,
+                                                         workers=2), timeout=60)
+
+    assert report.to_dict()["files"] == len(members)
+    assert fake.calls["commit_multipart_upload"] == 3